@@ -0,0 +1,501 @@
+"""
+Local JSON API over the attendance, payroll and reports controllers, for client-site
+terminals and mobile clock-in.
+
+    python src/api_server.py [--host 127.0.0.1] [--port 8080] [--workers 8] [--shard NAME]
+
+The HTTP side is a small asyncio HTTP/1.1 server (keep-alive, JSON bodies); every
+controller/service call is blocking SQLite work and runs on a thread pool, against a
+Database whose connections are pooled and reused. Report and export responses carry
+an ETag built from the cache_generations counters, so a conditional GET that still
+matches is answered 304 without recomputing anything.
+
+    POST /api/login                      {"username", "password"} -> {"token", ...}
+    POST /api/logout
+    GET  /api/health
+    GET  /api/employees                  ?limit&page_token                    (HR)
+    POST /api/attendance/sign-in         {"employee_id"?, "note"?}
+    POST /api/attendance/sign-out        {"employee_id"?, "note"?}
+    GET  /api/attendance                 ?employee_id&start&end&limit&page_token
+    GET  /api/payroll/<year>/<month>     ?employee_id                         (HR)
+    GET  /api/reports/payroll-totals     ?kind=ytd|quarter|annual&year&part   (HR)
+    GET  /api/exports/payroll-totals     ?kind&year&part&fmt=csv|pdf          (HR)
+    GET  /api/exports/analytics/<name>   ?fmt=parquet|arrow&from_year=&to_year= (HR)
+
+Authenticated calls send "Authorization: Bearer <token>".
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Callable, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+SRC_DIR = pathlib.Path(__file__).resolve().parent
+# services import through the "src." package when loaded outside it, so the project root is needed too
+for _p in (SRC_DIR.parent, SRC_DIR):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
+
+from models.database import Database
+from models.user import UserModel, User
+from models.employee import EmployeeCache
+from models.shards import ShardRouter
+from controllers.attendance_controller import AttendanceController
+from controllers.employees_controller import EmployeesController
+from controllers.reports_controller import ReportsController
+from services.payroll_service import PayrollService
+from services.audit_service import AttendanceAuditLog
+from services.archive_service import AttendanceArchive
+from services.sweeper_service import MissingSignOutSweeper
+from services.client_report_service import ClientReportService
+from services.anomaly_service import AnomalyScanner
+from services.columnar_export_service import ColumnarExportService, DATASETS
+from services.rollup_service import PayrollRollups
+from services.scheduler_service import JobScheduler
+from src.services.tracing import span, record_error, configure_from_env
+
+SESSION_TTL_SECONDS = 8 * 3600
+IDLE_TIMEOUT_SECONDS = 30
+MAX_BODY_BYTES = 64 * 1024
+_EXPORT_TYPES = {"csv": "text/csv", "pdf": "application/pdf", "parquet": "application/vnd.apache.parquet",
+                 "arrow": "application/vnd.apache.arrow.file"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "application/json"
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes
+    args: tuple = ()
+    session: Optional["Session"] = None
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return data
+
+    def int_arg(self, source: dict, name: str, default=None, required: bool = False) -> Optional[int]:
+        value = source.get(name)
+        if value is None or value == "":
+            if required:
+                raise HttpError(400, f"{name} is required")
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise HttpError(400, f"{name} must be an integer")
+
+
+@dataclass
+class Session:
+    """One login: the user and controllers bound to them, sharing the server's services."""
+    token: str
+    user: User
+    attendance: AttendanceController
+    reports: ReportsController
+    employees: EmployeesController
+    expires_at: float
+
+
+@dataclass
+class Route:
+    method: str
+    pattern: re.Pattern
+    handler: Callable
+    auth: bool = True
+    # cache_generations names the response depends on; set = conditional GET with an ETag.
+    # "period" adds the state of the payroll period named by the route's (year, month).
+    etag: tuple = ()
+
+
+def _json_default(value):
+    if hasattr(value, "keys"):
+        return dict(value)
+    return str(value)
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _rows(rows) -> list:
+    return [dict(r) for r in rows]
+
+
+class ApiServer:
+    def __init__(self, db: Database, workers: int = 8, router: Optional[ShardRouter] = None):
+        self.db = db
+        # sign-ins/outs for employees of other shards are written to their shard, not this server's
+        self.router = router
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-db")
+        # shared by every session, as main.bootstrap shares them across controllers
+        self.employee_cache = EmployeeCache.shared(db)
+        self.user_model = UserModel(db, employee_cache=self.employee_cache)
+        self.payroll_service = PayrollService(db, employee_cache=self.employee_cache)
+        self.audit_log = AttendanceAuditLog(db)
+        self.archive = AttendanceArchive(db)
+        self.sweeper = MissingSignOutSweeper(db, audit_log=self.audit_log)
+        self.client_reports = ClientReportService(db)
+        self.anomaly_scanner = AnomalyScanner(db)
+        self.rollups = getattr(self.payroll_service, "rollups", None) or PayrollRollups(db)
+        self.columnar_export = ColumnarExportService(db, archive=self.archive)
+        self.sessions: dict = {}
+        self._sessions_lock = threading.Lock()
+        self.routes = [
+            Route("POST", re.compile(r"/api/login"), self.login, auth=False),
+            Route("POST", re.compile(r"/api/logout"), self.logout),
+            Route("GET", re.compile(r"/api/health"), self.health, auth=False),
+            Route("GET", re.compile(r"/api/employees"), self.list_employees, etag=("employees",)),
+            Route("POST", re.compile(r"/api/attendance/sign-in"), self.sign_in),
+            Route("POST", re.compile(r"/api/attendance/sign-out"), self.sign_out),
+            Route("GET", re.compile(r"/api/attendance"), self.list_attendance, etag=("attendance", "employees")),
+            Route("GET", re.compile(r"/api/payroll/(\d{4})/(\d{1,2})"), self.payroll_month, etag=("attendance", "payroll", "employees", "period")),
+            Route("GET", re.compile(r"/api/reports/payroll-totals"), self.payroll_totals, etag=("payroll", "employees")),
+            Route("GET", re.compile(r"/api/exports/payroll-totals"), self.export_payroll_totals, etag=("payroll", "employees")),
+            Route("GET", re.compile(r"/api/exports/analytics/(\w+)"), self.export_analytics, etag=("attendance", "payroll", "employees")),
+        ]
+
+    # --- sessions ---
+    def _new_session(self, user: User) -> Session:
+        attendance = AttendanceController(self.db, None, current_user=user, payroll_service=self.payroll_service,
+                                          audit_log=self.audit_log, archive=self.archive, sweeper=self.sweeper, router=self.router)
+        reports = ReportsController(self.db, None, payroll_service=self.payroll_service, attendance_controller=attendance,
+                                    current_user=user, client_report_service=self.client_reports, anomaly_scanner=self.anomaly_scanner,
+                                    rollups=self.rollups, columnar_export=self.columnar_export)
+        employees = EmployeesController(self.db, None, current_user=user, employee_cache=self.employee_cache)
+        return Session(secrets.token_urlsafe(32), user, attendance, reports, employees, time.time() + SESSION_TTL_SECONDS)
+
+    def _session_for(self, headers: dict) -> Session:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        session = self.sessions.get(token.strip()) if scheme.lower() == "bearer" else None
+        if session is None or session.expires_at < time.time():
+            self.sessions.pop(token.strip(), None)
+            raise HttpError(401, "Sign in required")
+        return session
+
+    @staticmethod
+    def _require_hr(session: Session, what: str = "payroll"):
+        if not session.user.is_hr:
+            raise PermissionError(f"Only admins can access {what}")
+
+    # --- handlers (run on the worker pool) ---
+    def login(self, req: Request):
+        data = req.json()
+        user = self.user_model.authenticate(str(data.get("username", "")), str(data.get("password", "")))
+        if user is None:
+            raise HttpError(401, "Authentication failed")
+        session = self._new_session(user)
+        with self._sessions_lock:
+            # expired sessions that were never used again would otherwise stay forever
+            now = time.time()
+            for token in [t for t, s in self.sessions.items() if s.expires_at < now]:
+                del self.sessions[token]
+            self.sessions[session.token] = session
+        return {"token": session.token, "expires_in": SESSION_TTL_SECONDS,
+                "user": {"id": user.id, "username": user.username, "is_hr": user.is_hr, "employee_id": user.employee_id}}
+
+    def logout(self, req: Request):
+        self.sessions.pop(req.session.token, None)
+        return {"ok": True}
+
+    def health(self, req: Request):
+        return {"ok": self.db.fetchone("SELECT 1 AS ok")["ok"] == 1}
+
+    def list_employees(self, req: Request):
+        page = req.session.employees.employees_page(limit=min(req.int_arg(req.query, "limit", 50), 500), token=req.query.get("page_token"))
+        return {"items": _rows(page.items), "next_token": page.next_token}
+
+    def _clock(self, req: Request, event: str):
+        data = req.json()
+        ctrl = req.session.attendance
+        eid = ctrl._resolve_target_employee(req.int_arg(data, "employee_id"))
+        note = str(data.get("note") or "")
+        try:
+            ts = ctrl.sign_in(eid, note) if event == "sign_in" else ctrl.sign_out(eid, note)
+        except ValueError as e:
+            raise HttpError(409, str(e))
+        if event == "sign_out" and self.payroll_service:
+            # fold the closed day into the month's running payroll totals, as the CLI does
+            try:
+                ctrl.payroll_for(eid).record_sign_out(eid, ts)
+            except Exception as e:
+                # the sign-out itself is committed; the month is recomputed in full at payroll time
+                record_error("payroll.record_sign_out", e)
+                print(f"Incremental payroll update failed for employee {eid}: {e}")
+        return Response(201, _encode({"employee_id": eid, "event": event, "timestamp": ts}))
+
+    def sign_in(self, req: Request):
+        return self._clock(req, "sign_in")
+
+    def sign_out(self, req: Request):
+        return self._clock(req, "sign_out")
+
+    def list_attendance(self, req: Request):
+        ctrl = req.session.attendance
+        eid = ctrl._resolve_target_employee(req.int_arg(req.query, "employee_id"))
+        page = ctrl.records_page(eid, req.query.get("start") or None, req.query.get("end") or None,
+                                 limit=min(req.int_arg(req.query, "limit", 50), 500), token=req.query.get("page_token"))
+        return {"items": _rows(page.items), "next_token": page.next_token}
+
+    def payroll_month(self, req: Request):
+        self._require_hr(req.session)
+        year, month = int(req.args[0]), int(req.args[1])
+        if not 1 <= month <= 12:
+            raise HttpError(400, "Month must be 1-12")
+        eid = req.int_arg(req.query, "employee_id")
+        periods = self.payroll_service.periods
+        if periods.period_model.is_closed(year, month):
+            # a closed month is its frozen snapshot plus delta lines, never a fresh computation
+            items = [r for r in periods.closed_results(year, month) if eid is None or r["employee_id"] == eid]
+            return {"year": year, "month": month, "status": "closed", "items": items}
+        return {"year": year, "month": month, "status": "open",
+                "items": self.payroll_service.compute_month(year, month, None if eid is None else [eid])}
+
+    def _totals(self, req: Request):
+        kind = req.query.get("kind", "ytd")
+        year = req.int_arg(req.query, "year", required=True)
+        part = req.int_arg(req.query, "part")
+        return kind, year, part
+
+    def payroll_totals(self, req: Request):
+        self._require_hr(req.session, "reports")
+        kind, year, part = self._totals(req)
+        if kind == "ytd":
+            if not 1 <= (part or 12) <= 12:
+                raise HttpError(400, "Month must be 1-12")
+            rows = self.rollups.iter_ytd(year, part or 12)
+        elif kind == "quarter":
+            rows = self.rollups.iter_quarter(year, req.int_arg(req.query, "part", required=True))
+        elif kind == "annual":
+            rows = self.rollups.iter_annual(year)
+        else:
+            raise HttpError(400, f"Unknown report: {kind}")
+        return {"kind": kind, "year": year, "part": part, "items": list(rows)}
+
+    def _file(self, write: Callable[[str], tuple], suffix: str) -> Response:
+        """Run an export into a temporary file and return its bytes."""
+        fd, tmp = tempfile.mkstemp(suffix=f".{suffix}")
+        os.close(fd)
+        try:
+            path, _ = write(tmp)
+            with open(path, "rb") as f:
+                body = f.read()
+            if path != tmp and os.path.exists(path):
+                os.unlink(path)
+        finally:
+            os.unlink(tmp)
+        ext = pathlib.Path(path).suffix.lstrip(".")
+        return Response(200, body, _EXPORT_TYPES.get(ext, "application/octet-stream"),
+                        {"Content-Disposition": f'attachment; filename="export.{ext}"'})
+
+    def export_payroll_totals(self, req: Request):
+        kind, year, part = self._totals(req)
+        fmt = req.query.get("fmt", "csv").lower()
+        ctrl = req.session.reports
+        return self._file(lambda out: ctrl.export_payroll_totals(kind, year, part, fmt=fmt, out_path=out), fmt)
+
+    def export_analytics(self, req: Request):
+        req.session.reports._check_admin()
+        dataset, fmt = req.args[0], req.query.get("fmt", "parquet").lower()
+        if dataset not in DATASETS:
+            raise HttpError(404, f"Unknown dataset: {dataset}")
+        first = req.int_arg(req.query, "from_year")
+        years = None if first is None else (first, req.int_arg(req.query, "to_year", first))
+        return self._file(lambda out: self.columnar_export.export(dataset, out, fmt, years), fmt)
+
+    # --- conditional GET ---
+    def _etag(self, req: Request, names: tuple) -> str:
+        """
+        Weak validator over the request and the generations it depends on. Read before
+        the body is built, so a write landing in between can only make the next
+        revalidation miss, never serve stale data as fresh.
+        """
+        marks = ",".join("?" * len(names))
+        gens = [tuple(g) for g in self.db.query(f"SELECT name, generation FROM cache_generations WHERE name IN ({marks}) ORDER BY name", names)]
+        if "payroll" in names:
+            # the tax tables come from config, not the database: a restart with new tables changes every payroll response
+            gens.append(("tax", self.payroll_service.tax_policy.signature))
+        if "period" in names:
+            # closing or re-running a month changes what the same URL returns
+            period = self.payroll_service.periods.period_model.get(int(req.args[0]), int(req.args[1]))
+            gens.append(("period", period.status, period.closed_at, period.last_change_id))
+        key = json.dumps([req.path, sorted(req.query.items()), req.session.user.id, gens])
+        return 'W/"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+    def _serve(self, route: Route, req: Request) -> Response:
+        with span(f"api.{route.handler.__name__}", method=req.method) as sp:
+            etag = None
+            if route.etag:
+                etag = self._etag(req, route.etag)
+                match = [t.strip() for t in req.headers.get("if-none-match", "").split(",")]
+                if etag in match or "*" in match:
+                    sp.set(status=304)
+                    return Response(304, headers={"ETag": etag})
+            result = route.handler(req)
+            response = result if isinstance(result, Response) else Response(200, _encode(result))
+            if etag:
+                response.headers.update({"ETag": etag, "Cache-Control": "private, no-cache"})
+            sp.set(status=response.status)
+            return response
+
+    # --- HTTP ---
+    async def dispatch(self, method: str, target: str, headers: dict, body: bytes) -> Response:
+        url = urlsplit(target)
+        allowed = []
+        for route in self.routes:
+            m = route.pattern.fullmatch(url.path.rstrip("/") or "/")
+            if m is None:
+                continue
+            if route.method != method and not (method == "HEAD" and route.method == "GET"):
+                allowed.append(route.method)
+                continue
+            req = Request(method, url.path, dict(parse_qsl(url.query)), headers, body, m.groups())
+            try:
+                if route.auth:
+                    req.session = self._session_for(headers)
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, self._serve, route, req)
+            except HttpError as e:
+                return Response(e.status, _encode({"error": str(e)}))
+            except PermissionError as e:
+                return Response(403, _encode({"error": str(e)}))
+            except ValueError as e:
+                return Response(400, _encode({"error": str(e)}))
+            except Exception as e:
+                return Response(500, _encode({"error": f"Error: {e}"}))
+        if allowed:
+            return Response(405, _encode({"error": "Method not allowed"}), headers={"Allow": ", ".join(allowed)})
+        return Response(404, _encode({"error": "Not found"}))
+
+    @staticmethod
+    def _head(response: Response, keep_alive: bool, send_body: bool) -> bytes:
+        reason = HTTPStatus(response.status).phrase
+        lines = [f"HTTP/1.1 {response.status} {reason}"]
+        if response.status != 304:
+            lines.append(f"Content-Type: {response.content_type}")
+        lines.append(f"Content-Length: {len(response.body) if send_body or response.status != 304 else 0}")
+        lines += [f"{k}: {v}" for k, v in response.headers.items()]
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                parts = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3:
+                    response, keep_alive = Response(400, _encode({"error": "Bad request line"})), False
+                else:
+                    method, target, version = parts
+                    conn_hdr = headers.get("connection", "").lower()
+                    keep_alive = conn_hdr == "keep-alive" or (version == "HTTP/1.1" and conn_hdr != "close")
+                    length = int(headers.get("content-length") or 0)
+                    if length > MAX_BODY_BYTES:
+                        response, keep_alive = Response(413, _encode({"error": "Body too large"})), False
+                    else:
+                        body = await reader.readexactly(length) if length else b""
+                        response = await self.dispatch(method, target, headers, body)
+                send_body = not (len(parts) == 3 and parts[0] == "HEAD") and response.status != 304
+                writer.write(self._head(response, keep_alive, send_body) + (response.body if send_body else b""))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # server shutting down with this keep-alive connection idle; nothing awaits the handler
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, ready: Optional[asyncio.Event] = None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.db.close_pool()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QuickHire local JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="threads for blocking database work")
+    parser.add_argument("--shard", default=os.environ.get("QUICKHIRE_SHARD"))
+    parser.add_argument("--db", help="database file (overrides --shard)")
+    args = parser.parse_args(argv)
+    configure_from_env()
+
+    # one idle connection per worker plus headroom for nested calls
+    pool_size = args.workers * 2
+    router = None if args.db else ShardRouter(pool_size=pool_size)
+    db = Database(args.db, pool_size=pool_size) if args.db else router.db(args.shard)
+    app = ApiServer(db, workers=args.workers, router=router)
+    # same background jobs as the CLI: missing sign-out sweep and the scheduled jobs
+    app.sweeper.start()
+    scheduler = JobScheduler(db, payroll_service=app.payroll_service)
+    scheduler.start()
+    print(f"Serving QuickHire API on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.sweeper.stop()
+        scheduler.stop()
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,51 @@
+import threading
 from datetime import datetime
 from typing import Optional
 from models.database import Database
+from models.attendance import AttendanceModel
+from services.audit_service import AttendanceAuditLog
+from services.archive_service import AttendanceArchive
+from services.paging import Page, encode_token, decode_token
+from services.sweeper_service import MissingSignOutSweeper
+from services.payroll_service import PayrollService
+from src.services.tracing import traced, record_error
 
 class AttendanceController:
-    def __init__(self, db, view, current_user=None, payroll_service=None):
+    def __init__(self, db, view, current_user=None, payroll_service=None, audit_log=None, archive=None, sweeper=None, router=None):
         self.db = db
         self.view = view
         self.current_user = current_user
         self.payroll_service = payroll_service
+        self.audit_log = audit_log or AttendanceAuditLog(db)
+        # reads are routed through the archive so closed months stay queryable
+        self.archive = archive or AttendanceArchive(db)
+        self.sweeper = sweeper or MissingSignOutSweeper(db, audit_log=self.audit_log)
+        self.attendance_model = AttendanceModel(db)
+        # with more than one shard, clock events are written to the shard that owns the employee
+        self.router = router if router is not None and router.shard_map.sharded else None
+        self._sites = {}
+        self._sites_lock = threading.Lock()
+
+    def _site(self, employee_id: int):
+        """(attendance model, audit log, payroll service) for the database that owns the employee."""
+        if self.router is None:
+            return self.attendance_model, self.audit_log, self.payroll_service
+        db = self.router.db_for_employee(employee_id)
+        if db is self.db:
+            return self.attendance_model, self.audit_log, self.payroll_service
+        with self._sites_lock:
+            site = self._sites.get(id(db))
+            if site is None:
+                payroll = PayrollService(db) if self.payroll_service is not None else None
+                site = self._sites[id(db)] = (AttendanceModel(db), AttendanceAuditLog(db), payroll)
+            return site
+
+    def payroll_for(self, employee_id: int):
+        """Payroll service on the employee's shard (for record_sign_out after a sign-out)."""
+        return self._site(employee_id)[2]
+
+    def _audit(self, action: str, attendance_id: Optional[int], employee_id: Optional[int], payload: dict, audit_log=None):
+        (audit_log or self.audit_log).record(action, attendance_id, employee_id, payload, actor=getattr(self.current_user, "username", None))
 
     def _resolve_target_employee(self, requested_eid: Optional[int]) -> int:
         """Resolve employee id: non-HR users are limited to their linked employee_id."""
@@ -23,43 +61,104 @@ class AttendanceController:
             raise PermissionError("You can only operate on your own attendance")
         return self.current_user.employee_id
 
+    @traced("attendance.sign_in")
     def sign_in(self, employee_id: int, note: str = "") -> str:
-        ts = datetime.now().isoformat()
-        self.db.execute("INSERT INTO attendance (employee_id, event, timestamp, corrected_by_hr, note) VALUES (?, 'sign_in', ?, 0, ?)",
-                        (employee_id, ts, note))
+        # a shift open longer than max_shift_hours is left to the sweeper and does not block a new sign-in
+        model, audit_log, _ = self._site(employee_id)
+        attendance_id, ts = model.clock_in(employee_id, note, stale_after_hours=self.sweeper.policy.max_shift_hours)
+        self._audit("insert", attendance_id, employee_id, {"event": "sign_in", "timestamp": ts, "corrected_by_hr": 0, "note": note}, audit_log)
         return ts
 
+    @traced("attendance.sign_out")
     def sign_out(self, employee_id: int, note: str = "") -> str:
-        ts = datetime.now().isoformat()
-        self.db.execute("INSERT INTO attendance (employee_id, event, timestamp, corrected_by_hr, note) VALUES (?, 'sign_out', ?, 0, ?)",
-                        (employee_id, ts, note))
+        model, audit_log, _ = self._site(employee_id)
+        attendance_id, ts = model.clock_out(employee_id, note)
+        self._audit("insert", attendance_id, employee_id, {"event": "sign_out", "timestamp": ts, "corrected_by_hr": 0, "note": note}, audit_log)
         return ts
 
+    @traced("attendance.add_correction")
     def add_correction(self, employee_id: int, timestamp_iso: str, event: str = "correction", note: str = ""):
         # HR only
         if not getattr(self.current_user, "is_hr", False):
             raise PermissionError("Only HR can add corrections")
-        self.db.execute("INSERT INTO attendance (employee_id, event, timestamp, corrected_by_hr, note) VALUES (?, ?, ?, 1, ?)",
-                        (employee_id, event, timestamp_iso, note))
+        model, audit_log, _ = self._site(employee_id)
+        cur = model.db.execute("INSERT INTO attendance (employee_id, event, timestamp, corrected_by_hr, note) VALUES (?, ?, ?, 1, ?)",
+                               (employee_id, event, timestamp_iso, note))
+        self._audit("correction", cur.lastrowid, employee_id, {"event": event, "timestamp": timestamp_iso, "corrected_by_hr": 1, "note": note}, audit_log)
         return True
 
+    @traced("attendance.list_records")
     def list_records(self, employee_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None):
         start = (start_date + "T00:00:00") if start_date else "1970-01-01T00:00:00"
         end = (end_date + "T23:59:59") if end_date else datetime.now().isoformat()
-        return self.db.query("""
+        return self.archive.query("""
             SELECT a.id, a.employee_id, e.full_name, a.event, a.timestamp, a.corrected_by_hr, a.note 
-            FROM attendance a
+            FROM {attendance} a
             LEFT JOIN employees e ON a.employee_id = e.id
             WHERE a.employee_id = ? AND a.timestamp BETWEEN ? AND ? 
             ORDER BY a.timestamp
-        """, (employee_id, start, end))
+        """, (employee_id, start, end), start, end)
 
+    def page_records(self, employee_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     after: Optional[tuple] = None, before: Optional[tuple] = None, limit: int = 20):
+        """
+        One page of list_records(), keyed on (timestamp, id) so each page is an index seek
+        rather than an OFFSET scan. `after`/`before` are the key of the last/first row on the
+        page currently shown; rows are always returned oldest first.
+        """
+        start = (start_date + "T00:00:00") if start_date else "1970-01-01T00:00:00"
+        end = (end_date + "T23:59:59") if end_date else datetime.now().isoformat()
+        params: list = [employee_id, start, end]
+        keyset, order = "", "ASC"
+        if after is not None:
+            keyset = "AND (a.timestamp, a.id) > (?, ?)"
+            params += list(after)
+        elif before is not None:
+            keyset, order = "AND (a.timestamp, a.id) < (?, ?)", "DESC"
+            params += list(before)
+        rows = self.archive.query(f"""
+            SELECT a.id, a.employee_id, e.full_name, a.event, a.timestamp, a.corrected_by_hr, a.note
+            FROM {{attendance}} a
+            LEFT JOIN employees e ON a.employee_id = e.id
+            WHERE a.employee_id = ? AND a.timestamp BETWEEN ? AND ? {keyset}
+            ORDER BY a.timestamp {order}, a.id {order}
+            LIMIT ?
+        """, (*params, int(limit)), start, end)
+        # long archived ranges come back as one page per window of years: keep the page across them
+        rows = sorted(rows, key=lambda r: (r["timestamp"], r["id"]), reverse=order == "DESC")[:int(limit)]
+        return rows[::-1] if order == "DESC" else rows
+
+    @traced("attendance.records_page")
+    def records_page(self, employee_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     limit: int = 50, token: Optional[str] = None) -> Page:
+        """
+        Cursor-paged list_records(): returns `limit` rows and a token for the next page.
+        The token carries the (timestamp, id) of the last row, so every page is a seek.
+        """
+        scope = ("attendance", employee_id, start_date, end_date)
+        after = decode_token(token, scope)
+        rows = self.page_records(employee_id, start_date, end_date, after=after, limit=limit + 1)
+        items = rows[:limit]
+        next_token = encode_token((items[-1]["timestamp"], items[-1]["id"]), scope) if len(rows) > limit else None
+        return Page(items=items, next_token=next_token)
+
+    def iter_records(self, employee_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None, chunk_size: int = 500):
+        """Yield every matching record, fetching chunk_size rows per query."""
+        after = None
+        while True:
+            rows = self.page_records(employee_id, start_date, end_date, after=after, limit=chunk_size)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    @traced("attendance.compute_hours_for_day")
     def compute_hours_for_day(self, employee_id: int, date_str: str):
         # compute hours from attendance table for that date
         start = f"{date_str}T00:00:00"
         end = f"{date_str}T23:59:59"
-        rows = self.db.query("SELECT event, timestamp FROM attendance WHERE employee_id = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
-                             (employee_id, start, end))
+        rows = self.archive.query("SELECT event, timestamp FROM {attendance} WHERE employee_id = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+                                  (employee_id, start, end), start, end)
         from datetime import datetime as _dt
         parsed = []
         for r in rows:
@@ -95,12 +194,40 @@ class AttendanceController:
         overtime = round(max(0.0, hours - 8.0), 2)
         return {"date": date_str, "regular_hours": regular, "overtime_hours": overtime, "total_hours": hours}
 
+    @traced("attendance.delete_record")
     def delete_record(self, attendance_id: int):
         if not getattr(self.current_user, "is_hr", False):
             raise PermissionError("Only HR can delete attendance records")
+        # attendance ids are per database file: this deletes from the terminal's own shard
+        row = self.db.fetchone("SELECT id, employee_id, event, timestamp, corrected_by_hr, note FROM attendance WHERE id = ?", (attendance_id,))
+        if not row:
+            # archived months live in the year files and are read-only
+            raise ValueError(f"No live attendance record {attendance_id} (records in archived months cannot be deleted)")
         self.db.execute("DELETE FROM attendance WHERE id = ?", (attendance_id,))
+        # keep the deleted row's content in the audit log
+        self._audit("delete", attendance_id, row["employee_id"], {k: row[k] for k in row.keys()})
         return True
 
+    @traced("attendance.verify_audit_log")
+    def verify_audit_log(self, full: bool = False):
+        if not getattr(self.current_user, "is_hr", False):
+            raise PermissionError("Only HR can verify the audit log")
+        return self.audit_log.verify(full=full)
+
+    @traced("attendance.missing_sign_outs")
+    def missing_sign_outs(self):
+        """Sweep now and return the open missing sign-out queue."""
+        if not getattr(self.current_user, "is_hr", False):
+            raise PermissionError("Only HR can review missing sign-outs")
+        self.sweeper.sweep()
+        return self.sweeper.queue()
+
+    @traced("attendance.resolve_missing_sign_outs")
+    def resolve_missing_sign_outs(self, exception_ids, action: str = "close") -> int:
+        if not getattr(self.current_user, "is_hr", False):
+            raise PermissionError("Only HR can resolve missing sign-outs")
+        return self.sweeper.resolve(exception_ids, action, actor=getattr(self.current_user, "username", None))
+
     def handle_attendance(self):
         view = self.view
         if view is None:
@@ -123,7 +250,11 @@ class AttendanceController:
                     view.display_error("Invalid id")
                     continue
                 note = view.prompt_for_input("Note (optional): ").strip()
-                ts = self.sign_in(eid, note)
+                try:
+                    ts = self.sign_in(eid, note)
+                except ValueError as e:
+                    view.display_error(str(e))
+                    continue
                 view.display_success("Signed in")
             elif ch == "2":  # Sign out
                 try:
@@ -138,22 +269,20 @@ class AttendanceController:
                     view.display_error("Invalid id")
                     continue
                 note = view.prompt_for_input("Note (optional): ").strip()
-                ts = self.sign_out(eid, note)
+                try:
+                    ts = self.sign_out(eid, note)
+                except ValueError as e:
+                    view.display_error(str(e))
+                    continue
                 view.display_success("Signed out")
-                # after sign-out, trigger near-real-time payroll update for that month
+                # after sign-out, fold the closed day into the month's running payroll totals
                 if ts and self.payroll_service:
                     try:
-                        dt = datetime.fromisoformat(ts)
-                    except Exception:
-                        try:
-                            dt = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S")
-                        except Exception:
-                            dt = None
-                    if dt:
-                        try:
-                            self.payroll_service.persist_for_employee(eid, dt.year, dt.month)
-                        except Exception:
-                            pass
+                        self.payroll_for(eid).record_sign_out(eid, ts)
+                    except Exception as e:
+                        # the sign-out itself succeeded; the month is recomputed in full at payroll time
+                        record_error("payroll.record_sign_out", e)
+                        view.display_error(f"Error: payroll totals not updated ({e}); they are recomputed when payroll is generated")
             elif ch == "3":  # Correction
                 try:
                     eid = int(view.prompt_for_input("Employee ID: ").strip())
@@ -192,8 +321,7 @@ class AttendanceController:
                 
                 start = view.prompt_for_input("Start date (YYYY-MM-DD) or blank: ").strip() or None
                 end = view.prompt_for_input("End date (YYYY-MM-DD) or blank: ").strip() or None
-                recs = self.list_records(eid, start, end)
-                view.display_attendance_records(recs)
+                view.page_attendance_records(lambda **kw: self.page_records(eid, start, end, **kw))
             elif ch == "5":  # Delete
                 try:
                     aid = int(view.prompt_for_input("Attendance record ID to delete: ").strip())
@@ -203,9 +331,43 @@ class AttendanceController:
                 try:
                     self.delete_record(aid)
                     view.display_success("Deleted")
+                except (PermissionError, ValueError) as e:
+                    view.display_error(str(e))
+            elif ch == "6":  # Verify audit log
+                try:
+                    full = view.prompt_for_input("Full re-verification from the start? (y/n): ").strip().lower() == "y"
+                    res = self.verify_audit_log(full=full)
+                    if res.ok:
+                        view.display_success(f"Audit log intact ({res.checked} entries checked, seq {res.from_seq + 1}-{res.last_seq})")
+                    else:
+                        view.display_error(f"Audit log tampering detected at seq {res.bad_seq}: {res.reason}")
                 except PermissionError as e:
                     view.display_error(str(e))
-            elif ch == "6":  # Back
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "7":  # Missing sign-outs
+                try:
+                    queue = self.missing_sign_outs()
+                    view.display_missing_sign_outs(queue)
+                    if not queue:
+                        continue
+                    sel = view.prompt_for_input("Exception IDs (comma separated, 'all', or blank to go back): ").strip().lower()
+                    if not sel:
+                        continue
+                    ids = [r["id"] for r in queue] if sel == "all" else [int(x) for x in sel.split(",") if x.strip()]
+                    action = view.prompt_for_input("Close at proposed time or dismiss? (c/d): ").strip().lower()
+                    if action not in ("c", "d"):
+                        view.display_error("Choose c or d")
+                        continue
+                    n = self.resolve_missing_sign_outs(ids, "close" if action == "c" else "dismiss")
+                    view.display_success(f"{n} exception(s) resolved")
+                except ValueError:
+                    view.display_error("Invalid exception id")
+                except PermissionError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "8":  # Back
                 break
             else:
                 view.display_invalid_choice_message()
@@ -0,0 +1,108 @@
+from services.backup_service import BackupService
+from services.maintenance_service import DatabaseMaintenance
+from src.services.tracing import traced
+
+class BackupController:
+    def __init__(self, db, view, current_user=None, backup_service=None, maintenance=None):
+        self.db = db
+        self.view = view
+        self.current_user = current_user
+        self.backup_service = backup_service or BackupService(db)
+        self.maintenance = maintenance or DatabaseMaintenance(db)
+
+    def _check_admin(self):
+        """Raise error if not admin."""
+        if not getattr(self.current_user, "is_hr", False):
+            raise PermissionError("Only admins can manage backups")
+
+    # --- Data operations ---
+    @traced("backup.backup_full")
+    def backup_full(self) -> dict:
+        self._check_admin()
+        return self.backup_service.backup_full()
+
+    @traced("backup.snapshot")
+    def snapshot(self) -> dict:
+        self._check_admin()
+        return self.backup_service.snapshot()
+
+    @traced("backup.list_backups")
+    def list_backups(self) -> list:
+        self._check_admin()
+        return self.backup_service.list_backups()
+
+    @traced("backup.restore")
+    def restore(self, backup_id: str, out_path: str = None) -> dict:
+        self._check_admin()
+        return self.backup_service.restore(backup_id, out_path=out_path)
+
+    @traced("backup.run_maintenance")
+    def run_maintenance(self, full_check: bool = False) -> dict:
+        """Statistics refresh, idle-time page reclaim and an integrity check, with before/after sizes."""
+        self._check_admin()
+        return self.maintenance.run(full_check=full_check)
+
+    # --- CLI handlers ---
+    def handle_backups(self):
+        view = self.view
+        if view is None:
+            print("No view configured")
+            return
+
+        try:
+            self._check_admin()
+        except PermissionError as e:
+            view.display_error(str(e))
+            return
+
+        while True:
+            view.display_backup_menu()
+            ch = view.prompt_for_input("Choose (number): ").strip()
+            if ch == "1":  # Full backup
+                try:
+                    e = self.backup_full()
+                    view.display_success(f"Full backup {e['id']} written ({e['size'] / 1e6:.1f} MB)")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "2":  # Snapshot
+                try:
+                    e = self.snapshot()
+                    view.display_success(f"{e['kind'].capitalize()} snapshot {e['id']}: {e['pages_written']} of {e['page_count']} pages stored")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "3":  # List
+                try:
+                    view.display_backups(self.list_backups())
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "4":  # Restore
+                backup_id = view.prompt_for_input("Backup ID: ").strip()
+                if not backup_id:
+                    view.display_error("Backup ID required")
+                    continue
+                out_path = view.prompt_for_input("Restore to file (blank = replace the live database): ").strip() or None
+                if out_path is None:
+                    confirm = view.prompt_for_input(f"Replace the live database with backup {backup_id}? A full backup is taken first. (y/n): ").strip().lower()
+                    if confirm != "y":
+                        view.display_message("Cancelled")
+                        continue
+                try:
+                    r = self.restore(backup_id, out_path)
+                    if out_path:
+                        view.display_success(f"Backup {backup_id} written to {out_path}")
+                    else:
+                        view.display_success(f"Restored backup {backup_id} (previous state saved as {r['safety_backup']})")
+                except ValueError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "5":  # Maintenance
+                full = view.prompt_for_input("Full integrity check (slower)? (y/n): ").strip().lower() == "y"
+                try:
+                    view.display_maintenance_report(self.run_maintenance(full_check=full))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "6":  # Back
+                break
+            else:
+                view.display_invalid_choice_message()
@@ -0,0 +1,124 @@
+from models.database import Database
+from models.client import ClientModel, Client, Placement
+from src.services.tracing import traced
+
+class ClientsController:
+    def __init__(self, db, view, current_user=None):
+        self.db = db
+        self.view = view
+        self.current_user = current_user
+        self.client_model = ClientModel(self.db)
+
+    def _check_admin(self):
+        """Raise error if not admin."""
+        if not getattr(self.current_user, "is_hr", False):
+            raise PermissionError("Only admins can manage clients")
+
+    # --- Data operations ---
+    @traced("clients.add_client")
+    def add_client(self, name: str, contact: str = None) -> int:
+        self._check_admin()
+        return self.client_model.add(Client(id=None, name=name, contact=contact))
+
+    @traced("clients.list_clients")
+    def list_clients(self):
+        self._check_admin()
+        return self.client_model.list()
+
+    @traced("clients.place_employee")
+    def place_employee(self, client_id: int, employee_id: int, start_date: str, end_date: str = None, site: str = None) -> int:
+        self._check_admin()
+        return self.client_model.place(Placement(id=None, client_id=client_id, employee_id=employee_id, start_date=start_date, end_date=end_date, site=site))
+
+    @traced("clients.end_placement")
+    def end_placement(self, placement_id: int, end_date: str) -> bool:
+        self._check_admin()
+        self.client_model.end_placement(placement_id, end_date)
+        return True
+
+    @traced("clients.list_placements")
+    def list_placements(self, client_id: int):
+        self._check_admin()
+        return self.client_model.placements_for_client(client_id)
+
+    # --- CLI handlers ---
+    def handle_clients(self):
+        view = self.view
+        if view is None:
+            print("No view configured")
+            return
+
+        try:
+            self._check_admin()
+        except PermissionError as e:
+            view.display_error(str(e))
+            return
+
+        while True:
+            view.display_clients_menu()
+            ch = view.prompt_for_input("Choose (number): ").strip()
+            if ch == "1":  # Add client
+                name = view.prompt_for_input("Client name: ").strip()
+                if not name:
+                    view.display_error("Client name required")
+                    continue
+                contact = view.prompt_for_input("Contact: ").strip() or None
+                try:
+                    cid = self.add_client(name, contact)
+                    view.display_success(f"Client added with ID {cid}")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "2":  # List clients
+                try:
+                    view.display_clients_list(self.list_clients())
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "3":  # Place employee
+                try:
+                    cid = int(view.prompt_for_input("Client ID: ").strip())
+                    eid = int(view.prompt_for_input("Employee ID: ").strip())
+                except ValueError:
+                    view.display_error("Invalid id")
+                    continue
+                start = view.prompt_for_input("Start date (YYYY-MM-DD): ").strip()
+                if not start:
+                    view.display_error("Start date required")
+                    continue
+                end = view.prompt_for_input("End date (YYYY-MM-DD) or blank: ").strip() or None
+                site = view.prompt_for_input("Site (optional): ").strip() or None
+                try:
+                    pid = self.place_employee(cid, eid, start, end, site)
+                    view.display_success(f"Placement created with ID {pid}")
+                except ValueError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "4":  # End placement
+                try:
+                    pid = int(view.prompt_for_input("Placement ID: ").strip())
+                except ValueError:
+                    view.display_error("Invalid id")
+                    continue
+                end = view.prompt_for_input("End date (YYYY-MM-DD): ").strip()
+                if not end:
+                    view.display_error("End date required")
+                    continue
+                try:
+                    self.end_placement(pid, end)
+                    view.display_success("Placement ended")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "5":  # View placements
+                try:
+                    cid = int(view.prompt_for_input("Client ID: ").strip())
+                except ValueError:
+                    view.display_error("Invalid id")
+                    continue
+                try:
+                    view.display_placements(self.list_placements(cid))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "6":  # Back
+                break
+            else:
+                view.display_invalid_choice_message()
@@ -3,13 +3,23 @@ from datetime import datetime
 
 from models.database import Database
 from models.user import UserModel
+from models.rate_history import RateHistoryModel
+from models.employee import EmployeeCache
+from services.paging import Page, encode_token, decode_token
+from services.search_service import EmployeeSearch
+from services.payroll_service import TaxPolicy
+from src.services.tracing import traced
 
 class EmployeesController:
-    def __init__(self, db, view, current_user=None):
+    def __init__(self, db, view, current_user=None, search=None, employee_cache=None, tax_policy=None):
         self.db = db
         self.view = view
         self.current_user = current_user
         self.user_model = UserModel(self.db)
+        self.rate_history = RateHistoryModel(self.db)
+        self.search = search or EmployeeSearch(self.db)
+        self.employee_cache = employee_cache or EmployeeCache.shared(self.db)
+        self.tax_policy = tax_policy or TaxPolicy.from_config()
 
     def _check_admin(self):
         """Raise error if not admin."""
@@ -17,13 +27,18 @@ class EmployeesController:
             raise PermissionError("Only admins can access employee management")
 
     # --- Data operations ---
-    def add_employee(self, full_name: str, role: str, department: str, contact: str, rate: float, username: str = None, password: str = None) -> int:
+    @traced("employees.add_employee")
+    def add_employee(self, full_name: str, role: str, department: str, contact: str, rate: float, username: str = None, password: str = None, tax_code: str = None) -> int:
         self._check_admin()
+        self.tax_policy.check_code(tax_code)
         cur = self.db.execute(
-            "INSERT INTO employees (full_name, role, department, contact, rate, active, created_at) VALUES (?, ?, ?, ?, ?, 1, ?)",
-            (full_name, role, department, contact, float(rate), datetime.now().isoformat())
+            "INSERT INTO employees (full_name, role, department, contact, rate, active, created_at, tax_code) VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+            (full_name, role, department, contact, float(rate), datetime.now().isoformat(), tax_code.upper() if tax_code else None)
         )
         employee_id = cur.lastrowid
+        self.rate_history.record(employee_id, rate, "1970-01-01")
+        self.search.refresh(employee_id)
+        self.employee_cache.invalidate(employee_id)
         
         # Create user credentials if provided
         if username and password:
@@ -32,25 +47,40 @@ class EmployeesController:
             except Exception as e:
                 # If user creation fails, rollback employee (optional)
                 self.db.execute("UPDATE employees SET active = 0 WHERE id = ?", (employee_id,))
+                self.employee_cache.invalidate(employee_id)
                 raise Exception(f"Employee created but user account failed: {e}")
         
         return employee_id
 
+    @traced("employees.edit_employee")
     def edit_employee(self, employee_id: int, updates: dict) -> bool:
+        """
+        Update employee fields. A "rate" change is recorded in rate_history from
+        updates["rate_effective_from"] (YYYY-MM-DD, default today) rather than
+        overwriting past pay.
+        """
         self._check_admin()
-        allowed = {"full_name", "role", "department", "contact", "rate", "active"}
+        allowed = {"full_name", "role", "department", "contact", "active", "tax_code"}
+        if "tax_code" in updates:
+            self.tax_policy.check_code(updates["tax_code"])
         set_parts = []
         params = []
         for k, v in updates.items():
             if k in allowed:
                 set_parts.append(f"{k} = ?")
                 params.append(v)
-        if not set_parts:
+        if "rate" in updates:
+            self.rate_history.record(employee_id, float(updates["rate"]), updates.get("rate_effective_from"))
+        elif not set_parts:
             return False
-        params.append(employee_id)
-        self.db.execute(f"UPDATE employees SET {', '.join(set_parts)} WHERE id = ?", tuple(params))
+        if set_parts:
+            params.append(employee_id)
+            self.db.execute(f"UPDATE employees SET {', '.join(set_parts)} WHERE id = ?", tuple(params))
+            self.search.refresh(employee_id)
+        self.employee_cache.invalidate(employee_id)
         return True
 
+    @traced("employees.delete_employee")
     def delete_employee(self, employee_id: int) -> bool:
         """Soft-delete employee (mark inactive) and disable linked user."""
         self._check_admin()
@@ -58,16 +88,65 @@ class EmployeesController:
         self.db.execute("UPDATE employees SET active = 0 WHERE id = ?", (employee_id,))
         # disable linked user account
         self.db.execute("UPDATE users SET active = 0 WHERE employee_id = ?", (employee_id,))
+        self.search.refresh(employee_id)
+        self.employee_cache.invalidate(employee_id)
         return True
 
+    @traced("employees.get_employee")
     def get_employee(self, employee_id: int):
         self._check_admin()
-        return self.db.fetchone("SELECT id, full_name, role, department, contact, rate, active FROM employees WHERE id = ?", (employee_id,))
+        return self.db.fetchone("SELECT id, full_name, role, department, contact, rate, active, tax_code FROM employees WHERE id = ?", (employee_id,))
 
+    @traced("employees.list_employees")
     def list_employees(self):
         self._check_admin()
         return self.db.query("SELECT id, full_name, role, department, contact, rate, active FROM employees WHERE active = 1 ORDER BY id")
 
+    @traced("employees.search_employees")
+    def search_employees(self, query: str, limit: int = 20, include_inactive: bool = False):
+        """Ranked directory matches on name, role, department or contact."""
+        self._check_admin()
+        return self.search.search(query, limit=limit, include_inactive=include_inactive)
+
+    def page_employees(self, after: Optional[int] = None, before: Optional[int] = None, limit: int = 50, include_inactive: bool = False):
+        """Rows with id after/before the given id, oldest id first (primary-key seek, no OFFSET)."""
+        self._check_admin()
+        where, params, order = [], [], "ASC"
+        if not include_inactive:
+            where.append("active = 1")
+        if after is not None:
+            where.append("id > ?")
+            params.append(int(after))
+        elif before is not None:
+            where.append("id < ?")
+            params.append(int(before))
+            order = "DESC"
+        sql = "SELECT id, full_name, role, department, contact, rate, active FROM employees"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.db.query(f"{sql} ORDER BY id {order} LIMIT ?", (*params, int(limit)))
+        return rows[::-1] if order == "DESC" else rows
+
+    @traced("employees.employees_page")
+    def employees_page(self, limit: int = 50, token: Optional[str] = None, include_inactive: bool = False) -> Page:
+        """Cursor-paged list_employees(): `limit` rows plus a token for the next page."""
+        scope = ("employees", include_inactive)
+        key = decode_token(token, scope)
+        rows = self.page_employees(after=key[0] if key else None, limit=limit + 1, include_inactive=include_inactive)
+        items = rows[:limit]
+        next_token = encode_token((items[-1]["id"],), scope) if len(rows) > limit else None
+        return Page(items=items, next_token=next_token)
+
+    def iter_employees(self, chunk_size: int = 500, include_inactive: bool = False):
+        """Yield every employee, fetching chunk_size rows per query."""
+        after = None
+        while True:
+            rows = self.page_employees(after=after, limit=chunk_size, include_inactive=include_inactive)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = rows[-1]["id"]
+
     # --- CLI handlers ---
     def handle_employees(self):
         view = self.view
@@ -124,8 +203,8 @@ class EmployeesController:
                     view.display_error(f"Error: {e}")
             elif ch == "2":  # List
                 try:
-                    rows = self.list_employees()
-                    view.display_employees_list(rows)
+                    self._check_admin()
+                    view.page_employees(self.page_employees)
                 except PermissionError as e:
                     view.display_error(str(e))
                 except Exception as e:
@@ -177,6 +256,12 @@ class EmployeesController:
                     rate_s = view.prompt_for_input("New hourly rate (blank to skip): ").strip()
                     if rate_s:
                         updates["rate"] = float(rate_s)
+                        eff = view.prompt_for_input("Rate effective from (YYYY-MM-DD) or blank for today: ").strip()
+                        if eff:
+                            updates["rate_effective_from"] = eff
+                    tax_code = view.prompt_for_input("New tax code (blank to skip): ").strip()
+                    if tax_code:
+                        updates["tax_code"] = tax_code.upper()
                     if self.edit_employee(eid, updates):
                         view.display_success("Employee updated")
                     else:
@@ -208,7 +293,18 @@ class EmployeesController:
                     view.display_error(str(e))
                 except Exception as e:
                     view.display_error(f"Error: {e}")
-            elif ch == "6":  # Back
+            elif ch == "6":  # Search
+                try:
+                    q = view.prompt_for_input("Search (name, role, department or contact): ").strip()
+                    if not q:
+                        view.display_error("Search text required")
+                        continue
+                    view.display_employees_list(self.search_employees(q))
+                except PermissionError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "7":  # Back
                 break
             else:
                 view.display_invalid_choice_message()
@@ -1,13 +1,18 @@
 import sqlite3
 from datetime import datetime
 from typing import Any
+from services.adjustment_service import AdjustmentService
+from services.simulator_service import PayrollSimulator, Scenario
 
 class PayrollController:
-    def __init__(self, db, view, payroll_service=None, current_user=None):
+    def __init__(self, db, view, payroll_service=None, current_user=None, adjustment_service=None, simulator=None):
         self.db = db
         self.view = view
         self.payroll_service = payroll_service
         self.current_user = current_user
+        # share the payroll service's instance so totals and writes go through one place
+        self.adjustments = adjustment_service or getattr(payroll_service, "adjustments", None) or AdjustmentService(db)
+        self.simulator = simulator or (PayrollSimulator(payroll_service) if payroll_service is not None else None)
 
     def _check_admin(self):
         """Raise error if not admin."""
@@ -33,7 +38,8 @@ class PayrollController:
                 f"Overtime Hours  : {pr.get('overtime_hours')}",
                 f"Gross Pay       : ${pr.get('gross', 0):.2f}",
                 f"Adjustments     : ${pr.get('adjustments', 0):.2f}",
-                f"Tax (15%)       : ${pr.get('tax', 0):.2f}",
+                f"Tax Code        : {pr.get('tax_code') or 'default'}",
+                f"Tax             : ${pr.get('tax', 0):.2f}",
                 f"Net Pay         : ${pr.get('net', 0):.2f}",
             ]
             return "\n".join(lines)
@@ -85,6 +91,9 @@ class PayrollController:
 
                     count = len(results) if isinstance(results, (list, tuple)) else 0
                     view.display_success(f"Payroll generated for {year}-{month:02d} ({count} employees).")
+                    pending = self.payroll_service.periods.pending_changes(year, month)
+                    if pending:
+                        view.display_message(f"{year}-{month:02d} is closed and has {pending} change(s) since its last re-run (option 5 applies them)")
                 except ValueError:
                     view.display_error("Invalid year/month input")
                 except Exception as e:
@@ -128,8 +137,170 @@ class PayrollController:
                 except Exception as e:
                     view.display_error(f"Unexpected error: {e}")
 
-            elif ch == "4":  # Back
+            elif ch == "4":  # Close period
+                try:
+                    year = int(view.prompt_for_input("Year (YYYY): ").strip())
+                    month = int(view.prompt_for_input("Month (1-12): ").strip())
+                    if not (1 <= month <= 12):
+                        view.display_error("Month must be 1-12")
+                        continue
+                    confirm = view.prompt_for_input(f"Close and freeze payroll for {year}-{month:02d}? (y/n): ").strip().lower()
+                    if confirm != "y":
+                        view.display_message("Cancelled")
+                        continue
+                    res = self.payroll_service.periods.close_period(year, month)
+                    view.display_success(f"Closed {year}-{month:02d} ({res['employees']} employees, snapshot {res['snapshot_hash'][:12]})")
+                    for eid, err in res["errors"].items():
+                        view.display_error(f"Employee {eid} left out until fixed and re-run: {err}")
+                except ValueError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Close failed: {e}")
+
+            elif ch == "5":  # Re-run closed period
+                try:
+                    year = int(view.prompt_for_input("Year (YYYY): ").strip())
+                    month = int(view.prompt_for_input("Month (1-12): ").strip())
+                    deltas = self.payroll_service.periods.rerun_period(year, month)
+                    if not deltas:
+                        view.display_message("No changes since the snapshot")
+                    for d in deltas:
+                        view.display_message(f"  Employee {d['employee_id']}: gross {d['gross']:+.2f} | tax {d['tax']:+.2f} | net {d['net']:+.2f}")
+                except ValueError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Re-run failed: {e}")
+
+            elif ch == "6":  # Archive closed months
+                try:
+                    confirm = view.prompt_for_input("Move all closed months to the attendance archive? (y/n): ").strip().lower()
+                    if confirm != "y":
+                        view.display_message("Cancelled")
+                        continue
+                    done = self.payroll_service.archive.archive_closed_months()
+                    if done:
+                        view.display_success("Archived: " + ", ".join(f"{k} ({n} rows)" for k, n in done.items()))
+                    else:
+                        view.display_message("No closed months waiting to be archived")
+                except Exception as e:
+                    view.display_error(f"Archive failed: {e}")
+
+            elif ch == "7":  # Adjustments
+                self.handle_adjustments()
+
+            elif ch == "8":  # What-if simulation
+                try:
+                    self.handle_simulation()
+                except ValueError as e:
+                    view.display_error(str(e))
+                except Exception as e:
+                    view.display_error(f"Simulation failed: {e}")
+
+            elif ch == "9":  # Back
                 break
 
             else:
                 view.display_invalid_choice_message()
+
+    def handle_simulation(self):
+        """Every combination of the entered overtime multipliers, tax rates and rate factors, against current pay."""
+        view = self.view
+        year, month = self._prompt_month()
+
+        def values(prompt):
+            raw = view.prompt_for_input(prompt).strip()
+            return [float(v) for v in raw.split(",") if v.strip()] or [None]
+
+        multipliers = values("Overtime multipliers (comma-separated, blank = current): ")
+        tax_rates = values("Flat tax rates (comma-separated, blank = current): ")
+        factors = [f if f is not None else 1.0 for f in values("Rate factors, e.g. 1.03 (comma-separated, blank = 1): ")]
+        scenarios = []
+        for m in multipliers:
+            for t in tax_rates:
+                for f in factors:
+                    if m is None and t is None and f == 1.0:
+                        continue
+                    parts = [f"ot {m:g}" if m is not None else "", f"tax {t:g}" if t is not None else "", f"rate x{f:g}" if f != 1.0 else ""]
+                    scenarios.append(Scenario(" ".join(p for p in parts if p), overtime_multiplier=m, tax_rate=t, rate_factor=f))
+        if not scenarios:
+            view.display_message("Nothing to compare")
+            return
+        view.display_simulation(self.simulator.compare(year, month, scenarios))
+
+    def _prompt_month(self) -> tuple:
+        year = int(self.view.prompt_for_input("Year (YYYY): ").strip())
+        month = int(self.view.prompt_for_input("Month (1-12): ").strip())
+        if not (1 <= month <= 12):
+            raise ValueError("Month must be 1-12")
+        return year, month
+
+    def handle_adjustments(self):
+        """Allowances/deductions: single, CSV and rule-based bulk entry, and recurring schedules."""
+        view = self.view
+        self._check_admin()
+        while True:
+            view.display_adjustments_menu()
+            ch = view.prompt_for_input("Choose (number): ").strip()
+            try:
+                if ch == "1":  # Single adjustment
+                    eid = int(view.prompt_for_input("Employee ID: ").strip())
+                    year, month = self._prompt_month()
+                    amount = view.prompt_for_input("Amount (negative for a deduction): ").strip()
+                    kind = view.prompt_for_input("Kind (e.g. transport, meals, bonus): ").strip() or None
+                    note = view.prompt_for_input("Note: ").strip() or None
+                    self.adjustments.add(eid, year, month, amount, kind, note)
+                    view.display_success("Adjustment added")
+                elif ch == "2":  # Bulk from CSV
+                    path = view.prompt_for_input("CSV path (employee_id, amount[, year, month, kind, note]): ").strip()
+                    year, month = self._prompt_month()
+                    kind = view.prompt_for_input("Default kind (blank for none): ").strip() or None
+                    n = self.adjustments.import_csv(path, year, month, kind)
+                    view.display_success(f"{n} adjustment(s) imported")
+                elif ch == "3":  # Bulk by rule
+                    year, month = self._prompt_month()
+                    department = view.prompt_for_input("Department (blank = any): ").strip() or None
+                    role = view.prompt_for_input("Role (blank = any): ").strip() or None
+                    client_s = view.prompt_for_input("Client ID (blank = any): ").strip()
+                    amount = view.prompt_for_input("Amount per employee (negative for a deduction): ").strip()
+                    kind = view.prompt_for_input("Kind: ").strip() or None
+                    note = view.prompt_for_input("Note: ").strip() or None
+                    client_id = int(client_s) if client_s else None
+                    targets = self.adjustments.matching_employees(year, month, department, role, client_id)
+                    confirm = view.prompt_for_input(f"Add {amount} to {len(targets)} employee(s) for {year}-{month:02d}? (y/n): ").strip().lower()
+                    if confirm != "y":
+                        view.display_message("Cancelled")
+                        continue
+                    n = self.adjustments.add_for_rule(year, month, amount, kind, note, department, role, client_id)
+                    view.display_success(f"{n} adjustment(s) added")
+                elif ch == "4":  # List month
+                    year, month = self._prompt_month()
+                    view.display_adjustments(self.adjustments.model.list_for_month(year, month))
+                elif ch == "5":  # New schedule
+                    name = view.prompt_for_input("Schedule name: ").strip()
+                    amount = view.prompt_for_input("Monthly amount (negative for a deduction): ").strip()
+                    start = view.prompt_for_input("First month (YYYY-MM): ").strip()
+                    end = view.prompt_for_input("Last month (YYYY-MM, blank = open-ended): ").strip() or None
+                    eid_s = view.prompt_for_input("Employee ID (blank = any): ").strip()
+                    department = view.prompt_for_input("Department (blank = any): ").strip() or None
+                    role = view.prompt_for_input("Role (blank = any): ").strip() or None
+                    client_s = view.prompt_for_input("Client ID (blank = any): ").strip()
+                    kind = view.prompt_for_input("Kind: ").strip() or None
+                    sid = self.adjustments.add_schedule(name, amount, start, end, kind, int(eid_s) if eid_s else None,
+                                                        department, role, int(client_s) if client_s else None)
+                    view.display_success(f"Schedule {sid} created")
+                elif ch == "6":  # List schedules
+                    month = view.prompt_for_input("Running in month (YYYY-MM, blank = all): ").strip() or None
+                    view.display_adjustment_schedules(self.adjustments.schedules(month))
+                elif ch == "7":  # End schedule
+                    sid = int(view.prompt_for_input("Schedule ID: ").strip())
+                    end = view.prompt_for_input("Last month it applies to (YYYY-MM): ").strip()
+                    self.adjustments.end_schedule(sid, end)
+                    view.display_success(f"Schedule {sid} ends after {end}")
+                elif ch == "8":  # Back
+                    break
+                else:
+                    view.display_invalid_choice_message()
+            except ValueError as e:
+                view.display_error(str(e) or "Invalid input")
+            except Exception as e:
+                view.display_error(f"Error: {e}")
@@ -1,20 +1,35 @@
 from typing import Optional
 from calendar import monthrange
 from models.database import Database
+from services.client_report_service import ClientReportService, quarter_range
+from services.anomaly_service import AnomalyScanner
+from services.rollup_service import PayrollRollups
+from services.columnar_export_service import ColumnarExportService, pyarrow_available
+from services.shard_service import ShardedPayrollService, ShardedClientReports
+from src.services.tracing import traced
 
 class ReportsController:
-    def __init__(self, db, view, payroll_service=None, attendance_controller=None, current_user=None):
+    def __init__(self, db, view, payroll_service=None, attendance_controller=None, current_user=None, client_report_service=None, anomaly_scanner=None, rollups=None, columnar_export=None, router=None):
         self.db = db
         self.view = view
         self.payroll_service = payroll_service
         self.attendance_controller = attendance_controller
         self.current_user = current_user
+        self.client_report_service = client_report_service or ClientReportService(db)
+        self.anomaly_scanner = anomaly_scanner or AnomalyScanner(db)
+        self.rollups = rollups or getattr(payroll_service, "rollups", None) or PayrollRollups(db)
+        self.columnar_export = columnar_export or ColumnarExportService(db)
+        # with more than one shard, client statements and the all-sites payroll run go through the router
+        self.router = router if router is not None and router.shard_map.sharded else None
+        self.sharded_reports = ShardedClientReports(self.router) if self.router else None
+        self.sharded_payroll = ShardedPayrollService(self.router) if self.router else None
 
     def _check_admin(self):
         """Raise error if not admin."""
         if not getattr(self.current_user, "is_hr", False):
             raise PermissionError("Only admins can access reports")
 
+    @traced("reports.generate_monthly_report")
     def generate_monthly_report(self, year: int, month: int):
         payroll = self.payroll_service.generate_payroll_for_month(year, month)
         days = monthrange(year, month)[1]
@@ -35,10 +50,57 @@ class ReportsController:
             print(report)
         return report
 
+    @traced("reports.export_monthly_report_csv")
     def export_monthly_report_csv(self, year: int, month: int, out_path: Optional[str] = None):
         # delegate to payroll_service export (it persists payroll_runs)
         return self.payroll_service.export_monthly_csv(year, month, out_path)
 
+    @traced("reports.export_client_statement")
+    def export_client_statement(self, client_id: int, start_date: str, end_date: str, fmt: str = "csv", out_path: Optional[str] = None) -> str:
+        self._check_admin()
+        if self.sharded_reports:
+            # the client's rows live on the shard that owns it, not necessarily this terminal's
+            return self.sharded_reports.export_client_statement(client_id, start_date, end_date, out_path=out_path, fmt=fmt)
+        return self.client_report_service.export_client_statement(client_id, start_date, end_date, out_path=out_path, fmt=fmt)
+
+    @traced("reports.export_quarter_statements")
+    def export_quarter_statements(self, year: int, quarter: int, fmt: str = "csv", out_dir: str = ".") -> list:
+        self._check_admin()
+        if self.sharded_reports:
+            start, end = quarter_range(year, quarter)
+            return self.sharded_reports.export_all_statements(start, end, out_dir=out_dir, fmt=fmt)
+        return self.client_report_service.export_quarter_statements(year, quarter, out_dir=out_dir, fmt=fmt)
+
+    @traced("reports.payroll_for_month")
+    def payroll_for_month(self, year: int, month: int, all_sites: bool = False) -> list:
+        """Month payroll for this terminal's shard, or for every shard merged by employee id."""
+        if all_sites and self.sharded_payroll:
+            self._check_admin()
+            return self.sharded_payroll.generate_payroll_for_month(year, month)
+        return self.payroll_service.generate_payroll_for_month(year, month)
+
+    @traced("reports.scan_anomalies")
+    def scan_anomalies(self, year: int) -> dict:
+        self._check_admin()
+        return self.anomaly_scanner.scan_year(year)
+
+    @traced("reports.list_anomalies")
+    def list_anomalies(self, employee_id: Optional[int] = None):
+        self._check_admin()
+        return self.anomaly_scanner.findings(employee_id)
+
+    @traced("reports.export_payroll_totals")
+    def export_payroll_totals(self, kind: str, year: int, part: Optional[int] = None, fmt: str = "csv", out_path: Optional[str] = None) -> tuple:
+        """YTD (part = month), quarterly (part = quarter) or annual payroll totals from the rollups. Returns (path, rows)."""
+        self._check_admin()
+        return self.rollups.export(kind, year, part, out_path=out_path, fmt=fmt)
+
+    @traced("reports.export_analytics")
+    def export_analytics(self, out_dir: str = ".", fmt: str = "parquet", years: Optional[tuple] = None) -> list:
+        """Attendance, payroll_runs and per-day hours for (first_year, last_year) or all history as Parquet/Arrow (CSV without pyarrow)."""
+        self._check_admin()
+        return self.columnar_export.export_all(out_dir, fmt, years=years)
+
     def handle_reports(self):
         view = self.view
         if view is None:
@@ -63,8 +125,7 @@ class ReportsController:
                     eid = int(eid_s)
                     start = view.prompt_for_input("Start date (YYYY-MM-DD) or blank: ").strip() or None
                     end = view.prompt_for_input("End date (YYYY-MM-DD) or blank: ").strip() or None
-                    recs = self.attendance_controller.list_records(eid, start, end)
-                    view.display_attendance_records(recs)
+                    view.page_attendance_records(lambda **kw: self.attendance_controller.page_records(eid, start, end, **kw))
                 except ValueError:
                     view.display_error("Invalid employee ID")
                 except Exception as e:
@@ -81,7 +142,8 @@ class ReportsController:
                     if not (1 <= month <= 12):
                         view.display_error("Month must be 1-12")
                         continue
-                    results = self.payroll_service.generate_payroll_for_month(year, month)
+                    all_sites = bool(self.sharded_payroll) and view.prompt_for_input("All sites? (y/N): ").strip().lower() == "y"
+                    results = self.payroll_for_month(year, month, all_sites)
                     if results:
                         view.display_message(f"\nPayroll Report {year}-{month:02d}:\n")
                         for r in results:
@@ -95,7 +157,83 @@ class ReportsController:
                     view.display_error("Invalid year/month")
                 except Exception as e:
                     view.display_error(f"Error: {e}")
-            elif ch == "3":  # Back
+            elif ch == "3":  # Client hours statement
+                try:
+                    cid = int(view.prompt_for_input("Client ID: ").strip())
+                    start = view.prompt_for_input("Start date (YYYY-MM-DD): ").strip()
+                    end = view.prompt_for_input("End date (YYYY-MM-DD): ").strip()
+                    if not start or not end:
+                        view.display_error("Start and end dates required")
+                        continue
+                    fmt = view.prompt_for_input("Format (csv/pdf) [csv]: ").strip().lower() or "csv"
+                    path = self.export_client_statement(cid, start, end, fmt=fmt)
+                    view.display_success(f"Client statement exported to: {path}")
+                except ValueError as e:
+                    view.display_error(f"Invalid input: {e}")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "4":  # Quarterly statements for every client
+                try:
+                    year = int(view.prompt_for_input("Year (YYYY): ").strip())
+                    quarter = int(view.prompt_for_input("Quarter (1-4): ").strip())
+                    start, end = quarter_range(year, quarter)
+                    fmt = view.prompt_for_input("Format (csv/pdf) [csv]: ").strip().lower() or "csv"
+                    out_dir = view.prompt_for_input("Output folder [.]: ").strip() or "."
+                    paths = self.export_quarter_statements(year, quarter, fmt=fmt, out_dir=out_dir)
+                    view.display_success(f"Exported {len(paths)} client statements for {start} to {end}")
+                except ValueError as e:
+                    view.display_error(f"Invalid input: {e}")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "5":  # Attendance anomalies
+                try:
+                    year = int(view.prompt_for_input("Year to scan (YYYY): ").strip())
+                    counts = self.scan_anomalies(year)
+                    view.display_message(f"Anomaly scan {year}: " + (", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "none found"))
+                    eid_s = view.prompt_for_input("Show findings for employee ID (blank for all): ").strip()
+                    view.display_anomalies(self.list_anomalies(int(eid_s) if eid_s else None))
+                except ValueError:
+                    view.display_error("Invalid year or employee ID")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "6":  # Payroll totals from rollups
+                try:
+                    kind = {"1": "ytd", "2": "quarter", "3": "annual"}.get(
+                        view.prompt_for_input("1. Year to date  2. Quarter  3. Year: ").strip())
+                    if kind is None:
+                        view.display_error("Choose 1, 2 or 3")
+                        continue
+                    year = int(view.prompt_for_input("Year (YYYY): ").strip())
+                    part = None
+                    if kind == "ytd":
+                        part = int(view.prompt_for_input("Through month (1-12): ").strip())
+                    elif kind == "quarter":
+                        part = int(view.prompt_for_input("Quarter (1-4): ").strip())
+                    fmt = view.prompt_for_input("Format (csv/pdf) [csv]: ").strip().lower() or "csv"
+                    path, n = self.export_payroll_totals(kind, year, part, fmt=fmt)
+                    view.display_success(f"{n} employee rows exported to: {path}")
+                except ValueError as e:
+                    view.display_error(f"Invalid input: {e}")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "7":  # Columnar analytics export
+                try:
+                    fmt = view.prompt_for_input("Format (parquet/arrow) [parquet]: ").strip().lower() or "parquet"
+                    out_dir = view.prompt_for_input("Output folder [.]: ").strip() or "."
+                    span_s = view.prompt_for_input("Years (YYYY or YYYY-YYYY, blank for all history): ").strip()
+                    years = None
+                    if span_s:
+                        first, _, last = span_s.partition("-")
+                        years = (int(first), int(last or first))
+                    if not pyarrow_available():
+                        view.display_message("pyarrow is not installed; writing CSV files instead")
+                    for path, n in self.export_analytics(out_dir, fmt, years):
+                        view.display_success(f"{n} rows exported to: {path}")
+                except ValueError as e:
+                    view.display_error(f"Invalid input: {e}")
+                except Exception as e:
+                    view.display_error(f"Error: {e}")
+            elif ch == "8":  # Back
                 break
             else:
                 view.display_invalid_choice_message()
@@ -1,25 +1,40 @@
+import os
 import pathlib
 import sys
 from getpass import getpass
 
-# Ensure src/ (this folder) is on sys.path so "controllers", "models", "services", "views" resolve.
+# Ensure src/ (this folder) is on sys.path so "controllers", "models", "services", "views" resolve;
+# services import through the "src." package when loaded outside it, so the project root is needed too.
 SRC_DIR = pathlib.Path(__file__).resolve().parent
-if str(SRC_DIR) not in sys.path:
-    sys.path.insert(0, str(SRC_DIR))
+for _p in (SRC_DIR.parent, SRC_DIR):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
 
 from views.cli_view import CLIView
 from models.database import Database
 from models.user import UserModel
+from models.employee import EmployeeCache
+from models.shards import ShardRouter
 from controllers.employees_controller import EmployeesController
 from controllers.attendance_controller import AttendanceController
 from controllers.payroll_controller import PayrollController
 from controllers.reports_controller import ReportsController
+from controllers.clients_controller import ClientsController
+from controllers.backup_controller import BackupController
 from services.payroll_service import PayrollService
+from services.audit_service import AttendanceAuditLog
+from services.scheduler_service import JobScheduler
+from src.services.tracing import configure_from_env
 
 def bootstrap():
     view = CLIView()
-    db = Database()  # ensures schema exists
-    user_model = UserModel(db)
+    # metrics/tracing sink from QUICKHIRE_METRICS (memory, jsonl:<path>, prometheus:<path>); off when unset
+    configure_from_env()
+    # each site terminal works against its own shard file (QUICKHIRE_SHARD), default shard otherwise
+    router = ShardRouter()
+    db = router.db(os.environ.get("QUICKHIRE_SHARD"))  # ensures schema exists
+    employee_cache = EmployeeCache.shared(db)
+    user_model = UserModel(db, employee_cache=employee_cache)
 
     view.display_message("Please sign in")
     username = view.prompt_for_input("Username: ").strip()
@@ -31,11 +46,22 @@ def bootstrap():
         return None
 
     # prepare service/controllers with current_user context
-    payroll_service = PayrollService(db)
-    employees_ctrl = EmployeesController(db=db, view=view, current_user=user)
-    attendance_ctrl = AttendanceController(db=db, view=view, current_user=user, payroll_service=payroll_service)
+    payroll_service = PayrollService(db, employee_cache=employee_cache)
+    employees_ctrl = EmployeesController(db=db, view=view, current_user=user, employee_cache=employee_cache)
+    audit_log = AttendanceAuditLog(db)
+    attendance_ctrl = AttendanceController(db=db, view=view, current_user=user, payroll_service=payroll_service, audit_log=audit_log, router=router)
+    # periodic missing sign-out sweep (interval and flag/auto-close policy in config/attendance_policy.json);
+    # only HR terminals sweep, employee logins just clock in and out
+    if getattr(user, "is_hr", False):
+        attendance_ctrl.sweeper.start()
     payroll_ctrl = PayrollController(db=db, view=view, payroll_service=payroll_service, current_user=user)
-    reports_ctrl = ReportsController(db=db, view=view, payroll_service=payroll_service, attendance_controller=attendance_ctrl, current_user=user)
+    reports_ctrl = ReportsController(db=db, view=view, payroll_service=payroll_service, attendance_controller=attendance_ctrl, current_user=user, router=router)
+    clients_ctrl = ClientsController(db=db, view=view, current_user=user)
+    backup_ctrl = BackupController(db=db, view=view, current_user=user)
+    # month-end payroll, exports, hourly snapshots and upkeep on cron slots (config/scheduler.json); the
+    # job lease keeps other terminals or the API server from running the same job twice
+    scheduler = JobScheduler(db, payroll_service=payroll_service, backup_service=backup_ctrl.backup_service)
+    scheduler.start()
 
     return {
         "view": view,
@@ -44,7 +70,10 @@ def bootstrap():
         "employees_ctrl": employees_ctrl,
         "attendance_ctrl": attendance_ctrl,
         "payroll_ctrl": payroll_ctrl,
-        "reports_ctrl": reports_ctrl
+        "reports_ctrl": reports_ctrl,
+        "clients_ctrl": clients_ctrl,
+        "backup_ctrl": backup_ctrl,
+        "scheduler": scheduler
     }
 
 def main():
@@ -57,6 +86,8 @@ def main():
     attendance = ctx["attendance_ctrl"]
     payroll = ctx["payroll_ctrl"]
     reports = ctx["reports_ctrl"]
+    clients = ctx["clients_ctrl"]
+    backups = ctx["backup_ctrl"]
     current_user = ctx["user"]
 
     view.display_welcome_message(current_user.username)
@@ -82,6 +113,18 @@ def main():
                 reports.handle_reports()
             else:
                 view.display_error("Only admins can access reports")
+        elif choice == "5":
+            # Only admins can manage clients and placements
+            if getattr(current_user, "is_hr", False):
+                clients.handle_clients()
+            else:
+                view.display_error("Only admins can manage clients")
+        elif choice == "6":
+            # Only admins can back up or restore the database
+            if getattr(current_user, "is_hr", False):
+                backups.handle_backups()
+            else:
+                view.display_error("Only admins can manage backups")
         elif choice.lower() == "q":
             view.display_exit_message()
             break
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Optional, Iterable
+from .database import Database
+
+@dataclass
+class Adjustment:
+    """One allowance (positive) or deduction (negative) for an employee's month."""
+    id: int | None
+    employee_id: int
+    year: int
+    month: int
+    amount_cents: int
+    kind: Optional[str] = None
+    note: Optional[str] = None
+
+    @property
+    def amount(self) -> float:
+        return self.amount_cents / 100
+
+@dataclass
+class AdjustmentSchedule:
+    """
+    A recurring adjustment for every month from start_month to end_month (YYYY-MM,
+    None = open-ended) and every active employee matching the filters (None = any).
+    """
+    id: int | None
+    name: str
+    amount_cents: int
+    start_month: str
+    end_month: Optional[str] = None
+    kind: Optional[str] = None
+    employee_id: Optional[int] = None
+    department: Optional[str] = None
+    role: Optional[str] = None
+    client_id: Optional[int] = None
+    note: Optional[str] = None
+
+    @property
+    def amount(self) -> float:
+        return self.amount_cents / 100
+
+_SCHEDULE_COLUMNS = "id, name, amount_cents, start_month, end_month, kind, employee_id, department, role, client_id, note"
+
+class AdjustmentModel:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def add_many(self, adjustments: Iterable[Adjustment]) -> int:
+        """Insert all rows with one executemany in one transaction. Returns the row count."""
+        rows = [(a.employee_id, a.year, a.month, a.amount, a.amount_cents, a.kind, a.note) for a in adjustments]
+        with self.db.transaction(immediate=True) as conn:
+            conn.executemany("INSERT INTO adjustments (employee_id, year, month, amount, amount_cents, kind, note) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def delete(self, adjustment_id: int) -> None:
+        self.db.execute("DELETE FROM adjustments WHERE id = ?", (adjustment_id,))
+
+    def list_for_month(self, year: int, month: int, employee_id: Optional[int] = None) -> list[Adjustment]:
+        sql, params = "SELECT id, employee_id, year, month, amount, amount_cents, kind, note FROM adjustments WHERE year = ? AND month = ?", (year, month)
+        if employee_id is not None:
+            sql, params = sql + " AND employee_id = ?", (*params, employee_id)
+        rows = self.db.query(sql + " ORDER BY employee_id, id", params)
+        return [Adjustment(id=r["id"], employee_id=r["employee_id"], year=r["year"], month=r["month"],
+                           amount_cents=r["amount_cents"],
+                           kind=r["kind"], note=r["note"]) for r in rows]
+
+    def add_schedule(self, schedule: AdjustmentSchedule) -> int:
+        cur = self.db.execute(
+            "INSERT INTO adjustment_schedules (name, amount_cents, start_month, end_month, kind, employee_id, department, role, client_id, note) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (schedule.name, schedule.amount_cents, schedule.start_month, schedule.end_month, schedule.kind,
+             schedule.employee_id, schedule.department, schedule.role, schedule.client_id, schedule.note)
+        )
+        return cur.lastrowid
+
+    def get_schedule(self, schedule_id: int) -> Optional[AdjustmentSchedule]:
+        row = self.db.fetchone(f"SELECT {_SCHEDULE_COLUMNS} FROM adjustment_schedules WHERE id = ?", (schedule_id,))
+        return AdjustmentSchedule(**{k: row[k] for k in row.keys()}) if row else None
+
+    def set_schedule_end(self, schedule_id: int, end_month: Optional[str]) -> None:
+        self.db.execute("UPDATE adjustment_schedules SET end_month = ? WHERE id = ?", (end_month, schedule_id))
+
+    def list_schedules(self, month: Optional[str] = None) -> list[AdjustmentSchedule]:
+        """All schedules, or those running in `month` (YYYY-MM)."""
+        sql, params = f"SELECT {_SCHEDULE_COLUMNS} FROM adjustment_schedules", ()
+        if month is not None:
+            sql, params = sql + " WHERE start_month <= ? AND (end_month IS NULL OR end_month >= ?)", (month, month)
+        rows = self.db.query(sql + " ORDER BY start_month, id", params)
+        return [AdjustmentSchedule(**{k: r[k] for k in r.keys()}) for r in rows]
@@ -1,5 +1,6 @@
+import sqlite3
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from .database import Database
 
 @dataclass
@@ -27,37 +28,49 @@ class AttendanceModel:
             (employee_id, date, time_in, time_out, hours)
         )
 
-    def clock_in(self, employee_id: int, date: str, time_in: str) -> int:
-        # Prevent duplicate open shift for same date
-        open_rows = self.db.query(
-            'SELECT id FROM attendance WHERE employee_id=? AND date=? AND time_out IS NULL ORDER BY id DESC LIMIT 1',
-            (employee_id, date)
-        )
-        if open_rows:
-            raise ValueError("Open shift already exists for this employee and date")
-        return self.db.execute(
-            'INSERT INTO attendance(employee_id, date, time_in, time_out, hours) VALUES(?,?,?,?,0)',
-            (employee_id, date, time_in, None)
-        )
+    def clock_in(self, employee_id: int, note: str = "", timestamp: str | None = None,
+                 stale_after_hours: float | None = None) -> tuple[int, str]:
+        """
+        Record a live sign_in as one INSERT; the open_shifts triggers reject it if the
+        employee is already on shift, so concurrent clock-ins cannot both succeed. An
+        open shift older than stale_after_hours is released first (its sign_in stays
+        for the missing sign-out sweeper). Returns (attendance id, timestamp).
+        """
+        try:
+            with self.db.transaction(immediate=True) as conn:
+                # stamped under the write lock so event order matches commit order
+                ts = timestamp or datetime.now().isoformat()
+                if stale_after_hours is not None:
+                    cutoff = (datetime.fromisoformat(ts) - timedelta(hours=stale_after_hours)).isoformat()
+                    conn.execute('DELETE FROM open_shifts WHERE employee_id=? AND opened_at < ?', (employee_id, cutoff))
+                cur = conn.execute(
+                    "INSERT INTO attendance(employee_id, event, timestamp, corrected_by_hr, note) VALUES(?, 'sign_in', ?, 0, ?)",
+                    (employee_id, ts, note)
+                )
+                return cur.lastrowid, ts
+        except sqlite3.IntegrityError as e:
+            if 'already signed in' in str(e):
+                raise ValueError("Employee is already signed in") from None
+            raise
 
-    def clock_out(self, employee_id: int, date: str, time_out: str) -> None:
-        # Find last open shift
-        rows = self.db.query(
-            'SELECT id, time_in FROM attendance WHERE employee_id=? AND date=? AND time_out IS NULL ORDER BY id DESC LIMIT 1',
-            (employee_id, date)
-        )
-        if not rows:
-            raise ValueError("No open shift to clock out for this employee and date")
-        rec = rows[0]
-        t_in = datetime.strptime(rec['time_in'], "%H:%M")
-        t_out = datetime.strptime(time_out, "%H:%M")
-        if t_out <= t_in:
-            raise ValueError("time_out must be after time_in")
-        hours = round((t_out - t_in).total_seconds() / 3600.0, 2)
-        self.db.execute(
-            'UPDATE attendance SET time_out=?, hours=? WHERE id=?',
-            (time_out, hours, rec['id'])
-        )
+    def clock_out(self, employee_id: int, note: str = "", timestamp: str | None = None) -> tuple[int, str]:
+        """Record a live sign_out closing the employee's open shift; one INSERT, rejected if there is none."""
+        try:
+            with self.db.transaction(immediate=True) as conn:
+                ts = timestamp or datetime.now().isoformat()
+                cur = conn.execute(
+                    "INSERT INTO attendance(employee_id, event, timestamp, corrected_by_hr, note) VALUES(?, 'sign_out', ?, 0, ?)",
+                    (employee_id, ts, note)
+                )
+                return cur.lastrowid, ts
+        except sqlite3.IntegrityError as e:
+            if 'not signed in' in str(e):
+                raise ValueError("Employee is not signed in") from None
+            raise
+
+    def open_shift(self, employee_id: int):
+        """The employee's open shift row (sign_in_id, opened_at), or None."""
+        return self.db.fetchone('SELECT sign_in_id, opened_at FROM open_shifts WHERE employee_id=?', (employee_id,))
 
     def list_for_employee(self, employee_id: int) -> list[Attendance]:
         rows = self.db.query(
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from .database import Database
+
+@dataclass
+class Client:
+    id: int | None
+    name: str
+    contact: Optional[str] = None
+    active: bool = True
+
+@dataclass
+class Placement:
+    id: int | None
+    client_id: int
+    employee_id: int
+    start_date: str
+    end_date: Optional[str] = None
+    site: Optional[str] = None
+
+class ClientModel:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def add(self, client: Client) -> int:
+        cur = self.db.execute(
+            "INSERT INTO clients (name, contact, active, created_at) VALUES (?, ?, 1, ?)",
+            (client.name, client.contact, datetime.now().isoformat())
+        )
+        return cur.lastrowid
+
+    def deactivate(self, client_id: int) -> None:
+        # Soft-delete: placements and reports for past periods stay intact
+        self.db.execute("UPDATE clients SET active = 0 WHERE id = ?", (client_id,))
+
+    def place(self, placement: Placement) -> int:
+        """Place an employee with a client. Overlapping placements for the same employee are rejected."""
+        end = placement.end_date or "9999-12-31"
+        if end < placement.start_date:
+            raise ValueError("end_date must not be before start_date")
+        clash = self.db.fetchone(
+            "SELECT id FROM placements WHERE employee_id = ? AND start_date <= ? AND COALESCE(end_date, '9999-12-31') >= ? LIMIT 1",
+            (placement.employee_id, end, placement.start_date)
+        )
+        if clash:
+            raise ValueError(f"Employee {placement.employee_id} already has an overlapping placement ({clash['id']})")
+        cur = self.db.execute(
+            "INSERT INTO placements (client_id, employee_id, start_date, end_date, site, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (placement.client_id, placement.employee_id, placement.start_date, placement.end_date, placement.site, datetime.now().isoformat())
+        )
+        return cur.lastrowid
+
+    def end_placement(self, placement_id: int, end_date: str) -> None:
+        self.db.execute("UPDATE placements SET end_date = ? WHERE id = ?", (end_date, placement_id))
+
+    def placements_for_client(self, client_id: int) -> list[Placement]:
+        rows = self.db.query(
+            "SELECT id, client_id, employee_id, start_date, end_date, site FROM placements WHERE client_id = ? ORDER BY start_date, employee_id",
+            (client_id,)
+        )
+        return [Placement(**{k: r[k] for k in r.keys()}) for r in rows]
+
+    def client_for_employee(self, employee_id: int, date: str) -> Optional[int]:
+        """Client the employee was placed with on the given date (YYYY-MM-DD), if any."""
+        row = self.db.fetchone(
+            "SELECT client_id FROM placements WHERE employee_id = ? AND start_date <= ? AND COALESCE(end_date, '9999-12-31') >= ? ORDER BY start_date DESC LIMIT 1",
+            (employee_id, date, date)
+        )
+        return row["client_id"] if row else None
+
+    def list(self) -> list[Client]:
+        rows = self.db.query("SELECT id, name, contact, active FROM clients WHERE active = 1 ORDER BY name")
+        return [Client(id=r["id"], name=r["name"], contact=r["contact"], active=bool(r["active"])) for r in rows]
@@ -1,5 +1,7 @@
 from pathlib import Path
-from typing import List, Any
+from typing import List, Any, Iterator
+from contextlib import contextmanager, closing
+import queue
 import sqlite3
 import hashlib
 
@@ -7,22 +9,71 @@ import hashlib
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DB_PATH = PROJECT_ROOT / "attendance_payroll.db"
 
+class _PooledConnection(sqlite3.Connection):
+    """Connection whose close() hands it back to its Database's pool while there is room."""
+    pool = None
+
+    def close(self):
+        if self.pool is None or not self.pool._release(self):
+            super().close()
+
+
 class Database:
-    def __init__(self, db_path: Path | str = DB_PATH):
+    def __init__(self, db_path: Path | str = DB_PATH, pool_size: int = 0):
+        """
+        pool_size > 0 keeps up to that many idle connections for reuse, so a long-running
+        server skips the per-call connect and schema parse. Connections are checked out
+        per call exactly as unpooled ones are opened, so nested calls still get their own.
+        """
         db_path = Path(db_path)
         db_path.parent.mkdir(parents=True, exist_ok=True)
         self.db_path = str(db_path)
+        self._idle = queue.LifoQueue(maxsize=pool_size) if pool_size > 0 else None
         self._ensure_schema()
 
     def _connect(self) -> sqlite3.Connection:
+        if self._idle is not None:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                                       check_same_thread=False, factory=_PooledConnection)
+                conn.pool = self
+                conn.row_factory = sqlite3.Row
+                return conn
         conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
         conn.row_factory = sqlite3.Row
         return conn
 
+    def _release(self, conn: sqlite3.Connection) -> bool:
+        if conn.in_transaction:
+            conn.rollback()
+        # archive reads ATTACH year files; hand the connection back without them
+        for r in conn.execute("PRAGMA database_list").fetchall():
+            if r["name"] not in ("main", "temp"):
+                conn.execute(f"DETACH DATABASE {r['name']}")
+        try:
+            self._idle.put_nowait(conn)
+            return True
+        except queue.Full:
+            return False
+
+    def close_pool(self) -> None:
+        """Close every idle pooled connection."""
+        while self._idle is not None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.pool = None
+            conn.close()
+
     def _ensure_schema(self):
         # create tables if they don't exist and keep backward compatibility
         with self._connect() as conn:
             cur = conn.cursor()
+            # WAL lets readers (reports, online backups) run alongside sign-in/out writes
+            cur.execute("PRAGMA journal_mode=WAL")
             # employees first (users will reference employees)
             cur.execute("""
             CREATE TABLE IF NOT EXISTS employees (
@@ -89,6 +140,179 @@ class Database:
                 FOREIGN KEY(employee_id) REFERENCES employees(id)
             )
             """)
+            # client companies and the date ranges employees are placed with them
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS clients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                contact TEXT,
+                active INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS placements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_id INTEGER NOT NULL,
+                employee_id INTEGER NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT,
+                site TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(client_id) REFERENCES clients(id),
+                FOREIGN KEY(employee_id) REFERENCES employees(id)
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_placements_employee ON placements(employee_id, start_date)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_placements_client ON placements(client_id, start_date)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_employee_ts ON attendance(employee_id, timestamp)")
+            # time-range scans that are not per employee (missing sign-out sweep lookback)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_ts ON attendance(timestamp)")
+            # append-only, hash-chained log of every attendance mutation
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_audit (
+                seq INTEGER PRIMARY KEY,
+                attendance_id INTEGER,
+                employee_id INTEGER,
+                action TEXT NOT NULL,
+                actor TEXT,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                prev_hash TEXT NOT NULL,
+                hash TEXT NOT NULL
+            )
+            """)
+            cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS attendance_audit_no_update BEFORE UPDATE ON attendance_audit
+            BEGIN SELECT RAISE(ABORT, 'attendance_audit is append-only'); END
+            """)
+            cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS attendance_audit_no_delete BEFORE DELETE ON attendance_audit
+            BEGIN SELECT RAISE(ABORT, 'attendance_audit is append-only'); END
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_audit_checkpoints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seq INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                verified INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            # payroll period status (a month is archivable once its payroll is closed)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_periods (
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'open',
+                closed_at TEXT,
+                snapshot_hash TEXT,
+                last_change_id INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(year, month)
+            )
+            """)
+            # frozen per-employee results of a closed period, plus the delta lines of later re-runs
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_snapshots (
+                employee_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                input_hash TEXT NOT NULL,
+                hourly_rate REAL NOT NULL,
+                regular_hours REAL NOT NULL,
+                overtime_hours REAL NOT NULL,
+                gross REAL NOT NULL,
+                adjustments REAL NOT NULL,
+                tax REAL NOT NULL,
+                net REAL NOT NULL,
+                gross_cents INTEGER,
+                adjustments_cents INTEGER,
+                tax_cents INTEGER,
+                net_cents INTEGER,
+                PRIMARY KEY(employee_id, year, month)
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_deltas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                input_hash TEXT NOT NULL,
+                regular_hours REAL NOT NULL,
+                overtime_hours REAL NOT NULL,
+                gross REAL NOT NULL,
+                adjustments REAL NOT NULL,
+                tax REAL NOT NULL,
+                net REAL NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                gross_cents INTEGER,
+                adjustments_cents INTEGER,
+                tax_cents INTEGER,
+                net_cents INTEGER,
+                hourly_rate REAL
+            )
+            """)
+            self._ensure_period_cents(cur)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_payroll_deltas_period ON payroll_deltas(year, month, employee_id)")
+            # change log of payroll inputs touching closed periods, filled by triggers
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                ref_id INTEGER,
+                changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_payroll_changes_period ON payroll_changes(year, month, id)")
+            # hourly rate intervals; effective_to NULL means "until further notice"
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS rate_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                rate REAL NOT NULL,
+                effective_from TEXT NOT NULL,
+                effective_to TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(employee_id) REFERENCES employees(id)
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_rate_history_employee ON rate_history(employee_id, effective_from)")
+            # employees from before rate history existed get their current rate as an open interval
+            cur.execute("""
+            INSERT INTO rate_history (employee_id, rate, effective_from)
+            SELECT e.id, e.rate, '1970-01-01' FROM employees e
+            WHERE NOT EXISTS (SELECT 1 FROM rate_history r WHERE r.employee_id = e.id)
+            """)
+            self._ensure_change_triggers(cur)
+            self._ensure_open_shifts(cur)
+            # months moved out of the attendance table into per-year archive files
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_partitions (
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                archived_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY(year, month)
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_rollups (
+                employee_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                days_worked INTEGER NOT NULL,
+                total_hours REAL NOT NULL,
+                regular_hours REAL NOT NULL,
+                overtime_hours REAL NOT NULL,
+                event_count INTEGER NOT NULL,
+                PRIMARY KEY(employee_id, year, month)
+            )
+            """)
             # ensure users table has columns for older DBs
             cur.execute("PRAGMA table_info(users)")
             cols = [r[1] for r in cur.fetchall()]
@@ -102,12 +326,431 @@ class Database:
                     cur.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
                 except Exception:
                     pass
+            cur.execute("PRAGMA table_info(payroll_periods)")
+            period_cols = [r[1] for r in cur.fetchall()]
+            for col, ddl in (("snapshot_hash", "TEXT"), ("last_change_id", "INTEGER NOT NULL DEFAULT 0")):
+                if col not in period_cols:
+                    try:
+                        cur.execute(f"ALTER TABLE payroll_periods ADD COLUMN {col} {ddl}")
+                    except Exception:
+                        pass
+            # exact running totals (Fraction text) behind the rounded payroll_runs columns
+            cur.execute("PRAGMA table_info(payroll_runs)")
+            run_cols = [r[1] for r in cur.fetchall()]
+            for col in ("regular_exact", "overtime_exact", "gross_exact"):
+                if col not in run_cols:
+                    try:
+                        cur.execute(f"ALTER TABLE payroll_runs ADD COLUMN {col} TEXT")
+                    except Exception:
+                        pass
+            # money in integer cents; the REAL columns hold the same values for older readers
+            for col in ("gross_cents", "adjustments_cents", "tax_cents", "net_cents"):
+                if col not in run_cols:
+                    try:
+                        cur.execute(f"ALTER TABLE payroll_runs ADD COLUMN {col} INTEGER")
+                    except Exception:
+                        pass
+            # per-employee tax code (NULL means the table's default code)
+            cur.execute("PRAGMA table_info(employees)")
+            emp_cols = [r[1] for r in cur.fetchall()]
+            if "tax_code" not in emp_cols:
+                try:
+                    cur.execute("ALTER TABLE employees ADD COLUMN tax_code TEXT")
+                except Exception:
+                    pass
+            # shifts (and later other anomalies) waiting for HR, one row per offending record
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_exceptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                employee_id INTEGER NOT NULL,
+                attendance_id INTEGER NOT NULL,
+                opened_at TEXT NOT NULL,
+                proposed_close_at TEXT,
+                detail TEXT,
+                status TEXT NOT NULL DEFAULT 'open',
+                resolution_id INTEGER,
+                resolved_by TEXT,
+                resolved_at TEXT,
+                detected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(kind, attendance_id)
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_exceptions_status ON attendance_exceptions(status, employee_id)")
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_anomalies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                severity TEXT NOT NULL,
+                employee_id INTEGER NOT NULL,
+                attendance_id INTEGER NOT NULL,
+                timestamp TEXT,
+                detail TEXT,
+                status TEXT NOT NULL DEFAULT 'open',
+                detected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(kind, attendance_id)
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_anomalies_employee ON attendance_anomalies(employee_id, timestamp)")
+            # per-day payroll contributions behind the running month totals in payroll_runs
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_day_totals (
+                employee_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                hours REAL NOT NULL,
+                regular REAL NOT NULL,
+                overtime REAL NOT NULL,
+                gross REAL NOT NULL,
+                rate REAL NOT NULL,
+                PRIMARY KEY(employee_id, day)
+            )
+            """)
+            # exact amount in cents, the only value payroll reads; amount (REAL) mirrors it for older readers
+            cur.execute("PRAGMA table_info(adjustments)")
+            if "amount_cents" not in [r[1] for r in cur.fetchall()]:
+                try:
+                    cur.execute("ALTER TABLE adjustments ADD COLUMN amount_cents INTEGER")
+                except Exception:
+                    pass
+            self._ensure_adjustment_cents(cur)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_adjustments_period ON adjustments(year, month, employee_id)")
+            # recurring allowances/deductions, expanded per month when payroll reads adjustment totals;
+            # NULL filters match everyone, months are 'YYYY-MM' and end_month NULL is open-ended
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS adjustment_schedules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                kind TEXT,
+                amount_cents INTEGER NOT NULL,
+                employee_id INTEGER,
+                department TEXT,
+                role TEXT,
+                client_id INTEGER,
+                start_month TEXT NOT NULL,
+                end_month TEXT,
+                note TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            cur.execute("PRAGMA table_info(payroll_day_totals)")
+            if "worked_us" not in [r[1] for r in cur.fetchall()]:
+                try:
+                    cur.execute("ALTER TABLE payroll_day_totals ADD COLUMN worked_us INTEGER NOT NULL DEFAULT 0")
+                except Exception:
+                    pass
+            # one row per employee-month with the month's effective payroll totals and the
+            # running year-to-date sums through that month (kept by PayrollRollups)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS payroll_month_totals (
+                employee_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                regular_hours REAL NOT NULL DEFAULT 0,
+                overtime_hours REAL NOT NULL DEFAULT 0,
+                gross_cents INTEGER NOT NULL DEFAULT 0,
+                adjustments_cents INTEGER NOT NULL DEFAULT 0,
+                tax_cents INTEGER NOT NULL DEFAULT 0,
+                net_cents INTEGER NOT NULL DEFAULT 0,
+                ytd_regular_hours REAL NOT NULL DEFAULT 0,
+                ytd_overtime_hours REAL NOT NULL DEFAULT 0,
+                ytd_gross_cents INTEGER NOT NULL DEFAULT 0,
+                ytd_adjustments_cents INTEGER NOT NULL DEFAULT 0,
+                ytd_tax_cents INTEGER NOT NULL DEFAULT 0,
+                ytd_net_cents INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY(employee_id, year, month)
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_payroll_month_totals_period ON payroll_month_totals(year, month)")
+            # latest run per employee-month (incremental sign-out, rollup rebuild and gap checks)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_payroll_runs_employee_period ON payroll_runs(employee_id, year, month, id)")
+            self._ensure_search_index(cur)
+            # scheduler state: one row per configured job (lease = cross-instance lock) and its run history
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                name TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                cron TEXT NOT NULL,
+                slot TEXT NOT NULL,
+                due_at TEXT NOT NULL,
+                attempt INTEGER NOT NULL DEFAULT 0,
+                locked_by TEXT,
+                locked_until TEXT,
+                last_status TEXT,
+                last_run_at TEXT
+            )
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job TEXT NOT NULL,
+                slot TEXT NOT NULL,
+                attempt INTEGER NOT NULL,
+                instance TEXT,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                duration_ms REAL,
+                status TEXT NOT NULL DEFAULT 'running',
+                error TEXT,
+                result TEXT
+            )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job, id)")
+            # single-row lease so one backup or restore runs at a time across processes
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS backup_lease (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                locked_by TEXT,
+                locked_until TEXT
+            )
+            """)
+            # bumped on every employees write so caches in other processes can tell they are stale
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS cache_generations (
+                name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+            """)
+            cur.execute("INSERT OR IGNORE INTO cache_generations (name, generation) VALUES ('employees', 0)")
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS employees_generation_{op.lower()} AFTER {op} ON employees BEGIN
+                    UPDATE cache_generations SET generation = generation + 1 WHERE name = 'employees';
+                END
+                """)
+            # report validators (API ETags): attendance events, and every payroll input or output
+            # kept in the database (the tax table is config, see ApiServer._etag)
+            generations = {"attendance": ("attendance",),
+                           "payroll": ("payroll_runs", "payroll_deltas", "payroll_periods", "adjustments", "adjustment_schedules",
+                                       "placements", "rate_history")}
+            for name, tables in generations.items():
+                cur.execute("INSERT OR IGNORE INTO cache_generations (name, generation) VALUES (?, 0)", (name,))
+                for table in tables:
+                    for op in ("INSERT", "UPDATE", "DELETE"):
+                        cur.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {table}_generation_{op.lower()} AFTER {op} ON {table} BEGIN
+                            UPDATE cache_generations SET generation = generation + 1 WHERE name = '{name}';
+                        END
+                        """)
             conn.commit()
-            
+
             # Seed default admin account if it doesn't exist
             self._seed_admin_account(cur)
             conn.commit()
 
+    def _ensure_change_triggers(self, cur: sqlite3.Cursor):
+        """Log attendance/adjustment writes that land in a closed payroll period."""
+        att_period = "CAST(substr({r}.timestamp, 1, 4) AS INTEGER), CAST(substr({r}.timestamp, 6, 2) AS INTEGER)"
+        closed = "EXISTS (SELECT 1 FROM payroll_periods WHERE status = 'closed' AND year = {y} AND month = {m})"
+        for op, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+            for r in rows:
+                y, m = f"CAST(substr({r}.timestamp, 1, 4) AS INTEGER)", f"CAST(substr({r}.timestamp, 6, 2) AS INTEGER)"
+                cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS attendance_change_{op.lower()}_{r.lower()} AFTER {op} ON attendance
+                WHEN {closed.format(y=y, m=m)}
+                BEGIN
+                    INSERT INTO payroll_changes (employee_id, year, month, source, ref_id)
+                    VALUES ({r}.employee_id, {att_period.format(r=r)}, 'attendance', {r}.id);
+                END
+                """)
+                cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS adjustments_change_{op.lower()}_{r.lower()} AFTER {op} ON adjustments
+                WHEN {closed.format(y=f"{r}.year", m=f"{r}.month")}
+                BEGIN
+                    INSERT INTO payroll_changes (employee_id, year, month, source, ref_id)
+                    VALUES ({r}.employee_id, {r}.year, {r}.month, 'adjustment', {r}.id);
+                END
+                """)
+
+        # a rate change reaching back into closed months is a payroll input change too, but only
+        # for months the employee has payroll in (a new hire's first rate touches no closed month);
+        # recreated on every open so databases with the older, unconditional trigger pick this up
+        ym = "printf('%04d-%02d', p.year, p.month)"
+        for op in ("INSERT", "UPDATE"):
+            cur.execute(f"DROP TRIGGER IF EXISTS rate_history_change_{op.lower()}")
+            cur.execute(f"""
+            CREATE TRIGGER rate_history_change_{op.lower()} AFTER {op} ON rate_history
+            BEGIN
+                INSERT INTO payroll_changes (employee_id, year, month, source, ref_id)
+                SELECT NEW.employee_id, p.year, p.month, 'rate', NEW.id FROM payroll_periods p
+                WHERE p.status = 'closed'
+                  AND {ym} >= substr(NEW.effective_from, 1, 7)
+                  AND (NEW.effective_to IS NULL OR {ym} <= substr(NEW.effective_to, 1, 7))
+                  AND ({ym} >= (SELECT substr(MIN(timestamp), 1, 7) FROM attendance WHERE employee_id = NEW.employee_id)
+                       OR EXISTS (SELECT 1 FROM payroll_snapshots s WHERE s.employee_id = NEW.employee_id AND s.year = p.year AND s.month = p.month)
+                       OR EXISTS (SELECT 1 FROM payroll_deltas d WHERE d.employee_id = NEW.employee_id AND d.year = p.year AND d.month = p.month)
+                       OR EXISTS (SELECT 1 FROM adjustments a WHERE a.employee_id = NEW.employee_id AND a.year = p.year AND a.month = p.month));
+            END
+            """)
+
+    def _ensure_period_cents(self, cur: sqlite3.Cursor):
+        """
+        Snapshot and delta money in integer cents (the REAL columns mirror them for older
+        readers), so re-runs subtract exact amounts; rows from before the columns existed
+        are filled with money.to_cents. Delta lines also carry the rate they were computed at.
+        """
+        money = ("gross", "adjustments", "tax", "net")
+        for table, extra in (("payroll_snapshots", ()), ("payroll_deltas", (("hourly_rate", "REAL"),))):
+            cur.execute(f"PRAGMA table_info({table})")
+            cols = [r[1] for r in cur.fetchall()]
+            for col, ddl in (*((f"{f}_cents", "INTEGER") for f in money), *extra):
+                if col not in cols:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
+            cur.execute(f"SELECT rowid, {', '.join(money)} FROM {table} WHERE gross_cents IS NULL")
+            missing = cur.fetchall()
+            if missing:
+                try:
+                    from ..services.money import to_cents
+                except Exception:
+                    from src.services.money import to_cents  # type: ignore
+                cur.executemany(f"UPDATE {table} SET {', '.join(f'{f}_cents = ?' for f in money)} WHERE rowid = ?",
+                                [(*(to_cents(v) for v in r[1:]), r[0]) for r in missing])
+
+    def _ensure_adjustment_cents(self, cur: sqlite3.Cursor):
+        """
+        Fill amount_cents for rows written before the column existed, rounded by
+        money.to_cents like every other amount, and refuse new rows without it, so no
+        reader needs a fallback of its own (SQL ROUND on the REAL value rounds 0.285 down).
+        """
+        cur.execute("SELECT id, amount FROM adjustments WHERE amount_cents IS NULL")
+        missing = cur.fetchall()
+        if missing:
+            try:
+                from ..services.money import to_cents
+            except Exception:
+                from src.services.money import to_cents  # type: ignore
+            # filling in a value that was always implied is not a change to a closed period:
+            # skip the change-log triggers for the backfill and put them back afterwards
+            for r in ("old", "new"):
+                cur.execute(f"DROP TRIGGER IF EXISTS adjustments_change_update_{r}")
+            cur.executemany("UPDATE adjustments SET amount_cents = ? WHERE id = ?", [(to_cents(r[1]), r[0]) for r in missing])
+            self._ensure_change_triggers(cur)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS adjustments_cents_required BEFORE INSERT ON adjustments
+        WHEN NEW.amount_cents IS NULL
+        BEGIN
+            SELECT RAISE(ABORT, 'adjustments.amount_cents is required');
+        END
+        """)
+
+    def _ensure_open_shifts(self, cur: sqlite3.Cursor):
+        """
+        At most one open shift per employee, enforced by the database: the primary key
+        on open_shifts plus triggers on attendance, so a live sign_in or sign_out is one
+        INSERT that either updates the open shift or fails as a whole. HR corrections
+        (corrected_by_hr = 1) are never rejected; a corrected sign_out closes the open
+        shift it follows, a corrected sign_in opens one only if nothing later closed it.
+        """
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'open_shifts'")
+        exists = cur.fetchone() is not None
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS open_shifts (
+            employee_id INTEGER PRIMARY KEY,
+            sign_in_id INTEGER NOT NULL,
+            opened_at TEXT NOT NULL
+        )
+        """)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_sign_in_check BEFORE INSERT ON attendance
+        WHEN NEW.event = 'sign_in' AND NEW.corrected_by_hr = 0
+        BEGIN
+            SELECT RAISE(ABORT, 'already signed in') WHERE EXISTS (SELECT 1 FROM open_shifts WHERE employee_id = NEW.employee_id);
+        END
+        """)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_sign_out_check BEFORE INSERT ON attendance
+        WHEN NEW.event = 'sign_out' AND NEW.corrected_by_hr = 0
+        BEGIN
+            SELECT RAISE(ABORT, 'not signed in') WHERE NOT EXISTS (SELECT 1 FROM open_shifts WHERE employee_id = NEW.employee_id);
+        END
+        """)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_open_shift AFTER INSERT ON attendance
+        WHEN NEW.event = 'sign_in'
+        BEGIN
+            INSERT OR IGNORE INTO open_shifts (employee_id, sign_in_id, opened_at)
+            SELECT NEW.employee_id, NEW.id, NEW.timestamp
+            WHERE NEW.corrected_by_hr = 0 OR NOT EXISTS (
+                SELECT 1 FROM attendance WHERE employee_id = NEW.employee_id AND event = 'sign_out' AND timestamp >= NEW.timestamp);
+        END
+        """)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_close_shift AFTER INSERT ON attendance
+        WHEN NEW.event = 'sign_out'
+        BEGIN
+            DELETE FROM open_shifts WHERE employee_id = NEW.employee_id AND (NEW.corrected_by_hr = 0 OR opened_at <= NEW.timestamp);
+        END
+        """)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_drop_shift AFTER DELETE ON attendance
+        WHEN OLD.event = 'sign_in'
+        BEGIN
+            DELETE FROM open_shifts WHERE sign_in_id = OLD.id;
+        END
+        """)
+        # deleting the sign_out that closed the latest shift puts the employee back on shift
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS attendance_reopen_shift AFTER DELETE ON attendance
+        WHEN OLD.event = 'sign_out'
+        BEGIN
+            INSERT OR IGNORE INTO open_shifts (employee_id, sign_in_id, opened_at)
+            SELECT employee_id, id, timestamp FROM (
+                SELECT id, employee_id, event, timestamp FROM attendance
+                WHERE employee_id = OLD.employee_id AND event IN ('sign_in', 'sign_out')
+                ORDER BY timestamp DESC, id DESC LIMIT 1
+            ) WHERE event = 'sign_in';
+        END
+        """)
+        if not exists:
+            # employees whose latest clock event is a sign_in are on shift now
+            cur.execute("""
+            INSERT OR IGNORE INTO open_shifts (employee_id, sign_in_id, opened_at)
+            SELECT employee_id, id, timestamp FROM (
+                SELECT id, employee_id, event, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY timestamp DESC, id DESC) AS rn
+                FROM attendance WHERE event IN ('sign_in', 'sign_out')
+            ) WHERE rn = 1 AND event = 'sign_in'
+            """)
+
+    def _ensure_search_index(self, cur: sqlite3.Cursor):
+        """
+        Trigram FTS5 index over the employee directory, kept in sync by triggers.
+        Skipped when this SQLite build has no FTS5 (search falls back to an in-memory trie).
+        """
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'")
+        exists = cur.fetchone() is not None
+        try:
+            cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+                full_name, role, department, contact,
+                content='employees', content_rowid='id', tokenize='trigram'
+            )
+            """)
+        except sqlite3.OperationalError:
+            return
+        cols = "full_name, role, department, contact"
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS employees_fts_insert AFTER INSERT ON employees BEGIN
+            INSERT INTO employees_fts (rowid, {cols}) VALUES (NEW.id, NEW.full_name, NEW.role, NEW.department, NEW.contact);
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS employees_fts_delete AFTER DELETE ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, {cols}) VALUES ('delete', OLD.id, OLD.full_name, OLD.role, OLD.department, OLD.contact);
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS employees_fts_update AFTER UPDATE OF {cols} ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, {cols}) VALUES ('delete', OLD.id, OLD.full_name, OLD.role, OLD.department, OLD.contact);
+            INSERT INTO employees_fts (rowid, {cols}) VALUES (NEW.id, NEW.full_name, NEW.role, NEW.department, NEW.contact);
+        END
+        """)
+        if not exists:
+            # index employees that were added before the search table existed
+            cur.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+
     def _seed_admin_account(self, cur: sqlite3.Cursor):
         """Create default admin account (username: admin, password: admin) if not exists."""
         # Check if admin user already exists
@@ -130,27 +773,56 @@ class Database:
             pass
 
     def execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
-        with self._connect() as conn:
+        with closing(self._connect()) as conn, conn:
             cur = conn.cursor()
             cur.execute(query, params)
             conn.commit()
             return cur
 
     def executemany(self, query: str, seq_of_params: list[tuple]) -> sqlite3.Cursor:
-        with self._connect() as conn:
+        with closing(self._connect()) as conn, conn:
             cur = conn.cursor()
             cur.executemany(query, seq_of_params)
             conn.commit()
             return cur
 
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Yield a connection whose statements commit together. immediate=True takes the
+        write lock up front (BEGIN IMMEDIATE) so read-then-write sequences cannot race.
+        """
+        conn = self._connect()
+        try:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
     def query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
-        with self._connect() as conn:
+        with closing(self._connect()) as conn, conn:
             cur = conn.cursor()
             cur.execute(query, params)
             return cur.fetchall()
 
     def fetchone(self, query: str, params: tuple = ()) -> Any:
-        with self._connect() as conn:
+        with closing(self._connect()) as conn, conn:
             cur = conn.cursor()
             cur.execute(query, params)
             return cur.fetchone()
+
+    def iterate(self, query: str, params: tuple = (), batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        """Stream rows from a query in fetchmany batches instead of loading them all."""
+        with closing(self._connect()) as conn, conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
@@ -2,6 +2,10 @@ from dataclasses import dataclass
 from .database import Database
 from typing import Optional
 from datetime import datetime
+from pathlib import Path
+import atexit
+import sqlite3
+import threading
 
 @dataclass
 class Employee:
@@ -41,3 +45,121 @@ class EmployeeModel:
                 contact = r.get("contact")
             ))
         return result
+
+EMPLOYEE_CACHE_COLUMNS = "id, full_name, role, department, contact, rate, active, tax_code, created_at"
+
+class EmployeeCache:
+    """
+    Read-through cache of employee rows keyed by id. All active employees are loaded
+    in one query on first use; other ids are fetched (and kept) on demand.
+
+    Writers in this process call invalidate(). Writers elsewhere are caught by a
+    long-lived watch connection: PRAGMA data_version only changes after another
+    connection commits, so the common case costs no query at all; when it does
+    change, the employees generation counter (bumped by triggers) says whether the
+    employees table was actually written.
+
+    Use shared(db) rather than a new instance per service: it hands out one cache
+    (and one watch connection) per database file, closed at exit.
+    """
+    _shared: dict = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, db: Database) -> "EmployeeCache":
+        """The process-wide cache for db's file."""
+        key = str(Path(db.db_path).resolve())
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls._shared[key] = cls(db)
+            return cache
+
+    @classmethod
+    def close_shared(cls) -> None:
+        with cls._shared_lock:
+            caches, cls._shared = list(cls._shared.values()), {}
+        for cache in caches:
+            cache.close()
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._lock = threading.RLock()
+        self._watch = sqlite3.connect(db.db_path, check_same_thread=False, isolation_level=None)
+        self._watch.row_factory = sqlite3.Row
+        self._data_version = None
+        self._generation = None
+        self._rows: Optional[dict] = None
+        self._extra: dict = {}
+
+    def _check(self) -> None:
+        dv = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if dv == self._data_version:
+            return
+        self._data_version = dv
+        gen = self._watch.execute("SELECT generation FROM cache_generations WHERE name = 'employees'").fetchone()
+        if gen is None or gen[0] != self._generation:
+            self._rows = None
+
+    def _load(self) -> dict:
+        if self._rows is None:
+            self._watch.execute("BEGIN")
+            try:
+                gen = self._watch.execute("SELECT generation FROM cache_generations WHERE name = 'employees'").fetchone()
+                rows = self._watch.execute(f"SELECT {EMPLOYEE_CACHE_COLUMNS} FROM employees WHERE active = 1 ORDER BY id").fetchall()
+            finally:
+                self._watch.execute("COMMIT")
+            self._generation = gen[0] if gen else None
+            self._rows = {r["id"]: dict(r) for r in rows}
+            self._extra = {}
+        return self._rows
+
+    def get(self, employee_id: int) -> Optional[dict]:
+        """Employee row as a dict (active or not), or None if there is no such employee."""
+        with self._lock:
+            self._check()
+            rows = self._load()
+            if employee_id in rows:
+                return rows[employee_id]
+            if employee_id not in self._extra:
+                r = self._watch.execute(f"SELECT {EMPLOYEE_CACHE_COLUMNS} FROM employees WHERE id = ?", (employee_id,)).fetchone()
+                self._extra[employee_id] = dict(r) if r else None
+            return self._extra[employee_id]
+
+    def get_active(self, employee_id: int) -> Optional[dict]:
+        row = self.get(employee_id)
+        return row if row and row["active"] else None
+
+    def active(self) -> list:
+        """All active employees, ordered by id."""
+        with self._lock:
+            self._check()
+            return sorted(self._load().values(), key=lambda r: r["id"])
+
+    @property
+    def generation(self) -> Optional[int]:
+        with self._lock:
+            self._check()
+            self._load()
+            return self._generation
+
+    def invalidate(self, employee_id: Optional[int] = None) -> None:
+        """Write-through hook: re-read one employee, or drop everything when no id is given."""
+        with self._lock:
+            if employee_id is None or self._rows is None:
+                self._rows = None
+                return
+            r = self._watch.execute(f"SELECT {EMPLOYEE_CACHE_COLUMNS} FROM employees WHERE id = ?", (employee_id,)).fetchone()
+            self._rows.pop(employee_id, None)
+            self._extra.pop(employee_id, None)
+            if r is not None and r["active"]:
+                self._rows[employee_id] = dict(r)
+            else:
+                self._extra[employee_id] = dict(r) if r else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._watch.close()
+
+
+atexit.register(EmployeeCache.close_shared)
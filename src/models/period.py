@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from .database import Database
+
+@dataclass
+class PayrollPeriod:
+    year: int
+    month: int
+    status: str = "open"
+    closed_at: Optional[str] = None
+    snapshot_hash: Optional[str] = None
+    last_change_id: int = 0
+
+class PeriodModel:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def get(self, year: int, month: int) -> PayrollPeriod:
+        row = self.db.fetchone("SELECT year, month, status, closed_at, snapshot_hash, last_change_id FROM payroll_periods WHERE year = ? AND month = ?", (year, month))
+        if not row:
+            return PayrollPeriod(year=year, month=month)
+        return PayrollPeriod(**{k: row[k] for k in row.keys()})
+
+    def is_closed(self, year: int, month: int) -> bool:
+        return self.get(year, month).status == "closed"
+
+    def mark_closed(self, year: int, month: int) -> None:
+        self.db.execute(
+            "INSERT INTO payroll_periods (year, month, status, closed_at) VALUES (?, ?, 'closed', ?) "
+            "ON CONFLICT(year, month) DO UPDATE SET status = 'closed', closed_at = excluded.closed_at",
+            (year, month, datetime.now().isoformat())
+        )
+
+    def list_closed(self) -> list[PayrollPeriod]:
+        rows = self.db.query("SELECT year, month, status, closed_at FROM payroll_periods WHERE status = 'closed' ORDER BY year, month")
+        return [PayrollPeriod(year=r["year"], month=r["month"], status=r["status"], closed_at=r["closed_at"]) for r in rows]
@@ -0,0 +1,113 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional, Iterable
+from .database import Database
+
+@dataclass
+class RateInterval:
+    employee_id: int
+    rate: float
+    effective_from: str
+    effective_to: Optional[str] = None
+
+class RateHistoryModel:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def record(self, employee_id: int, rate: float, effective_from: Optional[str] = None) -> int:
+        """
+        Make `rate` apply from effective_from (YYYY-MM-DD, default today) until the next
+        recorded change. The interval containing that day is cut short; employees.rate is
+        kept as the rate in force today.
+        """
+        effective_from = effective_from or date.today().isoformat()
+        date.fromisoformat(effective_from)  # validate
+        rate = float(rate)
+        with self.db.transaction(immediate=True) as conn:
+            # employees created outside the controllers start with their current rate
+            conn.execute("""INSERT INTO rate_history (employee_id, rate, effective_from)
+                            SELECT id, rate, '1970-01-01' FROM employees
+                            WHERE id = ? AND NOT EXISTS (SELECT 1 FROM rate_history WHERE employee_id = ?)""",
+                         (employee_id, employee_id))
+            nxt = conn.execute("SELECT effective_from FROM rate_history WHERE employee_id = ? AND effective_from > ? ORDER BY effective_from LIMIT 1",
+                               (employee_id, effective_from)).fetchone()
+            effective_to = (date.fromisoformat(nxt["effective_from"]) - timedelta(days=1)).isoformat() if nxt else None
+            day_before = (date.fromisoformat(effective_from) - timedelta(days=1)).isoformat()
+            conn.execute("UPDATE rate_history SET effective_to = ? WHERE employee_id = ? AND effective_from < ? AND (effective_to IS NULL OR effective_to >= ?)",
+                         (day_before, employee_id, effective_from, effective_from))
+            conn.execute("DELETE FROM rate_history WHERE employee_id = ? AND effective_from = ?", (employee_id, effective_from))
+            cur = conn.execute("INSERT INTO rate_history (employee_id, rate, effective_from, effective_to) VALUES (?, ?, ?, ?)",
+                               (employee_id, rate, effective_from, effective_to))
+            if effective_from <= date.today().isoformat() and (effective_to is None or effective_to >= date.today().isoformat()):
+                conn.execute("UPDATE employees SET rate = ? WHERE id = ?", (rate, employee_id))
+            return cur.lastrowid
+
+    def sync_current(self, today: Optional[str] = None) -> int:
+        """
+        Set employees.rate to the recorded rate in force on `today` (YYYY-MM-DD, default
+        today) wherever it differs, so future-dated changes take over once their day
+        arrives. Returns the number of employees updated.
+        """
+        today = today or date.today().isoformat()
+        with self.db.transaction(immediate=True) as conn:
+            cur = conn.execute("""
+                UPDATE employees SET rate = (
+                    SELECT r.rate FROM rate_history r WHERE r.employee_id = employees.id AND r.effective_from <= ?
+                    ORDER BY r.effective_from DESC LIMIT 1)
+                WHERE rate IS NOT (
+                    SELECT r.rate FROM rate_history r WHERE r.employee_id = employees.id AND r.effective_from <= ?
+                    ORDER BY r.effective_from DESC LIMIT 1)
+                  AND EXISTS (SELECT 1 FROM rate_history r WHERE r.employee_id = employees.id AND r.effective_from <= ?)""",
+                (today, today, today))
+            return cur.rowcount
+
+    def list_for_employee(self, employee_id: int) -> list[RateInterval]:
+        rows = self.db.query("SELECT employee_id, rate, effective_from, effective_to FROM rate_history WHERE employee_id = ? ORDER BY effective_from",
+                             (employee_id,))
+        return [RateInterval(employee_id=r["employee_id"], rate=float(r["rate"]), effective_from=r["effective_from"], effective_to=r["effective_to"]) for r in rows]
+
+class RateIndex:
+    """
+    Per-employee sorted start dates and rates, loaded with a single query, so the rate
+    for any day is a bisect. Days before the first recorded change use the first rate.
+    """
+    def __init__(self, intervals: dict):
+        self._intervals = intervals
+
+    @classmethod
+    def load(cls, db: Database, employee_ids: Optional[Iterable[int]] = None) -> "RateIndex":
+        if employee_ids is None:
+            rows = db.query("SELECT employee_id, effective_from, rate FROM rate_history ORDER BY employee_id, effective_from")
+        else:
+            ids = list(employee_ids)
+            rows = db.query(f"SELECT employee_id, effective_from, rate FROM rate_history WHERE employee_id IN ({','.join('?' * len(ids))}) ORDER BY employee_id, effective_from",
+                            tuple(ids))
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> "RateIndex":
+        """Build from (employee_id, effective_from, rate) rows ordered by employee and date."""
+        intervals = {}
+        for r in rows:
+            starts, rates = intervals.setdefault(r["employee_id"], ([], []))
+            starts.append(r["effective_from"])
+            rates.append(float(r["rate"]))
+        return cls(intervals)
+
+    def has(self, employee_id: int) -> bool:
+        return employee_id in self._intervals
+
+    def rate_on(self, employee_id: int, day: str) -> float:
+        starts, rates = self._intervals[employee_id]
+        i = bisect_right(starts, day[:10]) - 1
+        return rates[max(i, 0)]
+
+    def signature(self, employee_id: int, first_day: str, last_day: str) -> str:
+        """Stable text form of the rates in force between first_day and last_day (for input hashing)."""
+        if employee_id not in self._intervals:
+            return "none"
+        starts, rates = self._intervals[employee_id]
+        lo = max(bisect_right(starts, first_day) - 1, 0)
+        hi = bisect_right(starts, last_day)
+        return ";".join(f"{starts[i] if i > lo else first_day}={rates[i]:.4f}" for i in range(lo, max(hi, lo + 1)))
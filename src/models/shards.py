@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Callable, Dict, List
+import json
+import threading
+from .database import Database, PROJECT_ROOT, DB_PATH
+
+# Shard map: one SQLite file per client site/region. Missing file = single "main" shard.
+SHARD_CONFIG_PATH = PROJECT_ROOT / "config" / "shards.json"
+DEFAULT_ID_SPAN = 1_000_000_000
+
+@dataclass
+class Shard:
+    name: str
+    index: int
+    path: Path
+    clients: List[int] = field(default_factory=list)
+
+class ShardMap:
+    """
+    Shards are complete databases (employees, attendance, payroll) for a set of client
+    sites. Employee and client ids are globally unique because shard N allocates ids
+    from N * id_span upwards, so the owning shard of any employee is id // id_span with
+    no lookup. Keep each extra shard in its own directory so its archive/ folder is its own.
+    """
+    def __init__(self, shards: List[Shard], default: str, id_span: int = DEFAULT_ID_SPAN):
+        if not shards:
+            raise ValueError("Shard map has no shards")
+        self.id_span = int(id_span)
+        self.shards = sorted(shards, key=lambda s: s.index)
+        self._by_name = {s.name: s for s in self.shards}
+        self._by_index = {s.index: s for s in self.shards}
+        if len(self._by_name) != len(self.shards) or len(self._by_index) != len(self.shards):
+            raise ValueError("Shard names and indexes must be unique")
+        if default not in self._by_name:
+            raise ValueError(f"Default shard {default!r} is not defined")
+        self.default = default
+        self._by_client = {cid: s for s in self.shards for cid in s.clients}
+
+    @classmethod
+    def single(cls, path: Path | str = DB_PATH) -> "ShardMap":
+        return cls([Shard("main", 0, Path(path))], "main")
+
+    @classmethod
+    def from_dict(cls, data: dict, base_dir: Path | str = PROJECT_ROOT) -> "ShardMap":
+        base_dir = Path(base_dir)
+        shards = [Shard(name=s["name"], index=int(s["index"]), path=base_dir / s["path"], clients=[int(c) for c in s.get("clients", [])])
+                  for s in data.get("shards", [])]
+        return cls(shards, data.get("default", "main"), int(data.get("id_span", DEFAULT_ID_SPAN)))
+
+    @classmethod
+    def load(cls, path: Path | str = SHARD_CONFIG_PATH) -> "ShardMap":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls.single()
+
+    def get(self, name: str) -> Shard:
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"Unknown shard {name!r}")
+
+    def for_employee(self, employee_id: int) -> Shard:
+        shard = self._by_index.get(int(employee_id) // self.id_span)
+        if shard is None:
+            raise ValueError(f"No shard owns employee {employee_id}")
+        return shard
+
+    def for_client(self, client_id: int) -> Shard:
+        """Shard listed for the client in the config (clients created before sharding), else id // id_span like employees."""
+        shard = self._by_client.get(int(client_id)) or self._by_index.get(int(client_id) // self.id_span)
+        if shard is None:
+            raise ValueError(f"No shard owns client {client_id}")
+        return shard
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+class ShardRouter:
+    """Opens one Database per shard on first use and routes work to it."""
+    def __init__(self, shard_map: Optional[ShardMap] = None, pool_size: int = 0):
+        self.shard_map = shard_map or ShardMap.load()
+        self.pool_size = pool_size
+        self._dbs: Dict[str, Database] = {}
+        self._lock = threading.Lock()
+
+    def db(self, name: Optional[str] = None) -> Database:
+        shard = self.shard_map.get(name or self.shard_map.default)
+        with self._lock:
+            db = self._dbs.get(shard.name)
+            if db is None:
+                db = Database(shard.path, pool_size=self.pool_size)
+                self._ensure_id_floor(db, shard)
+                self._dbs[shard.name] = db
+            return db
+
+    def _ensure_id_floor(self, db: Database, shard: Shard) -> None:
+        """Start this shard's employee/client ids at index * id_span so ids never collide across shards."""
+        floor = shard.index * self.shard_map.id_span
+        if floor == 0:
+            return
+        with db.transaction(immediate=True) as conn:
+            for table in ("employees", "clients"):
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, floor))
+                elif row["seq"] < floor:
+                    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (floor, table))
+
+    def db_for_employee(self, employee_id: int) -> Database:
+        return self.db(self.shard_map.for_employee(employee_id).name)
+
+    def db_for_client(self, client_id: int) -> Database:
+        return self.db(self.shard_map.for_client(client_id).name)
+
+    def fan_out(self, fn: Callable[[Shard, Database], object], max_workers: Optional[int] = None) -> Dict[str, object]:
+        """
+        Run fn(shard, db) for every shard in parallel threads; returns {shard name: result}.
+        Each shard is a separate file, so the calls never wait on each other's locks.
+        The first exception is re-raised once all shards have finished.
+        """
+        shards = self.shard_map.shards
+        dbs = [self.db(s.name) for s in shards]
+        with ThreadPoolExecutor(max_workers=max_workers or len(shards)) as pool:
+            futures = [pool.submit(fn, s, d) for s, d in zip(shards, dbs)]
+            return {s.name: f.result() for s, f in zip(shards, futures)}
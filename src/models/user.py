@@ -11,8 +11,9 @@ class User:
     active: bool = True
 
 class UserModel:
-    def __init__(self, db):
+    def __init__(self, db, employee_cache=None):
         self.db = db
+        self.employee_cache = employee_cache
 
     def authenticate(self, username: str, password: str) -> Optional[User]:
         """
@@ -20,13 +21,19 @@ class UserModel:
         Returns User object if successful, None if failed.
         Prevents login if employee is inactive (deleted).
         """
-        row = self.db.fetchone(
-            "SELECT u.id, u.username, u.password_hash, u.is_hr, u.employee_id, u.active, COALESCE(e.active, 1) as employee_active "
-            "FROM users u "
-            "LEFT JOIN employees e ON u.employee_id = e.id "
-            "WHERE u.username = ?",
-            (username,)
-        )
+        if self.employee_cache is not None:
+            row = self.db.fetchone(
+                "SELECT id, username, password_hash, is_hr, employee_id, active FROM users WHERE username = ?",
+                (username,)
+            )
+        else:
+            row = self.db.fetchone(
+                "SELECT u.id, u.username, u.password_hash, u.is_hr, u.employee_id, u.active, COALESCE(e.active, 1) as employee_active "
+                "FROM users u "
+                "LEFT JOIN employees e ON u.employee_id = e.id "
+                "WHERE u.username = ?",
+                (username,)
+            )
         
         if not row:
             return None
@@ -36,8 +43,14 @@ class UserModel:
             return None
         
         # Check if linked employee is active (deleted employees have active=0)
-        if row["employee_id"] and not row["employee_active"]:
-            return None
+        if row["employee_id"]:
+            if self.employee_cache is not None:
+                emp = self.employee_cache.get(row["employee_id"])
+                employee_active = emp["active"] if emp else 1
+            else:
+                employee_active = row["employee_active"]
+            if not employee_active:
+                return None
         
         # Verify password
         if not self._verify_password(password, row["password_hash"]):
@@ -0,0 +1,204 @@
+from __future__ import annotations
+from calendar import monthrange
+from datetime import date
+from typing import Optional, Iterable, List
+import csv
+
+try:
+    from ..models.database import Database
+    from ..models.adjustment import Adjustment, AdjustmentSchedule, AdjustmentModel
+    from .money import to_cents
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.models.adjustment import Adjustment, AdjustmentSchedule, AdjustmentModel  # type: ignore
+    from src.services.money import to_cents  # type: ignore
+
+# Every schedule expanded to (employee_id, amount_cents) for one month: params are
+# (last_day, first_day, 'YYYY-MM', 'YYYY-MM'). A client filter matches employees placed
+# with that client at any point in the month.
+_SCHEDULE_LINES_SQL = """
+SELECT e.id AS employee_id, s.amount_cents AS cents, s.id AS schedule_id
+FROM adjustment_schedules s
+JOIN employees e ON e.active = 1
+    AND (s.employee_id IS NULL OR s.employee_id = e.id)
+    AND (s.department IS NULL OR s.department = e.department)
+    AND (s.role IS NULL OR s.role = e.role)
+    AND (s.client_id IS NULL OR EXISTS (
+        SELECT 1 FROM placements p WHERE p.employee_id = e.id AND p.client_id = s.client_id
+        AND p.start_date <= ? AND COALESCE(p.end_date, '9999-12-31') >= ?))
+WHERE s.start_month <= ? AND (s.end_month IS NULL OR s.end_month >= ?)
+"""
+
+# one-off rows and expanded schedules, totalled per employee in one statement
+_MONTH_TOTALS_SQL = f"""
+SELECT employee_id, SUM(cents) AS cents FROM (
+    SELECT employee_id, amount_cents AS cents
+    FROM adjustments WHERE year = ? AND month = ?
+    UNION ALL
+    SELECT employee_id, cents FROM ({_SCHEDULE_LINES_SQL})
+) {{where}} GROUP BY employee_id
+"""
+
+
+def _month_key(value: str) -> str:
+    """Validate and normalise a YYYY-MM month."""
+    try:
+        y, m = (int(p) for p in str(value).strip().split("-")[:2])
+        date(y, m, 1)
+    except Exception:
+        raise ValueError(f"Invalid month {value!r}, expected YYYY-MM")
+    return f"{y:04d}-{m:02d}"
+
+
+class AdjustmentService:
+    """
+    Allowances and deductions. One-off rows are created in bulk (a list, a CSV file
+    or a department/role/client rule) with one executemany per call; recurring
+    schedules are never materialised, they are expanded for the month whenever
+    payroll asks for totals, so a schedule edit applies to every open month at once.
+    Schedules may not reach into a closed month, which keeps closed payroll frozen.
+    """
+
+    def __init__(self, db: Database, model: Optional[AdjustmentModel] = None):
+        self.db = db
+        self.model = model or AdjustmentModel(db)
+
+    # --- one-off adjustments ---
+    def _check_employees(self, employee_ids: Iterable[int]) -> None:
+        ids = sorted(set(employee_ids))
+        known = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            known.update(r[0] for r in self.db.query(f"SELECT id FROM employees WHERE id IN ({','.join('?' * len(chunk))})", tuple(chunk)))
+        missing = [i for i in ids if i not in known]
+        if missing:
+            raise ValueError(f"Unknown employee id(s): {', '.join(map(str, missing[:10]))}{' ...' if len(missing) > 10 else ''}")
+
+    def bulk_add(self, adjustments: Iterable[Adjustment]) -> int:
+        """Validate and insert all rows in one transaction (all or nothing). Returns the count."""
+        rows = list(adjustments)
+        for a in rows:
+            if not (1 <= int(a.month) <= 12):
+                raise ValueError(f"Month must be 1-12 (employee {a.employee_id})")
+        self._check_employees(a.employee_id for a in rows)
+        return self.model.add_many(rows) if rows else 0
+
+    def add(self, employee_id: int, year: int, month: int, amount, kind: Optional[str] = None, note: Optional[str] = None) -> int:
+        return self.bulk_add([Adjustment(None, int(employee_id), int(year), int(month), to_cents(amount), kind, note)])
+
+    def import_csv(self, path: str, year: Optional[int] = None, month: Optional[int] = None, kind: Optional[str] = None) -> int:
+        """
+        Bulk-create from a CSV with columns employee_id, amount and optionally year,
+        month, kind, note; year/month/kind arguments fill columns the file leaves out.
+        The whole file is rejected if any line is invalid.
+        """
+        rows = []
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for line_no, rec in enumerate(csv.DictReader(f), start=2):
+                try:
+                    y, m = rec.get("year") or year, rec.get("month") or month
+                    if y is None or m is None:
+                        raise ValueError("no year/month column and none given")
+                    rows.append(Adjustment(
+                        id=None,
+                        employee_id=int(rec["employee_id"]),
+                        year=int(y),
+                        month=int(m),
+                        amount_cents=to_cents(rec["amount"].strip()),
+                        kind=(rec.get("kind") or kind or None),
+                        note=(rec.get("note") or None),
+                    ))
+                except Exception as e:
+                    raise ValueError(f"{path} line {line_no}: {e}")
+        return self.bulk_add(rows)
+
+    def matching_employees(self, year: int, month: int, department: Optional[str] = None, role: Optional[str] = None,
+                           client_id: Optional[int] = None) -> List[int]:
+        """Active employees matching every given filter (placed with client_id during the month)."""
+        where, params = ["active = 1"], []
+        if department:
+            where.append("department = ?")
+            params.append(department)
+        if role:
+            where.append("role = ?")
+            params.append(role)
+        if client_id is not None:
+            first, last = f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{monthrange(year, month)[1]:02d}"
+            where.append("""EXISTS (SELECT 1 FROM placements p WHERE p.employee_id = employees.id AND p.client_id = ?
+                            AND p.start_date <= ? AND COALESCE(p.end_date, '9999-12-31') >= ?)""")
+            params.extend([client_id, last, first])
+        return [r[0] for r in self.db.query(f"SELECT id FROM employees WHERE {' AND '.join(where)} ORDER BY id", tuple(params))]
+
+    def add_for_rule(self, year: int, month: int, amount, kind: Optional[str] = None, note: Optional[str] = None,
+                     department: Optional[str] = None, role: Optional[str] = None, client_id: Optional[int] = None) -> int:
+        """Same one-off adjustment for every employee matching the rule. Returns how many were created."""
+        cents = to_cents(amount)
+        ids = self.matching_employees(year, month, department, role, client_id)
+        return self.model.add_many(Adjustment(None, eid, year, month, cents, kind, note) for eid in ids) if ids else 0
+
+    # --- recurring schedules ---
+    def _closed_between(self, start_month: str, end_month: Optional[str]) -> Optional[str]:
+        row = self.db.fetchone("""SELECT printf('%04d-%02d', year, month) AS ym FROM payroll_periods
+                                  WHERE status = 'closed' AND printf('%04d-%02d', year, month) BETWEEN ? AND ?
+                                  ORDER BY year, month LIMIT 1""", (start_month, end_month or "9999-12"))
+        return row["ym"] if row else None
+
+    def add_schedule(self, name: str, amount, start_month: str, end_month: Optional[str] = None, kind: Optional[str] = None,
+                     employee_id: Optional[int] = None, department: Optional[str] = None, role: Optional[str] = None,
+                     client_id: Optional[int] = None, note: Optional[str] = None) -> int:
+        start_month = _month_key(start_month)
+        end_month = _month_key(end_month) if end_month else None
+        if end_month and end_month < start_month:
+            raise ValueError("end_month must not be before start_month")
+        closed = self._closed_between(start_month, end_month)
+        if closed:
+            raise ValueError(f"Schedule would change closed period {closed}")
+        if employee_id is not None:
+            self._check_employees([employee_id])
+        return self.model.add_schedule(AdjustmentSchedule(
+            id=None, name=name, amount_cents=to_cents(amount), start_month=start_month, end_month=end_month, kind=kind,
+            employee_id=employee_id, department=department or None, role=role or None, client_id=client_id, note=note))
+
+    def end_schedule(self, schedule_id: int, end_month: str) -> None:
+        """Stop a schedule after end_month; months already closed keep their amounts."""
+        sched = self.model.get_schedule(schedule_id)
+        if sched is None:
+            raise ValueError(f"Schedule {schedule_id} not found")
+        end_month = _month_key(end_month)
+        if end_month < sched.start_month:
+            raise ValueError("end_month must not be before the schedule's start_month")
+        nxt_y, nxt_m = int(end_month[:4]) + int(end_month[5:]) // 12, int(end_month[5:]) % 12 + 1
+        closed = self._closed_between(f"{nxt_y:04d}-{nxt_m:02d}", sched.end_month)
+        if closed:
+            raise ValueError(f"Ending the schedule would change closed period {closed}")
+        self.model.set_schedule_end(schedule_id, end_month)
+
+    def schedules(self, month: Optional[str] = None) -> List[AdjustmentSchedule]:
+        return self.model.list_schedules(_month_key(month) if month else None)
+
+    # --- payroll reads ---
+    def totals_for_month(self, year: int, month: int, employee_id: Optional[int] = None, conn=None) -> dict:
+        """
+        employee_id -> adjustment total in cents for the month, one-off rows plus every
+        schedule running that month, in a single grouped query. `conn` lets a caller
+        read inside its own transaction.
+        """
+        ym = f"{year:04d}-{month:02d}"
+        params = (year, month, f"{ym}-{monthrange(year, month)[1]:02d}", f"{ym}-01", ym, ym)
+        where = ""
+        if employee_id is not None:
+            where, params = "WHERE employee_id = ?", (*params, employee_id)
+        sql = _MONTH_TOTALS_SQL.format(where=where)
+        rows = conn.execute(sql, params).fetchall() if conn is not None else self.db.query(sql, params)
+        return {r[0]: r[1] for r in rows}
+
+    def lines_for_month(self, year: int, month: int, employee_id: int) -> List[dict]:
+        """The one-off and scheduled lines behind an employee's total (for payslips and review)."""
+        ym = f"{year:04d}-{month:02d}"
+        lines = [{"source": "adjustment", "id": a.id, "kind": a.kind, "amount_cents": a.amount_cents, "note": a.note}
+                 for a in self.model.list_for_month(year, month, employee_id)]
+        rows = self.db.query(f"""SELECT x.schedule_id, s.name, s.kind, x.cents FROM ({_SCHEDULE_LINES_SQL}) x
+                                 JOIN adjustment_schedules s ON s.id = x.schedule_id WHERE x.employee_id = ? ORDER BY x.schedule_id""",
+                             (f"{ym}-{monthrange(year, month)[1]:02d}", f"{ym}-01", ym, ym, employee_id))
+        lines.extend({"source": "schedule", "id": r["schedule_id"], "kind": r["kind"], "amount_cents": r["cents"], "note": r["name"]} for r in rows)
+        return lines
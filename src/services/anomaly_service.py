@@ -0,0 +1,214 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List, Iterable, Iterator
+import json
+import math
+
+try:
+    from ..models.database import Database
+    from .archive_service import AttendanceArchive
+    from .shifts import parse_ts
+    from .sweeper_service import ATTENDANCE_POLICY_PATH
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.services.archive_service import AttendanceArchive  # type: ignore
+    from src.services.shifts import parse_ts  # type: ignore
+    from src.services.sweeper_service import ATTENDANCE_POLICY_PATH  # type: ignore
+
+SEVERITY = {
+    "bad_timestamp": "high",
+    "stray_sign_out": "high",
+    "overlapping_shift": "high",
+    "zero_length_shift": "high",
+    "long_shift": "high",
+    "double_tap": "low",
+    "unusual_duration": "low",
+    "unusual_start": "low",
+}
+
+
+@dataclass
+class AnomalyPolicy:
+    max_shift_hours: float = 16.0
+    double_tap_seconds: float = 120.0
+    baseline_window: int = 20
+    baseline_min_samples: int = 10
+    z_threshold: float = 3.0
+    start_tolerance_hours: float = 3.0
+
+    @classmethod
+    def from_config(cls, path=ATTENDANCE_POLICY_PATH) -> "AnomalyPolicy":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f).get("anomalies", {})
+        except FileNotFoundError:
+            return cls()
+        return cls(**{k: spec[k] for k in cls.__dataclass_fields__ if k in spec})
+
+
+@dataclass
+class Anomaly:
+    kind: str
+    employee_id: int
+    attendance_id: int
+    timestamp: str
+    detail: dict
+
+    @property
+    def severity(self) -> str:
+        return SEVERITY[self.kind]
+
+
+class _Baseline:
+    """Last `window` shift durations and start times for one employee (fixed memory)."""
+
+    def __init__(self, window: int):
+        self.durations = deque(maxlen=window)
+        self.starts = deque(maxlen=window)  # minutes after midnight
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def duration_z(self, hours: float, min_samples: int) -> Optional[float]:
+        n = len(self.durations)
+        if n < min_samples:
+            return None
+        mean = self._sum / n
+        std = math.sqrt(max(self._sumsq / n - mean * mean, 0.0))
+        # a perfectly regular schedule still tolerates a quarter-hour of noise
+        return (hours - mean) / max(std, 0.25)
+
+    def start_is_usual(self, minute: int, tolerance_min: float, min_samples: int) -> Optional[bool]:
+        if len(self.starts) < min_samples:
+            return None
+        near = 0
+        for s in self.starts:
+            # circular distance so 23:30 and 00:15 count as close
+            d = abs(minute - s)
+            if min(d, 1440 - d) <= tolerance_min:
+                near += 1
+                if near >= 2:
+                    return True
+        return False
+
+    def add(self, hours: float, minute: int) -> None:
+        if len(self.durations) == self.durations.maxlen:
+            old = self.durations[0]
+            self._sum -= old
+            self._sumsq -= old * old
+        self.durations.append(hours)
+        self.starts.append(minute)
+        self._sum += hours
+        self._sumsq += hours * hours
+
+
+class AnomalyScanner:
+    """
+    Single pass over attendance in (employee_id, timestamp, id) order. Only the
+    current employee's open shift and rolling baseline are held in memory, so a
+    year of events for any number of employees scans in constant space. Findings
+    replace the previous scan's open findings in attendance_anomalies; acknowledged
+    ones are kept.
+    """
+
+    def __init__(self, db: Database, policy: Optional[AnomalyPolicy] = None, archive: Optional[AttendanceArchive] = None):
+        self.db = db
+        self.policy = policy or AnomalyPolicy.from_config()
+        self.archive = archive or AttendanceArchive(db)
+
+    def _events(self, start_ts: str, end_ts: str) -> Iterator:
+        return self.archive.iterate(
+            "SELECT id, employee_id, event, timestamp FROM {attendance} "
+            "WHERE timestamp >= ? AND timestamp < ? AND event IN ('sign_in', 'sign_out') "
+            "ORDER BY employee_id, timestamp, id",
+            (start_ts, end_ts), start_ts, end_ts, batch_size=2000)
+
+    def detect(self, rows: Iterable) -> Iterator[Anomaly]:
+        """
+        Anomalies in a stream of (id, employee_id, event, timestamp) rows already ordered
+        by employee and time.
+        """
+        p = self.policy
+        current = None
+        open_in = None       # (id, datetime, timestamp) of the shift start
+        last = None          # (event, datetime) of the previous event
+        baseline = None
+        double_tap = p.double_tap_seconds
+        for r in rows:
+            att_id, eid, event, ts = r[0], r[1], r[2], r[3]
+            if eid != current:
+                current, open_in, last = eid, None, None
+                baseline = _Baseline(p.baseline_window)
+            dt = parse_ts(ts)
+            if dt is None:
+                yield Anomaly("bad_timestamp", eid, att_id, ts, {"event": event})
+                continue
+            if last is not None and last[0] == event and (dt - last[1]).total_seconds() <= double_tap:
+                yield Anomaly("double_tap", eid, att_id, ts, {"event": event, "previous": last[1].isoformat()})
+                last = (event, dt)
+                continue
+            last = (event, dt)
+
+            if event == "sign_in":
+                if open_in is not None:
+                    yield Anomaly("overlapping_shift", eid, att_id, ts, {"open_since": open_in[2], "open_sign_in_id": open_in[0]})
+                else:
+                    open_in = (att_id, dt, ts)
+                continue
+
+            # sign_out
+            if open_in is None:
+                yield Anomaly("stray_sign_out", eid, att_id, ts, {})
+                continue
+            in_id, dt_in, ts_in = open_in
+            open_in = None
+            hours = (dt - dt_in).total_seconds() / 3600.0
+            if hours <= 0:
+                yield Anomaly("zero_length_shift", eid, in_id, ts_in, {"sign_out_id": att_id})
+                continue
+            if hours > p.max_shift_hours:
+                yield Anomaly("long_shift", eid, in_id, ts_in, {"hours": round(hours, 2), "sign_out_id": att_id})
+                continue
+            minute = dt_in.hour * 60 + dt_in.minute
+            z = baseline.duration_z(hours, p.baseline_min_samples)
+            if z is not None and abs(z) >= p.z_threshold:
+                yield Anomaly("unusual_duration", eid, in_id, ts_in, {"hours": round(hours, 2), "z": round(z, 2)})
+            usual = baseline.start_is_usual(minute, p.start_tolerance_hours * 60, p.baseline_min_samples)
+            if usual is False:
+                yield Anomaly("unusual_start", eid, in_id, ts_in, {"start": dt_in.strftime("%H:%M")})
+            baseline.add(hours, minute)
+
+    def scan(self, start_ts: str = "1970-01-01T00:00:00", end_ts: Optional[str] = None) -> dict:
+        """Scan [start_ts, end_ts) (live and archived) and store the findings. Returns counts per kind."""
+        end_ts = end_ts or "9999-12-31T23:59:59"
+        found = [(a.kind, a.severity, a.employee_id, a.attendance_id, a.timestamp, json.dumps(a.detail, sort_keys=True))
+                 for a in self.detect(self._events(start_ts, end_ts))]
+        with self.db.transaction(immediate=True) as conn:
+            conn.execute("DELETE FROM attendance_anomalies WHERE status = 'open' AND timestamp >= ? AND timestamp < ?", (start_ts, end_ts))
+            conn.executemany("""INSERT OR IGNORE INTO attendance_anomalies
+                                (kind, severity, employee_id, attendance_id, timestamp, detail)
+                                VALUES (?, ?, ?, ?, ?, ?)""", found)
+        counts = {}
+        for f in found:
+            counts[f[0]] = counts.get(f[0], 0) + 1
+        return counts
+
+    def scan_year(self, year: int) -> dict:
+        return self.scan(f"{year:04d}-01-01T00:00:00", f"{year + 1:04d}-01-01T00:00:00")
+
+    def findings(self, employee_id: Optional[int] = None, status: str = "open") -> list:
+        where, params = "x.status = ?", [status]
+        if employee_id is not None:
+            where += " AND x.employee_id = ?"
+            params.append(employee_id)
+        return self.db.query(f"""SELECT x.id, x.kind, x.severity, x.employee_id, e.full_name, x.attendance_id, x.timestamp, x.detail
+                                 FROM attendance_anomalies x LEFT JOIN employees e ON e.id = x.employee_id
+                                 WHERE {where} ORDER BY x.employee_id, x.timestamp, x.id""", tuple(params))
+
+    def acknowledge(self, anomaly_ids: Iterable[int]) -> int:
+        ids = [int(i) for i in anomaly_ids]
+        if not ids:
+            return 0
+        return self.db.execute(f"UPDATE attendance_anomalies SET status = 'acknowledged' WHERE status = 'open' AND id IN ({','.join('?' * len(ids))})",
+                               tuple(ids)).rowcount
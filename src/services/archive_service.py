@@ -0,0 +1,178 @@
+from __future__ import annotations
+from itertools import groupby
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, List
+import sqlite3
+
+try:
+    from ..models.database import Database
+    from ..models.period import PeriodModel
+    from .shifts import parse_ts, hours_by_day
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.models.period import PeriodModel  # type: ignore
+    from src.services.shifts import parse_ts, hours_by_day  # type: ignore
+
+ATTENDANCE_COLUMNS = "id, employee_id, event, timestamp, corrected_by_hr, note"
+# SQLite attaches at most 10 databases to a connection by default; ranges covering more
+# year files are read in windows of this many years
+MAX_ATTACHED = 8
+
+
+def month_bounds(year: int, month: int) -> tuple[str, str]:
+    """[start, end) timestamps covering a calendar month."""
+    start = f"{year:04d}-{month:02d}-01T00:00:00"
+    end = f"{year + 1:04d}-01-01T00:00:00" if month == 12 else f"{year:04d}-{month + 1:02d}-01T00:00:00"
+    return start, end
+
+
+class AttendanceArchive:
+    """
+    Moves closed months out of the attendance table into per-year SQLite files
+    (archive/attendance_YYYY.db next to the main DB) and leaves a per-employee
+    monthly rollup behind in attendance_rollups.
+
+    Reads go through query()/iterate(): SQL written against an `{attendance}`
+    placeholder runs against the live table only, unless the requested range covers
+    archived months, in which case the relevant year files are attached and unioned in.
+    A range covering more than MAX_ATTACHED year files runs once per window of years,
+    oldest first, so ORDER BY and aggregates hold within a window, not across windows.
+    """
+
+    def __init__(self, db: Database, archive_dir: Optional[Path | str] = None):
+        self.db = db
+        self.archive_dir = Path(archive_dir) if archive_dir else Path(db.db_path).parent / "archive"
+        self.period_model = PeriodModel(db)
+
+    def archive_path(self, year: int) -> Path:
+        return self.archive_dir / f"attendance_{year:04d}.db"
+
+    def is_archived(self, year: int, month: int) -> bool:
+        return self.db.fetchone("SELECT 1 FROM attendance_partitions WHERE year = ? AND month = ?", (year, month)) is not None
+
+    def archive_month(self, year: int, month: int) -> int:
+        """Archive one closed month; returns the number of attendance rows moved."""
+        if not self.period_model.is_closed(year, month):
+            raise ValueError(f"Payroll for {year:04d}-{month:02d} is not closed")
+        if self.is_archived(year, month):
+            raise ValueError(f"{year:04d}-{month:02d} is already archived")
+        start, end = month_bounds(year, month)
+        path = self.archive_path(year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self.db.transaction() as conn:
+            # ATTACH is not allowed inside a transaction, so take the write lock afterwards
+            conn.execute("ATTACH DATABASE ? AS arch", (str(path),))
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS arch.attendance (
+                id INTEGER PRIMARY KEY,
+                employee_id INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                corrected_by_hr INTEGER NOT NULL DEFAULT 0,
+                note TEXT
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS arch.idx_attendance_employee_ts ON attendance(employee_id, timestamp)")
+
+            rollups = self._rollups(conn, year, month, start, end)
+            conn.executemany("""INSERT OR REPLACE INTO attendance_rollups
+                                (employee_id, year, month, days_worked, total_hours, regular_hours, overtime_hours, event_count)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rollups)
+            moved = conn.execute(f"""INSERT INTO arch.attendance ({ATTENDANCE_COLUMNS})
+                                     SELECT {ATTENDANCE_COLUMNS} FROM main.attendance
+                                     WHERE timestamp >= ? AND timestamp < ?""", (start, end)).rowcount
+            # moving rows is not a payroll change: drop what the closed-period triggers log for the delete
+            last_change = conn.execute("SELECT COALESCE(MAX(id), 0) FROM payroll_changes").fetchone()[0]
+            conn.execute("DELETE FROM main.attendance WHERE timestamp >= ? AND timestamp < ?", (start, end))
+            conn.execute("DELETE FROM payroll_changes WHERE id > ?", (last_change,))
+            conn.execute("INSERT INTO attendance_partitions (year, month, path, row_count, archived_at) VALUES (?, ?, ?, ?, ?)",
+                         (year, month, str(path), moved, datetime.now().isoformat()))
+        return moved
+
+    def _rollups(self, conn: sqlite3.Connection, year: int, month: int, start: str, end: str) -> List[tuple]:
+        cur = conn.execute("SELECT employee_id, event, timestamp FROM main.attendance WHERE timestamp >= ? AND timestamp < ? ORDER BY employee_id, timestamp, id",
+                           (start, end))
+        out = []
+        for eid, rows in groupby(cur, key=lambda r: r["employee_id"]):
+            rows = list(rows)
+            events = ((r["event"], dt) for r in rows if (dt := parse_ts(r["timestamp"])) is not None)
+            day_hours = hours_by_day(events)
+            regular = sum(min(8.0, h) for h in day_hours.values())
+            overtime = sum(max(0.0, h - 8.0) for h in day_hours.values())
+            out.append((eid, year, month, len(day_hours), round(regular + overtime, 2), round(regular, 2), round(overtime, 2), len(rows)))
+        return out
+
+    def archive_closed_months(self) -> dict:
+        """Archive every closed month that is still in the live table; returns {'YYYY-MM': rows}."""
+        done = {}
+        for p in self.period_model.list_closed():
+            if not self.is_archived(p.year, p.month):
+                done[f"{p.year:04d}-{p.month:02d}"] = self.archive_month(p.year, p.month)
+        return done
+
+    def rollup_for(self, employee_id: int, year: int, month: int):
+        return self.db.fetchone("SELECT * FROM attendance_rollups WHERE employee_id = ? AND year = ? AND month = ?", (employee_id, year, month))
+
+    # --- routed reads ---
+    def _sources(self, start_ts: str, end_ts: str) -> List[tuple]:
+        rows = self.db.query(
+            "SELECT DISTINCT year, path FROM attendance_partitions "
+            "WHERE printf('%04d-%02d', year, month) BETWEEN substr(?, 1, 7) AND substr(?, 1, 7) ORDER BY year",
+            (start_ts, end_ts))
+        return [(f"arch_{r['year']}", r["path"], r["year"]) for r in rows]
+
+    def _windows(self, start_ts: str, end_ts: str) -> List[tuple]:
+        """
+        [(live_from, live_to, sources)]: at most MAX_ATTACHED year files each, split on
+        year boundaries. live_from/live_to bound the live rows read with that window
+        (None = open); with a single window the live table is not filtered.
+        """
+        sources = self._sources(start_ts, end_ts)
+        if len(sources) <= MAX_ATTACHED:
+            return [(None, None, sources)]
+        chunks = [sources[i:i + MAX_ATTACHED] for i in range(0, len(sources), MAX_ATTACHED)]
+        starts = [None] + [f"{c[0][2]:04d}-01-01T00:00:00" for c in chunks[1:]] + [None]
+        return [(starts[i], starts[i + 1], chunk) for i, chunk in enumerate(chunks)]
+
+    def _routed_sql(self, sql: str, sources: List[tuple], live_from: Optional[str] = None, live_to: Optional[str] = None) -> str:
+        if not sources:
+            return sql.format(attendance="attendance")
+        # window bounds are generated year starts, safe to inline; params stay the caller's
+        bounds = [f"timestamp >= '{live_from}'"] if live_from else []
+        bounds += [f"timestamp < '{live_to}'"] if live_to else []
+        live = f"SELECT {ATTENDANCE_COLUMNS} FROM main.attendance" + (" WHERE " + " AND ".join(bounds) if bounds else "")
+        parts = [live] + [f"SELECT {ATTENDANCE_COLUMNS} FROM {alias}.attendance" for alias, _, _ in sources]
+        return sql.format(attendance="(" + " UNION ALL ".join(parts) + ")")
+
+    def query(self, sql: str, params: tuple, start_ts: str, end_ts: str) -> List[sqlite3.Row]:
+        """Run `sql` (with an {attendance} placeholder) over live + archived rows in [start_ts, end_ts]."""
+        windows = self._windows(start_ts, end_ts)
+        if len(windows) == 1 and not windows[0][2]:
+            return self.db.query(self._routed_sql(sql, []), params)
+        rows = []
+        for live_from, live_to, sources in windows:
+            with self.db.transaction() as conn:
+                for alias, path, _ in sources:
+                    conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                rows += conn.execute(self._routed_sql(sql, sources, live_from, live_to), params).fetchall()
+        return rows
+
+    def iterate(self, sql: str, params: tuple, start_ts: str, end_ts: str, batch_size: int = 500):
+        """Streaming variant of query()."""
+        windows = self._windows(start_ts, end_ts)
+        if len(windows) == 1 and not windows[0][2]:
+            yield from self.db.iterate(self._routed_sql(sql, []), params, batch_size=batch_size)
+            return
+        for live_from, live_to, sources in windows:
+            with self.db.transaction() as conn:
+                for alias, path, _ in sources:
+                    conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                cur = conn.execute(self._routed_sql(sql, sources, live_from, live_to), params)
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield from batch
@@ -0,0 +1,172 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List
+import atexit
+import hashlib
+import json
+import threading
+import weakref
+
+try:
+    from ..models.database import Database
+    from .tracing import record_error
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.services.tracing import record_error  # type: ignore
+
+GENESIS_HASH = "0" * 64
+# live logs, flushed by one exit hook (not a hook per instance)
+_LOGS = weakref.WeakSet()
+
+
+def _flush_all() -> None:
+    for log in list(_LOGS):
+        log._flush_quietly("audit.flush_at_exit")
+
+
+atexit.register(_flush_all)
+
+
+def chain_hash(seq: int, prev_hash: str, created_at: str, action: str, attendance_id, employee_id, actor, payload: str) -> str:
+    material = "|".join(str(x) for x in (seq, prev_hash, created_at, action, attendance_id, employee_id, actor, payload))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class VerifyResult:
+    ok: bool
+    checked: int
+    from_seq: int
+    last_seq: int
+    bad_seq: Optional[int] = None
+    reason: str = ""
+
+
+class AttendanceAuditLog:
+    """
+    Append-only, hash-chained log of attendance mutations.
+
+    record() only appends to an in-memory buffer so sign_in/sign_out do not wait on
+    the audit write. The buffer is chained and written in a single BEGIN IMMEDIATE
+    transaction when it reaches batch_size, after max_delay seconds, or at exit.
+    Every checkpoint_every entries the writer stores a checkpoint (seq, hash); a
+    successful verify() stores a verified one at the tail, so the next verify() only
+    streams entries written since then.
+
+    The log is best-effort relative to attendance: entries are written in their own
+    transaction after the attendance change has committed, so a crash before the flush
+    loses the buffered entries. A failed background flush keeps them buffered for the
+    next attempt and is reported through record_error, never to the caller of record().
+    """
+
+    def __init__(self, db: Database, batch_size: int = 50, max_delay: float = 2.0, checkpoint_every: int = 1000):
+        self.db = db
+        self.batch_size = int(batch_size)
+        self.max_delay = float(max_delay)
+        self.checkpoint_every = int(checkpoint_every)
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        _LOGS.add(self)
+
+    def record(self, action: str, attendance_id: Optional[int], employee_id: Optional[int], payload: dict, actor: Optional[str] = None) -> None:
+        created_at = datetime.now().isoformat()
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        with self._lock:
+            self._buffer.append((attendance_id, employee_id, action, actor, body, created_at))
+            full = len(self._buffer) >= self.batch_size
+            if not full and self._timer is None and self.max_delay > 0:
+                self._timer = threading.Timer(self.max_delay, self._flush_quietly)
+                self._timer.daemon = True
+                self._timer.start()
+        if full or self.max_delay <= 0:
+            self._flush_quietly()
+
+    def _flush_quietly(self, label: str = "audit.flush") -> int:
+        """flush() for background and batch-full writes: failures are recorded, entries stay buffered."""
+        try:
+            return self.flush()
+        except Exception as e:
+            record_error(label, e)
+            return 0
+
+    def flush(self) -> int:
+        """Chain and write all buffered entries; returns how many were written."""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            with self.db.transaction(immediate=True) as conn:
+                # read the tail inside the write lock so concurrent writers cannot fork the chain
+                tail = conn.execute("SELECT seq, hash FROM attendance_audit ORDER BY seq DESC LIMIT 1").fetchone()
+                seq, prev = (tail["seq"], tail["hash"]) if tail else (0, GENESIS_HASH)
+                rows = []
+                for attendance_id, employee_id, action, actor, body, created_at in pending:
+                    seq += 1
+                    h = chain_hash(seq, prev, created_at, action, attendance_id, employee_id, actor, body)
+                    rows.append((seq, attendance_id, employee_id, action, actor, body, created_at, prev, h))
+                    if seq % self.checkpoint_every == 0:
+                        conn.execute("INSERT INTO attendance_audit_checkpoints (seq, hash, verified) VALUES (?, ?, 0)", (seq, h))
+                    prev = h
+                conn.executemany("""INSERT INTO attendance_audit
+                                    (seq, attendance_id, employee_id, action, actor, payload, created_at, prev_hash, hash)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+        except Exception:
+            # keep entries for the next attempt rather than losing them
+            with self._lock:
+                self._buffer[:0] = pending
+            raise
+        return len(pending)
+
+    def verify(self, full: bool = False, checkpoint: bool = True) -> VerifyResult:
+        """
+        Recompute the chain and compare with the stored hashes. By default resumes from the
+        last verified checkpoint (whose stored hash must still match its entry); full=True
+        rehashes from genesis. Checkpoints written along the way must match the recomputed
+        chain too. On success a verified checkpoint is written at the tail.
+        """
+        self.flush()
+        start_seq, prev = 0, GENESIS_HASH
+        if not full:
+            cp = self.db.fetchone("SELECT seq, hash FROM attendance_audit_checkpoints WHERE verified = 1 ORDER BY seq DESC LIMIT 1")
+            if cp:
+                anchor = self.db.fetchone("SELECT hash FROM attendance_audit WHERE seq = ?", (cp["seq"],))
+                if not anchor or anchor["hash"] != cp["hash"]:
+                    return VerifyResult(False, 0, cp["seq"], cp["seq"], bad_seq=cp["seq"], reason="checkpoint does not match log entry")
+                start_seq, prev = cp["seq"], cp["hash"]
+        anchors = {r["seq"]: r["hash"] for r in self.db.query(
+            "SELECT seq, hash FROM attendance_audit_checkpoints WHERE seq > ?", (start_seq,))}
+
+        checked = 0
+        last_seq = start_seq
+        expected_seq = start_seq + 1
+        for r in self.db.iterate("""SELECT seq, attendance_id, employee_id, action, actor, payload, created_at, prev_hash, hash
+                                    FROM attendance_audit WHERE seq > ? ORDER BY seq""", (start_seq,)):
+            if r["seq"] != expected_seq:
+                return VerifyResult(False, checked, start_seq, last_seq, bad_seq=expected_seq, reason="missing entry")
+            if r["prev_hash"] != prev:
+                return VerifyResult(False, checked, start_seq, last_seq, bad_seq=r["seq"], reason="broken link")
+            h = chain_hash(r["seq"], prev, r["created_at"], r["action"], r["attendance_id"], r["employee_id"], r["actor"], r["payload"])
+            if h != r["hash"] or anchors.get(r["seq"], h) != h:
+                return VerifyResult(False, checked, start_seq, last_seq, bad_seq=r["seq"], reason="hash mismatch")
+            prev = h
+            last_seq = r["seq"]
+            expected_seq += 1
+            checked += 1
+
+        if anchors and max(anchors) > last_seq:
+            return VerifyResult(False, checked, start_seq, last_seq, bad_seq=last_seq + 1, reason="log truncated after checkpoint")
+        if checkpoint and checked:
+            self.db.execute("INSERT INTO attendance_audit_checkpoints (seq, hash, verified) VALUES (?, ?, 1)", (last_seq, prev))
+        return VerifyResult(True, checked, start_seq, last_seq)
+
+    def history(self, attendance_id: int) -> list:
+        """All logged mutations for one attendance row, oldest first."""
+        self.flush()
+        return self.db.query("SELECT seq, action, actor, payload, created_at FROM attendance_audit WHERE attendance_id = ? ORDER BY seq",
+                             (attendance_id,))
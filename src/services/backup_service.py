@@ -0,0 +1,384 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import zlib
+
+try:
+    from ..models.database import Database, PROJECT_ROOT
+    from .tracing import traced, record_error
+except Exception:
+    from src.models.database import Database, PROJECT_ROOT  # type: ignore
+    from src.services.tracing import traced, record_error  # type: ignore
+
+BACKUP_POLICY_PATH = PROJECT_ROOT / "config" / "backup_policy.json"
+MANIFEST = "manifest.json"
+_SNAP_MAGIC = b"QHSNAP1\n"
+_PAGE_HEADER = struct.Struct(">I")
+
+
+@dataclass
+class BackupPolicy:
+    """
+    backup_dir: where backups go, relative to the database file's folder.
+    pages_per_step / step_sleep_ms: the online copy reads this many pages, then yields
+        for this long, so a backup never holds the database for more than one step.
+    max_restarts: a copy restarts when another connection commits mid-copy; after
+        this many restarts it finishes in a single step instead (under WAL that is one
+        read transaction and still does not block writers).
+    snapshot_interval_minutes: periodic snapshots from start(); 0 turns them off. The
+        terminals and the API server do not call start(): their snapshots are the
+        scheduler's "backup" job, run by one instance at a time.
+    incrementals_per_full: incremental snapshots before the next full backup.
+    keep_chains: full backups (each with its incrementals) kept by rotation.
+    lease_minutes: how long a backup or restore holds the cross-process lease; a
+        crashed holder's lease is taken over once it runs out.
+    """
+    backup_dir: str = "backups"
+    pages_per_step: int = 256
+    step_sleep_ms: float = 10.0
+    max_restarts: int = 3
+    snapshot_interval_minutes: float = 60.0
+    incrementals_per_full: int = 23
+    keep_chains: int = 7
+    lease_minutes: float = 120.0
+
+    @classmethod
+    def from_config(cls, path=BACKUP_POLICY_PATH) -> "BackupPolicy":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f).get("backup", {})
+        except FileNotFoundError:
+            return cls()
+        return cls(**{k: spec[k] for k in cls.__dataclass_fields__ if k in spec})
+
+
+class _Restarted(Exception):
+    pass
+
+
+class BackupService:
+    """
+    Online backups of the live database file. Every backup starts from a consistent
+    image taken with sqlite3's backup API in small paged steps; the database runs in
+    WAL mode, so sign-in/out writes carry on while it is read.
+
+    A chain is one full backup (a plain .db file that opens on its own) followed by
+    incremental snapshots that store only the pages changed since the previous one,
+    zlib-compressed. Only the storage is incremental: SQLite does not track changed
+    pages for us (the backup API always copies every page and the stock sqlite3 module
+    has no sqlite_dbpage), so each snapshot still makes a full online copy of the live
+    file and finds the changed pages by comparing page hashes with the previous one. Any entry in the manifest can be restored: its chain is replayed
+    into a scratch file, checked against the recorded hash and integrity-checked, and
+    only then copied over the live database. Rotation drops whole chains, oldest first.
+
+    Backups and restores share the backup folder's work files and manifest, so each
+    one holds the backup_lease row in the database as well as the in-process lock; a
+    second process asking meanwhile gets a ValueError instead of racing.
+    """
+
+    def __init__(self, db: Database, policy: Optional[BackupPolicy] = None, backup_dir: Optional[Path | str] = None):
+        self.db = db
+        self.policy = policy or BackupPolicy.from_config()
+        db_path = Path(db.db_path)
+        self.backup_dir = Path(backup_dir) if backup_dir else db_path.parent / self.policy.backup_dir / db_path.stem
+        # one backup or restore at a time (per process, and across processes via _leased());
+        # _timer_lock guards the periodic timer
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._lock = threading.Lock()
+        self._timer_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @contextmanager
+    def _leased(self):
+        """Hold the in-process lock and the database's backup lease for one backup or restore; yields the lease expiry."""
+        with self._lock:
+            now = datetime.now()
+            until = (now + timedelta(minutes=self.policy.lease_minutes)).isoformat(timespec="seconds")
+            with self.db.transaction(immediate=True) as conn:
+                conn.execute("INSERT OR IGNORE INTO backup_lease (id) VALUES (1)")
+                got = conn.execute("""UPDATE backup_lease SET locked_by = ?, locked_until = ?
+                                      WHERE id = 1 AND (locked_until IS NULL OR locked_until < ?)""",
+                                   (self.instance_id, until, now.isoformat(timespec="seconds"))).rowcount
+                holder = None if got else conn.execute("SELECT locked_by FROM backup_lease WHERE id = 1").fetchone()["locked_by"]
+            if not got:
+                raise ValueError(f"Another backup or restore is running ({holder})")
+            try:
+                yield until
+            finally:
+                self.db.execute("UPDATE backup_lease SET locked_by = NULL, locked_until = NULL WHERE id = 1 AND locked_by = ?",
+                                (self.instance_id,))
+
+    # --- manifest ---
+    def _manifest_path(self) -> Path:
+        return self.backup_dir / MANIFEST
+
+    def list_backups(self) -> List[dict]:
+        """Manifest entries, oldest first."""
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)["backups"]
+        except FileNotFoundError:
+            return []
+
+    def _save_manifest(self, entries: List[dict]) -> None:
+        tmp = self._manifest_path().with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"schema_version": 1, "backups": entries}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path())
+
+    # --- online copy ---
+    def _copy_live(self, dest_path: Path) -> dict:
+        """Consistent image of the live database at dest_path, copied in throttled steps."""
+        dest_path.unlink(missing_ok=True)
+        p = self.policy
+        sleep = max(p.step_sleep_ms, 0) / 1000.0
+        stats = {"steps": 0, "restarts": 0}
+        src = sqlite3.connect(self.db.db_path)
+        try:
+            for attempt in range(2):
+                dst = sqlite3.connect(str(dest_path))
+                last = [None]
+
+                def progress(status, remaining, total):
+                    stats["steps"] += 1
+                    if last[0] is not None and remaining >= last[0]:
+                        stats["restarts"] += 1
+                        if stats["restarts"] > p.max_restarts:
+                            raise _Restarted()
+                    last[0] = remaining
+
+                try:
+                    if attempt == 0:
+                        src.backup(dst, pages=max(int(p.pages_per_step), 1), progress=progress, sleep=sleep)
+                    else:
+                        src.backup(dst, pages=-1)
+                    break
+                except _Restarted:
+                    continue
+                finally:
+                    dst.close()
+        finally:
+            src.close()
+        # the image stands alone: no -wal file next to it
+        conn = sqlite3.connect(str(dest_path))
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+            stats["page_size"] = conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            conn.close()
+        return stats
+
+    @staticmethod
+    def _page_hashes(path: Path, page_size: int) -> List[bytes]:
+        out = []
+        with open(path, "rb") as f:
+            while page := f.read(page_size):
+                out.append(hashlib.blake2b(page, digest_size=16).digest())
+        return out
+
+    @staticmethod
+    def _file_sha256(path: Path) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(1 << 20):
+                h.update(block)
+        return h.hexdigest()
+
+    # --- backups ---
+    def _entry_id(self) -> str:
+        return datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+    @traced("backup.backup_full")
+    def backup_full(self) -> dict:
+        """Start a new chain with a full backup. Returns its manifest entry."""
+        with self._leased():
+            return self._full()
+
+    def _full(self) -> dict:
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        entry_id = self._entry_id()
+        path = self.backup_dir / f"full-{entry_id}.db"
+        work = self.backup_dir / ".work.db"
+        stats = self._copy_live(work)
+        os.replace(work, path)
+        hashes = self._page_hashes(path, stats["page_size"])
+        (self.backup_dir / f"full-{entry_id}.hashes").write_bytes(b"".join(hashes))
+        entry = {"id": entry_id, "kind": "full", "chain": entry_id, "file": path.name, "created_at": datetime.now().isoformat(timespec="seconds"),
+                 "page_size": stats["page_size"], "page_count": len(hashes), "pages_written": len(hashes),
+                 "size": path.stat().st_size, "sha256": self._file_sha256(path), "restarts": stats["restarts"]}
+        entries = self.list_backups()
+        entries.append(entry)
+        self._save_manifest(entries)
+        self._rotate(entries)
+        return entry
+
+    @traced("backup.snapshot")
+    def snapshot(self) -> dict:
+        """
+        Point-in-time snapshot: incremental on the current chain, or a new full backup
+        when there is no chain yet, the chain is full or the page size changed.
+        The copy it diffs is a full one, so a snapshot reads and writes the whole
+        database once; only what it keeps is limited to the changed pages.
+        """
+        with self._leased():
+            entries = self.list_backups()
+            if not entries:
+                return self._full()
+            chain = entries[-1]["chain"]
+            in_chain = [e for e in entries if e["chain"] == chain]
+            hashes_path = self.backup_dir / f"full-{chain}.hashes"
+            if len(in_chain) > self.policy.incrementals_per_full or not hashes_path.exists():
+                return self._full()
+
+            work = self.backup_dir / ".work.db"
+            stats = self._copy_live(work)
+            page_size = stats["page_size"]
+            if page_size != in_chain[-1]["page_size"]:
+                work.unlink(missing_ok=True)
+                return self._full()
+            previous = hashes_path.read_bytes()
+            prev = [previous[i:i + 16] for i in range(0, len(previous), 16)]
+            entry_id = self._entry_id()
+            path = self.backup_dir / f"snap-{entry_id}.pages"
+            hashes, written = [], 0
+            comp = zlib.compressobj(6)
+            with open(work, "rb") as src, open(path, "wb") as out:
+                out.write(_SNAP_MAGIC)
+                page_no = 0
+                while page := src.read(page_size):
+                    digest = hashlib.blake2b(page, digest_size=16).digest()
+                    hashes.append(digest)
+                    if page_no >= len(prev) or prev[page_no] != digest:
+                        out.write(comp.compress(_PAGE_HEADER.pack(page_no) + page))
+                        written += 1
+                    page_no += 1
+                out.write(comp.flush())
+            entry = {"id": entry_id, "kind": "incremental", "chain": chain, "file": path.name, "created_at": datetime.now().isoformat(timespec="seconds"),
+                     "page_size": page_size, "page_count": len(hashes), "pages_written": written,
+                     "size": path.stat().st_size, "sha256": self._file_sha256(work), "restarts": stats["restarts"]}
+            work.unlink(missing_ok=True)
+            hashes_path.with_suffix(".tmp").write_bytes(b"".join(hashes))
+            os.replace(hashes_path.with_suffix(".tmp"), hashes_path)
+            entries.append(entry)
+            self._save_manifest(entries)
+            return entry
+
+    def _rotate(self, entries: List[dict]) -> None:
+        """Keep the newest keep_chains chains; delete the files of older ones."""
+        chains = list(dict.fromkeys(e["chain"] for e in entries))
+        drop = set(chains[:-max(int(self.policy.keep_chains), 1)])
+        if not drop:
+            return
+        self._save_manifest([e for e in entries if e["chain"] not in drop])
+        for e in entries:
+            if e["chain"] in drop:
+                (self.backup_dir / e["file"]).unlink(missing_ok=True)
+        for chain in drop:
+            (self.backup_dir / f"full-{chain}.hashes").unlink(missing_ok=True)
+
+    # --- restore ---
+    def materialize(self, backup_id: str, out_path: Path | str) -> Path:
+        """Rebuild the database image of a manifest entry at out_path and verify it."""
+        entries = self.list_backups()
+        target = next((e for e in entries if e["id"] == backup_id), None)
+        if target is None:
+            raise ValueError(f"Backup {backup_id} not found")
+        chain = [e for e in entries if e["chain"] == target["chain"]]
+        chain = chain[:chain.index(target) + 1]
+        out_path = Path(out_path)
+        with open(self.backup_dir / chain[0]["file"], "rb") as src, open(out_path, "wb") as out:
+            while block := src.read(1 << 20):
+                out.write(block)
+        with open(out_path, "r+b") as out:
+            for e in chain[1:]:
+                page_size = e["page_size"]
+                record = _PAGE_HEADER.size + page_size
+                data = zlib.decompress((self.backup_dir / e["file"]).read_bytes()[len(_SNAP_MAGIC):])
+                for i in range(0, len(data), record):
+                    (page_no,) = _PAGE_HEADER.unpack_from(data, i)
+                    out.seek(page_no * page_size)
+                    out.write(data[i + _PAGE_HEADER.size:i + record])
+                out.truncate(e["page_count"] * page_size)
+        if self._file_sha256(out_path) != target["sha256"]:
+            raise ValueError(f"Backup {backup_id} does not match its recorded checksum")
+        conn = sqlite3.connect(str(out_path))
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if result != "ok":
+            raise ValueError(f"Backup {backup_id} failed integrity check: {result}")
+        return out_path
+
+    @traced("backup.restore")
+    def restore(self, backup_id: str, out_path: Optional[Path | str] = None) -> dict:
+        """
+        Restore a backup. With out_path the image is only written there; otherwise a
+        full backup of the current state is taken first and the live database is
+        replaced in one step. Returns {'restored': id, 'safety_backup': id or None}.
+        """
+        if out_path is not None:
+            self.materialize(backup_id, out_path)
+            return {"restored": backup_id, "safety_backup": None}
+        with self._leased() as until:
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            work = self.backup_dir / ".restore.db"
+            self.materialize(backup_id, work)
+            safety = self._full()
+            src = sqlite3.connect(str(work))
+            dst = sqlite3.connect(self.db.db_path)
+            try:
+                before = dst.execute("SELECT COALESCE(MAX(generation), 0) FROM cache_generations").fetchone()[0]
+                src.backup(dst, pages=-1)
+                # move the cache counter past anything a running process has seen
+                dst.execute("UPDATE cache_generations SET generation = MAX(generation, ?) + 1", (before,))
+                # the image was taken under some backup's lease: put ours back so it is released below
+                if dst.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backup_lease'").fetchone():
+                    dst.execute("INSERT OR REPLACE INTO backup_lease (id, locked_by, locked_until) VALUES (1, ?, ?)", (self.instance_id, until))
+                dst.commit()
+            finally:
+                src.close()
+                dst.close()
+                work.unlink(missing_ok=True)
+            return {"restored": backup_id, "safety_backup": safety["id"]}
+
+    # --- periodic runs ---
+    def start(self, interval_minutes: Optional[float] = None) -> None:
+        """Take a snapshot every interval_minutes on a daemon timer until stop()."""
+        interval = float(interval_minutes if interval_minutes is not None else self.policy.snapshot_interval_minutes)
+        if interval <= 0:
+            return
+
+        def tick():
+            try:
+                self.snapshot()
+            except Exception as e:
+                record_error("backup.snapshot", e)
+            with self._timer_lock:
+                if self._timer is not None:
+                    self._timer = threading.Timer(interval * 60, tick)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        with self._timer_lock:
+            self._timer = threading.Timer(interval * 60, tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self) -> None:
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
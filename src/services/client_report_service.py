@@ -0,0 +1,121 @@
+from __future__ import annotations
+from itertools import groupby
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Optional, Iterator, List
+
+try:
+    from ..models.database import Database
+    from ..views.csv_view import CSVView, PDFView
+    from .archive_service import AttendanceArchive
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.views.csv_view import CSVView, PDFView  # type: ignore
+    from src.services.archive_service import AttendanceArchive  # type: ignore
+
+CLIENT_HOURS_COLUMNS = ["client_id", "client_name", "employee_id", "full_name", "day", "shifts", "hours"]
+
+# Pair sign_in/sign_out in SQL the same way the payroll loop does: every sign_out closes
+# the segment of events since the previous sign_out, and the earliest sign_in in that
+# segment is the shift start. Stray sign_outs (no sign_in in their segment) drop out.
+# Shifts are attributed to the client the employee was placed with on the sign-in day.
+_CLIENT_HOURS_SQL = """
+WITH ev AS (
+    SELECT a.employee_id, a.event, a.timestamp,
+           COALESCE(SUM(CASE WHEN a.event = 'sign_out' THEN 1 ELSE 0 END) OVER (
+               PARTITION BY a.employee_id ORDER BY a.timestamp, a.id
+               ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS seg
+    FROM {{attendance}} a
+    WHERE a.event IN ('sign_in', 'sign_out')
+      AND a.timestamp >= ? AND a.timestamp < ?
+      AND a.employee_id IN (SELECT p.employee_id FROM placements p
+                            WHERE p.start_date < ? AND COALESCE(p.end_date, '9999-12-31') >= ? {client_filter})
+),
+shifts AS (
+    SELECT employee_id,
+           MIN(CASE WHEN event = 'sign_in' THEN timestamp END) AS ts_in,
+           MAX(CASE WHEN event = 'sign_out' THEN timestamp END) AS ts_out
+    FROM ev
+    GROUP BY employee_id, seg
+)
+SELECT p.client_id, c.name AS client_name, s.employee_id, e.full_name,
+       substr(s.ts_in, 1, 10) AS day,
+       COUNT(*) AS shifts,
+       ROUND(SUM((julianday(s.ts_out) - julianday(s.ts_in)) * 24.0), 2) AS hours
+FROM shifts s
+JOIN placements p ON p.employee_id = s.employee_id
+                 AND p.start_date <= substr(s.ts_in, 1, 10)
+                 AND COALESCE(p.end_date, '9999-12-31') >= substr(s.ts_in, 1, 10)
+JOIN clients c ON c.id = p.client_id
+LEFT JOIN employees e ON e.id = s.employee_id
+WHERE s.ts_in IS NOT NULL AND s.ts_out IS NOT NULL AND s.ts_out > s.ts_in {client_filter}
+GROUP BY p.client_id, s.employee_id, day
+ORDER BY p.client_id, s.employee_id, day
+"""
+
+
+def quarter_range(year: int, quarter: int) -> tuple[str, str]:
+    """Inclusive (start_date, end_date) strings for a calendar quarter."""
+    if not (1 <= quarter <= 4):
+        raise ValueError("Quarter must be 1-4")
+    start = date(year, 3 * (quarter - 1) + 1, 1)
+    nxt = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+    return start.isoformat(), (nxt - timedelta(days=1)).isoformat()
+
+
+class ClientReportService:
+    def __init__(self, db: Database, archive: Optional[AttendanceArchive] = None):
+        self.db = db
+        self.archive = archive or AttendanceArchive(db)
+
+    def iter_client_hours(self, start_date: str, end_date: str, client_id: Optional[int] = None) -> Iterator[dict]:
+        """
+        Stream verified hours per client, employee and day for [start_date, end_date]
+        (YYYY-MM-DD, inclusive) in a single query, ordered by client/employee/day.
+        """
+        end_excl = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+        client_filter = "AND p.client_id = ?" if client_id is not None else ""
+        sql = _CLIENT_HOURS_SQL.format(client_filter=client_filter)
+        params: list = [f"{start_date}T00:00:00", f"{end_excl}T00:00:00", end_excl, start_date]
+        if client_id is not None:
+            params.append(client_id)
+            params.append(client_id)
+        for r in self.archive.iterate(sql, tuple(params), params[0], params[1]):
+            yield {k: r[k] for k in CLIENT_HOURS_COLUMNS}
+
+    def export_client_statement(self, client_id: int, start_date: str, end_date: str, out_path: Optional[str] = None, fmt: str = "csv") -> str:
+        """Export one client's hours statement for the range as CSV or PDF."""
+        fmt = fmt.lower()
+        out_path = out_path or f"client_{client_id}_{start_date}_{end_date}.{fmt}"
+        self._write(self.iter_client_hours(start_date, end_date, client_id=client_id), out_path, fmt, f"Client {client_id} hours {start_date} to {end_date}")
+        return out_path
+
+    def export_all_statements(self, start_date: str, end_date: str, out_dir: str | Path = ".", fmt: str = "csv") -> List[str]:
+        """
+        Batch job: one query for every client over the range, split into one file per
+        client while streaming.
+        """
+        fmt = fmt.lower()
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for cid, rows in groupby(self.iter_client_hours(start_date, end_date), key=lambda r: r["client_id"]):
+            path = out_dir / f"client_{cid}_{start_date}_{end_date}.{fmt}"
+            first = next(rows)
+            def chained(first=first, rows=rows):
+                yield first
+                yield from rows
+            self._write(chained(), path, fmt, f"{first['client_name']} hours {start_date} to {end_date}")
+            paths.append(str(path))
+        return paths
+
+    def export_quarter_statements(self, year: int, quarter: int, out_dir: str | Path = ".", fmt: str = "csv") -> List[str]:
+        start, end = quarter_range(year, quarter)
+        return self.export_all_statements(start, end, out_dir=out_dir, fmt=fmt)
+
+    def _write(self, rows: Iterator[dict], path: str | Path, fmt: str, title: str) -> int:
+        if fmt == "pdf":
+            return PDFView.export_stream(rows, path, CLIENT_HOURS_COLUMNS, title=title)
+        if fmt == "csv":
+            return CSVView.export_stream(rows, path, CLIENT_HOURS_COLUMNS)
+        raise ValueError(f"Unsupported format: {fmt}")
@@ -0,0 +1,197 @@
+from __future__ import annotations
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Optional, Iterable, Iterator, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow the datasets are written as CSV instead
+    pa = pq = None
+
+try:
+    from ..models.database import Database
+    from ..views.csv_view import CSVView
+    from .archive_service import AttendanceArchive
+    from .shifts import parse_ts, pair_shifts
+    from .money import US_PER_HOUR
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.views.csv_view import CSVView  # type: ignore
+    from src.services.archive_service import AttendanceArchive  # type: ignore
+    from src.services.shifts import parse_ts, pair_shifts  # type: ignore
+    from src.services.money import US_PER_HOUR  # type: ignore
+
+DATASETS = ("attendance", "payroll_runs", "day_hours")
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# rows per record batch and per Parquet row group
+BATCH_ROWS = 65536
+
+_US = timedelta(microseconds=1)
+# every live and archived attendance row; archive.iterate routes {attendance} to the year files,
+# a window of years at a time, so rows are in employee/time order within each window
+_HISTORY = ("0000-01-01T00:00:00", "9999-12-31T23:59:59")
+_ATTENDANCE_SQL = ("SELECT id, employee_id, event, timestamp, corrected_by_hr, note FROM {attendance} "
+                   "WHERE timestamp >= ? AND timestamp < ? ORDER BY employee_id, timestamp, id")
+_EVENTS_SQL = "SELECT employee_id, event, timestamp FROM {attendance} WHERE timestamp >= ? AND timestamp < ? ORDER BY employee_id, timestamp, id"
+
+# column name -> kind; "dict:*" columns are dictionary encoded
+_ATTENDANCE_COLUMNS = {"id": "int64", "employee_id": "dict:int64", "event": "dict:string", "timestamp": "string",
+                       "corrected_by_hr": "int8", "note": "string"}
+_DAY_HOURS_COLUMNS = {"employee_id": "dict:int64", "day": "string", "shifts": "int32", "worked_us": "int64", "hours": "float64"}
+_SQL_KINDS = {"INTEGER": "int64", "REAL": "float64"}
+
+
+def pyarrow_available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(kind: str):
+    if kind.startswith("dict:"):
+        return pa.dictionary(pa.int32(), _arrow_type(kind[5:]))
+    return {"int64": pa.int64(), "int32": pa.int32(), "int8": pa.int8(), "float64": pa.float64(), "string": pa.string()}[kind]
+
+
+class _DictionaryColumn:
+    """
+    Dictionary encoding that grows across batches. Each batch carries the dictionary
+    seen so far, which only ever gains entries at the end, so the IPC writer can emit
+    it as deltas and every batch shares one set of codes.
+    """
+
+    def __init__(self, value_type):
+        self.type = pa.dictionary(pa.int32(), value_type)
+        self.value_type = value_type
+        self.codes = {}
+        self.values = []
+
+    def encode(self, column: Iterable):
+        codes, values = self.codes, self.values
+        indices = []
+        for v in column:
+            if v is None:
+                indices.append(None)
+                continue
+            i = codes.get(v)
+            if i is None:
+                i = codes[v] = len(values)
+                values.append(v)
+            indices.append(i)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(values, type=self.value_type))
+
+
+class ColumnarExportService:
+    """
+    Full-history exports of attendance, payroll_runs and derived per-day hours to
+    Parquet or Arrow IPC for analytics tools. Rows are read from SQLite cursors in
+    BATCH_ROWS batches and each batch is written as one record batch (one Parquet row
+    group), so memory stays flat however long the history. Employee and event columns
+    are dictionary encoded. pyarrow is optional: without it each dataset is streamed
+    to CSV instead and the returned path says so.
+    """
+
+    def __init__(self, db: Database, archive: Optional[AttendanceArchive] = None, batch_rows: int = BATCH_ROWS):
+        self.db = db
+        self.archive = archive or AttendanceArchive(db)
+        self.batch_rows = batch_rows
+
+    # --- sources ---
+    def _columns(self, dataset: str) -> dict:
+        if dataset == "attendance":
+            return _ATTENDANCE_COLUMNS
+        if dataset == "day_hours":
+            return _DAY_HOURS_COLUMNS
+        if dataset == "payroll_runs":
+            cols = {r["name"]: _SQL_KINDS.get((r["type"] or "").upper(), "string") for r in self.db.query("PRAGMA table_info(payroll_runs)")}
+            cols["employee_id"] = "dict:int64"
+            return cols
+        raise ValueError(f"Unknown dataset: {dataset} (expected one of {', '.join(DATASETS)})")
+
+    @staticmethod
+    def _range(years: Optional[tuple]) -> tuple:
+        """[start, end) timestamps for (first_year, last_year) inclusive, or the whole history."""
+        if years is None:
+            return _HISTORY
+        first, last = years
+        return f"{first:04d}-01-01T00:00:00", f"{last + 1:04d}-01-01T00:00:00"
+
+    def _rows(self, dataset: str, columns: dict, years: Optional[tuple] = None) -> Iterator[tuple]:
+        start, end = self._range(years)
+        if dataset == "attendance":
+            return (tuple(r) for r in self.archive.iterate(_ATTENDANCE_SQL, (start, end), start, end, batch_size=self.batch_rows))
+        if dataset == "payroll_runs":
+            where, params = ("WHERE year BETWEEN ? AND ?", years) if years else ("", ())
+            return (tuple(r) for r in self.db.iterate(f"SELECT {', '.join(columns)} FROM payroll_runs {where} ORDER BY year, month, employee_id, id",
+                                                      params, batch_size=self.batch_rows))
+        return self._day_hours(start, end)
+
+    def _day_hours(self, start: str, end: str) -> Iterator[tuple]:
+        """(employee_id, day, shifts, worked_us, hours) in employee/day order, paired per month the way payroll pairs them."""
+        events = self.archive.iterate(_EVENTS_SQL, (start, end), start, end, batch_size=self.batch_rows)
+        for (eid, _), rows in groupby(events, key=lambda r: (r[0], r[2][:7])):
+            days = defaultdict(lambda: [0, 0])
+            parsed = ((r[1], dt) for r in rows for dt in (parse_ts(r[2]),) if dt is not None)
+            for dt_in, dt_out in pair_shifts(parsed):
+                d = days[dt_in.date().isoformat()]
+                d[0] += 1
+                d[1] += (dt_out - dt_in) // _US
+            for day in sorted(days):
+                shifts, us = days[day]
+                yield eid, day, shifts, us, us / US_PER_HOUR
+
+    # --- writers ---
+    def _batches(self, rows: Iterator[tuple], columns: dict) -> Iterator:
+        schema = pa.schema([(name, _arrow_type(kind)) for name, kind in columns.items()])
+        encoders = [_DictionaryColumn(_arrow_type(kind[5:])) if kind.startswith("dict:") else None for kind in columns.values()]
+        while True:
+            chunk = list(islice(rows, self.batch_rows))
+            if not chunk:
+                return
+            arrays = [enc.encode(col) if enc is not None else pa.array(col, type=field.type)
+                      for col, enc, field in zip(zip(*chunk), encoders, schema)]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def _write_arrow(self, rows: Iterator[tuple], columns: dict, path: Path, fmt: str) -> int:
+        schema = pa.schema([(name, _arrow_type(kind)) for name, kind in columns.items()])
+        count = 0
+        if fmt == "parquet":
+            with pq.ParquetWriter(str(path), schema, compression="zstd", use_dictionary=True) as writer:
+                for batch in self._batches(rows, columns):
+                    writer.write_table(pa.Table.from_batches([batch], schema=schema))
+                    count += batch.num_rows
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd", emit_dictionary_deltas=True)
+            with pa.ipc.new_file(str(path), schema, options=options) as writer:
+                for batch in self._batches(rows, columns):
+                    writer.write_batch(batch)
+                    count += batch.num_rows
+        return count
+
+    def export(self, dataset: str, out_path: Optional[str | Path] = None, fmt: str = "parquet", years: Optional[tuple] = None) -> tuple:
+        """
+        Write one dataset ('attendance', 'payroll_runs' or 'day_hours') as 'parquet' or
+        'arrow', for (first_year, last_year) inclusive or the whole history. Returns
+        (path, row count); the path ends in .csv when pyarrow is missing.
+        """
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if years is not None and years[0] > years[1]:
+            raise ValueError(f"Year range {years[0]}-{years[1]} is reversed")
+        columns = self._columns(dataset)
+        path = Path(out_path or f"{dataset}{FORMATS[fmt]}")
+        rows = self._rows(dataset, columns, years)
+        if pa is None:
+            path = path.with_suffix(".csv")
+            names = list(columns)
+            return str(path), CSVView.export_stream((dict(zip(names, r)) for r in rows), path, names)
+        return str(path), self._write_arrow(rows, columns, path, fmt)
+
+    def export_all(self, out_dir: str | Path = ".", fmt: str = "parquet", datasets: Iterable[str] = DATASETS,
+                   years: Optional[tuple] = None) -> List[tuple]:
+        """Every dataset into out_dir; returns [(path, rows), ...]."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        return [self.export(name, out_dir / f"{name}{FORMATS.get(fmt.lower(), '')}", fmt, years) for name in datasets]
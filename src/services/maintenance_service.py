@@ -0,0 +1,207 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import json
+import sqlite3
+import time
+
+try:
+    from ..models.database import Database, PROJECT_ROOT
+except Exception:
+    from src.models.database import Database, PROJECT_ROOT  # type: ignore
+
+MAINTENANCE_POLICY_PATH = PROJECT_ROOT / "config" / "maintenance_policy.json"
+_AUTO_VACUUM = {0: "none", 1: "full", 2: "incremental"}
+
+
+@dataclass
+class MaintenancePolicy:
+    """
+    incremental_vacuum: switch the file to auto_vacuum=INCREMENTAL (one full VACUUM,
+        done by the next run()) so freed pages can later be returned in small steps.
+    pages_per_step / step_sleep_ms: reclaim() frees this many pages per short write,
+        then sleeps, so it never holds the write lock for long.
+    max_pages_per_run: upper bound on pages reclaim() frees in one call (0 = all).
+    idle_seconds: reclaim() only starts after no other connection has committed for
+        this long, and stops as soon as one does.
+    analysis_limit: rows sampled per index by ANALYZE / PRAGMA optimize (0 = all).
+    """
+    incremental_vacuum: bool = True
+    pages_per_step: int = 200
+    step_sleep_ms: float = 20.0
+    max_pages_per_run: int = 20000
+    idle_seconds: float = 5.0
+    analysis_limit: int = 1000
+
+    @classmethod
+    def from_config(cls, path=MAINTENANCE_POLICY_PATH) -> "MaintenancePolicy":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f).get("maintenance", {})
+        except FileNotFoundError:
+            return cls()
+        return cls(**{k: spec[k] for k in cls.__dataclass_fields__ if k in spec})
+
+
+class DatabaseMaintenance:
+    """
+    Upkeep for the SQLite file: planner statistics (ANALYZE on first run, PRAGMA
+    optimize after), page reclaim with incremental vacuum in small idle-time steps,
+    and quick_check / integrity_check. Each run reports file size and page counts
+    before and after. Works on its own autocommit connection, since VACUUM and
+    incremental_vacuum cannot run inside the transactions Database hands out.
+    """
+
+    def __init__(self, db: Database, policy: Optional[MaintenancePolicy] = None):
+        self.db = db
+        self.policy = policy or MaintenancePolicy.from_config()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db.db_path, isolation_level=None, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _pragma(conn: sqlite3.Connection, name: str):
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+    # --- reporting ---
+    def stats(self, conn: Optional[sqlite3.Connection] = None) -> dict:
+        """File and page figures: size on disk (database + WAL), page size/count, free pages, auto_vacuum mode."""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            path = Path(self.db.db_path)
+            wal = Path(f"{path}-wal")
+            page_size, page_count, free = (self._pragma(conn, p) for p in ("page_size", "page_count", "freelist_count"))
+            return {"file_bytes": path.stat().st_size, "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+                    "page_size": page_size, "page_count": page_count, "freelist_count": free,
+                    "free_ratio": round(free / page_count, 4) if page_count else 0.0,
+                    "auto_vacuum": _AUTO_VACUUM.get(self._pragma(conn, "auto_vacuum"), "unknown")}
+        finally:
+            if own:
+                conn.close()
+
+    # --- operations ---
+    def enable_incremental_vacuum(self, conn: Optional[sqlite3.Connection] = None) -> bool:
+        """Switch to auto_vacuum=INCREMENTAL with one full VACUUM; returns False if it already was."""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            if self._pragma(conn, "auto_vacuum") == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            # the rewrite went through the WAL; fold it back so the file shrinks now
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return True
+        finally:
+            if own:
+                conn.close()
+
+    def optimize(self, conn: Optional[sqlite3.Connection] = None) -> str:
+        """Full ANALYZE if the planner has no statistics yet, else PRAGMA optimize (re-analyzes only what drifted)."""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            conn.execute(f"PRAGMA analysis_limit={int(self.policy.analysis_limit)}")
+            analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+            if not analyzed:
+                conn.execute("ANALYZE")
+                return "analyze"
+            conn.execute("PRAGMA optimize").fetchall()
+            return "optimize"
+        finally:
+            if own:
+                conn.close()
+
+    def _wait_idle(self, conn: sqlite3.Connection, seconds: float) -> bool:
+        """True once no other connection has committed for `seconds` (PRAGMA data_version stays put)."""
+        if seconds <= 0:
+            return True
+        before = self._pragma(conn, "data_version")
+        time.sleep(seconds)
+        return self._pragma(conn, "data_version") == before
+
+    def reclaim(self, max_pages: Optional[int] = None, conn: Optional[sqlite3.Connection] = None) -> dict:
+        """
+        Return free pages to the filesystem pages_per_step at a time, during idle time
+        only: it waits idle_seconds without outside commits before starting and stops
+        as soon as another connection writes. Needs auto_vacuum=INCREMENTAL.
+        """
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            budget = self.policy.max_pages_per_run if max_pages is None else max_pages
+            out = {"pages_freed": 0, "steps": 0, "stopped": "done"}
+            if self._pragma(conn, "auto_vacuum") != 2:
+                out["stopped"] = "not_incremental"
+                return out
+            if not self._wait_idle(conn, self.policy.idle_seconds):
+                out["stopped"] = "busy"
+                return out
+            version = self._pragma(conn, "data_version")
+            while True:
+                free = self._pragma(conn, "freelist_count")
+                if free == 0:
+                    break
+                if budget and out["pages_freed"] >= budget:
+                    out["stopped"] = "budget"
+                    break
+                if self._pragma(conn, "data_version") != version:
+                    out["stopped"] = "busy"
+                    break
+                step = min(self.policy.pages_per_step, free, budget - out["pages_freed"] if budget else free)
+                # executescript steps the pragma to completion; execute() stops after the first page
+                conn.executescript(f"PRAGMA incremental_vacuum({int(step)});")
+                out["pages_freed"] += free - self._pragma(conn, "freelist_count")
+                out["steps"] += 1
+                time.sleep(self.policy.step_sleep_ms / 1000.0)
+            if out["steps"]:
+                # copy the shrunken pages back without waiting on readers; the file shrinks once it completes
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+            return out
+        finally:
+            if own:
+                conn.close()
+
+    def check(self, full: bool = False, conn: Optional[sqlite3.Connection] = None) -> dict:
+        """quick_check (or the slower integrity_check, which also verifies index contents)."""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            messages = [r[0] for r in conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check")]
+            return {"ok": messages == ["ok"], "messages": messages[:20]}
+        finally:
+            if own:
+                conn.close()
+
+    def run(self, vacuum: bool = True, full_check: bool = False) -> dict:
+        """
+        One maintenance pass: switch to incremental auto_vacuum if the policy asks and
+        the file is not yet, refresh planner statistics, reclaim free pages (idle time
+        only), check the file. Returns before/after stats and the time each step took.
+        """
+        conn = self._connect()
+        try:
+            report = {"before": self.stats(conn), "timings_ms": {}}
+
+            def timed(name, fn):
+                t0 = time.perf_counter()
+                result = fn()
+                report["timings_ms"][name] = round((time.perf_counter() - t0) * 1000.0, 1)
+                return result
+
+            if vacuum and self.policy.incremental_vacuum:
+                report["converted"] = timed("convert", lambda: self.enable_incremental_vacuum(conn))
+            report["statistics"] = timed("optimize", lambda: self.optimize(conn))
+            if vacuum:
+                report["reclaim"] = timed("reclaim", lambda: self.reclaim(conn=conn))
+            report["check"] = timed("check", lambda: self.check(full_check, conn))
+            report["after"] = self.stats(conn)
+            report["bytes_saved"] = (report["before"]["file_bytes"] + report["before"]["wal_bytes"]
+                                     - report["after"]["file_bytes"] - report["after"]["wal_bytes"])
+            return report
+        finally:
+            conn.close()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from decimal import Decimal, ROUND_HALF_UP, localcontext
+from fractions import Fraction
+from typing import Union
+
+# Rounding policy for all pay maths:
+#  - money is carried as integer cents (or Decimal) and never as a binary float;
+#  - hourly rates and tax rates are exact decimals, rates keep up to RATE_PLACES places;
+#  - each reported value (gross, adjustments, tax, net, hours) is rounded once, to the
+#    cent, half away from zero, from its exact value. net = taxable - tax, so it needs
+#    no rounding of its own.
+CENT = Decimal("0.01")
+ROUNDING = ROUND_HALF_UP
+RATE_PLACES = 4
+RATE_SCALE = 10 ** RATE_PLACES
+US_PER_HOUR = 3_600_000_000
+# enough digits that dividing an exact sum once cannot move it across a half cent
+_PRECISION = 60
+
+Number = Union[int, float, str, Decimal, Fraction]
+
+
+def to_decimal(value: Number) -> Decimal:
+    """Exact Decimal for a stored amount; floats go through repr so 19.99 stays 19.99."""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, Fraction):
+        with localcontext() as ctx:
+            ctx.prec = _PRECISION
+            return Decimal(value.numerator) / Decimal(value.denominator)
+    return Decimal(value)
+
+
+def quantize(value: Number) -> Decimal:
+    """Round to the cent under the policy above."""
+    return to_decimal(value).quantize(CENT, rounding=ROUNDING)
+
+
+def div_half_up(num: int, den: int) -> int:
+    """num / den rounded to an integer, halves away from zero (integer-only)."""
+    if den < 0:
+        num, den = -num, -den
+    q, r = divmod(abs(num), den)
+    if 2 * r >= den:
+        q += 1
+    return q if num >= 0 else -q
+
+
+def to_cents(value: Number) -> int:
+    """Integer cents for any exact or stored amount."""
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, Fraction):
+        return div_half_up(value.numerator * 100, value.denominator)
+    return int(quantize(value) * 100)
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def cents_to_float(cents: int) -> float:
+    """For REAL columns and display; cents / 100 prints back as the same two decimals."""
+    return cents / 100
+
+
+def rate_units(rate: Number) -> int:
+    """A rate as an integer count of 1/RATE_SCALE."""
+    return int(to_decimal(rate).scaleb(RATE_PLACES).quantize(Decimal(1), rounding=ROUNDING))
+
+
+def hours_from_us(us: int) -> float:
+    """Worked microseconds as hours rounded to two places (same policy as money)."""
+    return cents_to_float(div_half_up(us * 100, US_PER_HOUR))
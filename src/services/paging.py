@@ -0,0 +1,42 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Optional, List
+import base64
+import hashlib
+import json
+
+
+@dataclass
+class Page:
+    """One keyset page. next_token is None on the last page."""
+    items: List[Any] = field(default_factory=list)
+    next_token: Optional[str] = None
+
+
+def _scope_tag(scope: tuple) -> str:
+    return hashlib.sha1(json.dumps(list(scope), default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def encode_token(key: tuple, scope: tuple = ()) -> str:
+    """
+    Opaque continuation token for the row `key` (the last row of the page). `scope`
+    is the query's filters, so a token cannot be replayed against a different query.
+    """
+    body = json.dumps({"k": list(key), "s": _scope_tag(scope)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_token(token: Optional[str], scope: tuple = ()) -> Optional[tuple]:
+    """Key encoded in `token`, or None for the first page. Raises ValueError on a bad token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        body = json.loads(raw)
+        key = tuple(body["k"])
+        tag = body["s"]
+    except Exception:
+        raise ValueError("Invalid page token")
+    if tag != _scope_tag(scope):
+        raise ValueError("Page token does not match this query")
+    return key
@@ -1,28 +1,97 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from collections import defaultdict
+from itertools import groupby
 from typing import Optional, List
 from datetime import datetime, timedelta
+from calendar import monthrange
+from fractions import Fraction
+from pathlib import Path
 import csv
 
 try:
     from ..models.attendance import AttendanceModel
     from ..models.payroll import Payroll, PayrollModel
-    from ..models.employee import Employee
+    from ..models.employee import Employee, EmployeeCache
     from ..models.database import Database
+    from ..models.rate_history import RateIndex
+    from .tax_service import TaxSchedule, TAX_CONFIG_PATH
+    from .archive_service import AttendanceArchive, month_bounds
+    from .period_service import PeriodCloseService
+    from .adjustment_service import AdjustmentService
+    from .rollup_service import PayrollRollups
+    from .shifts import parse_ts, pair_shifts
+    from .money import (to_decimal, to_cents, cents_to_float, rate_units, div_half_up, hours_from_us,
+                        RATE_SCALE, US_PER_HOUR)
+    from .tracing import traced, span, count, record_error
 except Exception:
     # robust import paths when running in different contexts
     from src.models.attendance import AttendanceModel  # type: ignore
     from src.models.payroll import Payroll, PayrollModel  # type: ignore
-    from src.models.employee import Employee  # type: ignore
+    from src.models.employee import Employee, EmployeeCache  # type: ignore
     from src.models.database import Database  # type: ignore
+    from src.models.rate_history import RateIndex  # type: ignore
+    from src.services.tax_service import TaxSchedule, TAX_CONFIG_PATH  # type: ignore
+    from src.services.archive_service import AttendanceArchive, month_bounds  # type: ignore
+    from src.services.period_service import PeriodCloseService  # type: ignore
+    from src.services.adjustment_service import AdjustmentService  # type: ignore
+    from src.services.rollup_service import PayrollRollups  # type: ignore
+    from src.services.shifts import parse_ts, pair_shifts  # type: ignore
+    from src.services.money import (to_decimal, to_cents, cents_to_float, rate_units, div_half_up, hours_from_us,  # type: ignore
+                                    RATE_SCALE, US_PER_HOUR)
+    from src.services.tracing import traced, span, count, record_error  # type: ignore
+
+_US = timedelta(microseconds=1)
+_REGULAR_US = 8 * US_PER_HOUR
+# payroll_runs columns written from a payroll dict (see PayrollService._run_values)
+_RUN_COLUMNS = ("regular_hours", "overtime_hours", "hourly_rate", "gross_pay", "total_adjustments", "net_pay",
+                "gross_cents", "adjustments_cents", "tax_cents", "net_cents")
 
 @dataclass
 class TaxPolicy:
+    """
+    Flat `rate` is kept as the fallback when no bracket schedule is configured.
+    With a schedule, tax is progressive and depends on the month and employee tax code.
+    """
     rate: float = 0.15
+    schedule: Optional[TaxSchedule] = None
+
+    @classmethod
+    def from_config(cls, path=TAX_CONFIG_PATH) -> "TaxPolicy":
+        try:
+            return cls(schedule=TaxSchedule.load(path))
+        except FileNotFoundError:
+            return cls()
+
+    @property
+    def signature(self) -> str:
+        """Identifies the tax rules in force in this process (changes when the loaded tables do)."""
+        if self.schedule is None:
+            return f"flat:{self.rate}"
+        return f"v{self.schedule.config_version}:" + ",".join(f"{t.version}@{t.effective_from}" for t in self.schedule.tables)
+
+    def check_code(self, code: Optional[str]) -> None:
+        """Reject tax codes the configured tables do not define (any code goes with the flat rate)."""
+        if self.schedule is not None:
+            self.schedule.check_code(code)
+
+    def tax_for(self, amount: float, year: int, month: int, code: Optional[str] = None) -> float:
+        return cents_to_float(self.tax_bulk_cents([to_cents(amount)], [code], year, month)[0])
+
+    def tax_bulk(self, amounts: List[float], codes: List[Optional[str]], year: int, month: int) -> List[float]:
+        return [cents_to_float(t) for t in self.tax_bulk_cents([to_cents(a) for a in amounts], codes, year, month)]
+
+    def tax_bulk_cents(self, amounts: List[int], codes: List[Optional[str]], year: int, month: int) -> List[int]:
+        """Tax in cents on taxable amounts in cents."""
+        if self.schedule is None:
+            rate = to_decimal(self.rate)
+            places = max(0, -rate.as_tuple().exponent)
+            num, den = int(rate.scaleb(places)), 10 ** places
+            return [max(div_half_up(a * num, den), 0) for a in amounts]
+        return self.schedule.tax_bulk_cents(amounts, codes, year, month)
 
 class PayrollService:
-    def __init__(self, db: Database, attendance_model: Optional[AttendanceModel] = None, payroll_model: Optional[PayrollModel] = None, tax_policy: Optional[TaxPolicy] = None, overtime_multiplier: float = 1.5):
+    def __init__(self, db: Database, attendance_model: Optional[AttendanceModel] = None, payroll_model: Optional[PayrollModel] = None, tax_policy: Optional[TaxPolicy] = None, overtime_multiplier: float = 1.5, archive: Optional[AttendanceArchive] = None, employee_cache: Optional[EmployeeCache] = None, verify_incremental: bool = False, adjustment_service: Optional[AdjustmentService] = None, rollups: Optional[PayrollRollups] = None):
         """
         db: Database instance (required)
         attendance_model/payroll_model optional wrappers (if you have specific model classes)
@@ -30,8 +99,19 @@ class PayrollService:
         self.db = db
         self.attendance_model = attendance_model
         self.payroll_model = payroll_model
-        self.tax_policy = tax_policy or TaxPolicy()
+        self.tax_policy = tax_policy or TaxPolicy.from_config()
         self.overtime_multiplier = float(overtime_multiplier)
+        # gross is summed exactly as sum(rate_units * (regular_us * den + overtime_us * num)) / _gross_den
+        self._ot = Fraction(to_decimal(self.overtime_multiplier))
+        self._gross_den = RATE_SCALE * US_PER_HOUR * self._ot.denominator
+        self._units = {}
+        self.archive = archive or AttendanceArchive(db)
+        self.employees = employee_cache or EmployeeCache.shared(db)
+        self.adjustments = adjustment_service or AdjustmentService(db)
+        self.rollups = rollups or PayrollRollups(db)
+        # re-check every incremental sign-out update against a full recompute
+        self.verify_incremental = verify_incremental
+        self.periods = PeriodCloseService(self)
 
         # lazy-create model wrappers if not provided (models may live in your repo)
         # if AttendanceModel/PayrollModel classes are available via imports, instantiate them
@@ -47,22 +127,23 @@ class PayrollService:
                 self.payroll_model = None
 
     def _get_employee_rate(self, employee_id: int) -> float:
-        row = self.db.fetchone("SELECT rate FROM employees WHERE id = ? AND active = 1", (employee_id,))
+        row = self.employees.get_active(employee_id)
         if not row:
             raise ValueError("Employee not found or inactive")
         return float(row["rate"])
 
-    def _sum_adjustments(self, employee_id: int, year: int, month: int) -> float:
-        row = self.db.fetchone("SELECT COALESCE(SUM(amount),0) as total FROM adjustments WHERE employee_id = ? AND year = ? AND month = ?", (employee_id, year, month))
-        return float(row["total"]) if row else 0.0
+    def load_rate_index(self, employee_ids: Optional[List[int]] = None) -> RateIndex:
+        """Rate history for the given employees (or everyone) in one query."""
+        return RateIndex.load(self.db, employee_ids)
 
-    def _aggregate_hours_by_day(self, employee_id: int, period_year: int, period_month: int) -> dict:
+    @traced("payroll.aggregate_us_by_day")
+    def _aggregate_us_by_day(self, employee_id: int, period_year: int, period_month: int) -> dict:
         """
-        Returns mapping date_str -> total_hours for the given month.
+        Returns mapping date_str -> worked microseconds for the given month.
         Prefer attendance_model.list_for_employee if it provides per-day totals (keys/attrs 'date' and 'hours'),
         otherwise fall back to computing from the attendance table (timestamp sign_in/sign_out pairs).
         """
-        day_hours = defaultdict(float)
+        day_us = defaultdict(int)
         # Try high-level attendance model
         if self.attendance_model and hasattr(self.attendance_model, "list_for_employee"):
             try:
@@ -72,145 +153,400 @@ class PayrollService:
                     d = it.get("date") if isinstance(it, dict) else getattr(it, "date", None)
                     hours = it.get("hours") if isinstance(it, dict) else getattr(it, "hours", None)
                     if d and hours is not None:
-                        day_hours[d] += float(hours)
+                        day_us[d] += int(to_decimal(hours) * US_PER_HOUR)
                         continue
             except Exception:
                 # fall through to raw table parsing
                 pass
 
         # Fallback: compute from attendance table sign_in/sign_out pairs
-        start = f"{period_year:04d}-{period_month:02d}-01T00:00:00"
-        if period_month == 12:
-            end = f"{period_year+1:04d}-01-01T00:00:00"
-        else:
-            end = f"{period_year:04d}-{period_month+1:02d}-01T00:00:00"
-
-        rows = self.db.query("SELECT event, timestamp FROM attendance WHERE employee_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
-                             (employee_id, start, end))
-        parsed = []
-        for r in rows:
-            ev = r["event"]
-            ts = r["timestamp"]
-            try:
-                # try ISO parse first
-                dt = datetime.fromisoformat(ts)
-            except Exception:
-                # fallback common formats
-                try:
-                    dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    # ignore unparsable
-                    continue
-            parsed.append((ev, dt))
-
-        # pair sign_in -> sign_out; if missing sign_out ignore that sign_in
-        i = 0
-        while i < len(parsed):
-            ev, dt = parsed[i]
-            if ev == "sign_in":
-                # find next sign_out
-                j = i + 1
-                while j < len(parsed) and parsed[j][0] != "sign_out":
-                    j += 1
-                if j < len(parsed) and parsed[j][0] == "sign_out":
-                    dt_out = parsed[j][1]
-                    # if sign_out earlier than sign_in skip
-                    if dt_out > dt:
-                        duration = (dt_out - dt).total_seconds() / 3600.0
-                        day_key = dt.date().isoformat()
-                        day_hours[day_key] += duration
-                    i = j + 1
-                else:
-                    # no sign_out found -> skip this sign_in
-                    i += 1
-            else:
-                # stray sign_out with no preceding sign_in -> ignore
-                i += 1
+        start, end = month_bounds(period_year, period_month)
+        rows = self.archive.query("SELECT event, timestamp FROM {attendance} WHERE employee_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp, id",
+                                  (employee_id, start, end), start, end)
+        # unparsable timestamps are ignored; a sign_in without a sign_out is skipped
+        parsed = ((r["event"], dt) for r in rows for dt in (parse_ts(r["timestamp"]),) if dt is not None)
+        for dt_in, dt_out in pair_shifts(parsed):
+            day_us[dt_in.date().isoformat()] += (dt_out - dt_in) // _US
+        return dict(day_us)
 
-        return dict(day_hours)
+    def _rate_units(self, rate: float) -> int:
+        units = self._units.get(rate)
+        if units is None:
+            units = self._units[rate] = rate_units(rate)
+        return units
 
-    def compute_for_employee(self, employee_id: int, year: int, month: int, hourly_rate: Optional[float] = None) -> dict:
+    def _day_contribution(self, worked_us: int, rate: float) -> tuple:
+        """(worked_us, regular_us, overtime_us, rate_units) for one day's worked time."""
+        regular = min(_REGULAR_US, worked_us)
+        return (worked_us, regular, worked_us - regular, self._rate_units(rate))
+
+    def _day_gross(self, c: tuple) -> int:
+        """Gross of one day contribution as a numerator over _gross_den."""
+        return c[3] * (c[1] * self._ot.denominator + c[2] * self._ot.numerator)
+
+    def _row(self, emp, year: int, month: int, hourly_rate: float, regular_us: int, overtime_us: int, gross_cents: int, adjustment_cents: int) -> dict:
         """
-        Compute payroll for employee for given year/month.
-        If hourly_rate not provided, read from employees table.
-        Returns a dict with payroll data.
+        Payroll dict shared by every path. Money is carried as integer cents
+        (gross_cents, adjustments_cents, tax_cents, net_cents); the float fields are the
+        same values in currency units for display and the REAL columns.
         """
-        if hourly_rate is None:
-            hourly_rate = self._get_employee_rate(employee_id)
+        return {
+            "employee_id": emp["id"],
+            "full_name": emp["full_name"],
+            "period": f"{year:04d}-{month:02d}",
+            "hourly_rate": cents_to_float(to_cents(hourly_rate)),
+            "regular_hours": hours_from_us(regular_us),
+            "overtime_hours": hours_from_us(overtime_us),
+            "gross": cents_to_float(gross_cents),
+            "adjustments": cents_to_float(adjustment_cents),
+            "tax_code": emp["tax_code"],
+            "tax": 0.0,
+            "net": 0.0,
+            "gross_cents": gross_cents,
+            "adjustments_cents": adjustment_cents,
+            "tax_cents": 0,
+            "net_cents": 0,
+        }
 
-        # Get employee name
-        emp_row = self.db.fetchone("SELECT full_name FROM employees WHERE id = ? AND active = 1", (employee_id,))
+    def _compute_pre_tax(self, employee_id: int, year: int, month: int, hourly_rate: Optional[float] = None, rate_index: Optional[RateIndex] = None,
+                         days_out: Optional[dict] = None) -> dict:
+        """
+        Compute hours, gross and adjustments for an employee; tax and net are
+        filled in afterwards by _apply_tax so a whole month can be taxed in bulk.
+        Without an explicit hourly_rate each day is paid at the rate in force that day
+        (rate_history); the reported hourly_rate is the one in force at month end.
+        days_out, if given, receives the per-day contributions (see _day_contribution).
+        """
+        # Get employee name and tax code
+        emp_row = self.employees.get_active(employee_id)
         if not emp_row:
             raise ValueError(f"Employee {employee_id} not found or inactive")
-        full_name = emp_row["full_name"]
 
-        day_hours = self._aggregate_hours_by_day(employee_id, year, month)
-        regular_hours = sum(min(8.0, h) for h in day_hours.values())
-        overtime_hours = sum(max(0.0, h - 8.0) for h in day_hours.values())
+        if hourly_rate is None:
+            rate_index = rate_index or self.load_rate_index([employee_id])
+            if not rate_index.has(employee_id):
+                hourly_rate = self._get_employee_rate(employee_id)
 
-        gross = round(regular_hours * hourly_rate + overtime_hours * hourly_rate * self.overtime_multiplier, 2)
-        adjustments = round(self._sum_adjustments(employee_id, year, month), 2)
+        day_us = self._aggregate_us_by_day(employee_id, year, month)
+        # each day is paid at the rate that applied that day
+        days = {day: self._day_contribution(us, hourly_rate if hourly_rate is not None else rate_index.rate_on(employee_id, day))
+                for day, us in day_us.items()}
+        if days_out is not None:
+            days_out.update(days)
+        if hourly_rate is None:
+            hourly_rate = rate_index.rate_on(employee_id, f"{year:04d}-{month:02d}-{monthrange(year, month)[1]:02d}")
+        gross_cents = div_half_up(sum(self._day_gross(c) for c in days.values()) * 100, self._gross_den)
+        return self._row(emp_row, year, month, hourly_rate, sum(c[1] for c in days.values()), sum(c[2] for c in days.values()),
+                         gross_cents, self.adjustments.totals_for_month(year, month, employee_id).get(employee_id, 0))
+
+    @traced("payroll.apply_tax")
+    def _apply_tax(self, rows: List[dict], year: int, month: int, errors: Optional[dict] = None) -> List[dict]:
+        """
+        Fill tax/net for a batch of pre-tax rows using the table in force for the month.
+        With `errors`, a row whose tax cannot be worked out (e.g. an unknown tax code) is
+        reported, recorded there as employee_id -> message and left out of the result
+        instead of failing the batch.
+        """
         # apply adjustments (allowances positive, deductions negative)
-        net_before_tax = gross + adjustments
-        tax = round(net_before_tax * self.tax_policy.rate, 2)
-        net = round(net_before_tax - tax, 2)
+        taxable = [r["gross_cents"] + r["adjustments_cents"] for r in rows]
+        try:
+            taxes = self.tax_policy.tax_bulk_cents(taxable, [r.get("tax_code") for r in rows], year, month)
+        except ValueError:
+            if errors is None:
+                raise
+            # one bad row: redo the batch a row at a time and keep the rest
+            kept, taxes = [], []
+            for r, base in zip(rows, taxable):
+                try:
+                    taxes.append(self.tax_policy.tax_bulk_cents([base], [r.get("tax_code")], year, month)[0])
+                except ValueError as e:
+                    record_error("payroll.tax", e)
+                    errors[r["employee_id"]] = str(e)
+                    print(f"Payroll skipped for employee {r['employee_id']} ({year:04d}-{month:02d}): {e}")
+                    continue
+                kept.append((r, base))
+            rows, taxable = [r for r, _ in kept], [b for _, b in kept]
+        for r, base, tax in zip(rows, taxable, taxes):
+            r["tax_cents"], r["net_cents"] = tax, base - tax
+            r["tax"], r["net"] = cents_to_float(tax), cents_to_float(base - tax)
+        return rows
 
-        return {
-            "employee_id": employee_id,
-            "full_name": full_name,
-            "period": f"{year:04d}-{month:02d}",
-            "hourly_rate": round(hourly_rate, 2),
-            "regular_hours": round(regular_hours, 2),
-            "overtime_hours": round(overtime_hours, 2),
-            "gross": gross,
-            "adjustments": adjustments,
-            "tax": tax,
-            "net": net
-        }
+    @traced("payroll.month_worked")
+    def _month_worked(self, year: int, month: int, emps: dict, filtered: bool = False) -> dict:
+        """
+        employee_id -> {day: worked microseconds} for the employees in `emps`, from one
+        streaming pass in (employee_id, timestamp, id) order. `filtered` restricts the
+        query to those employees instead of skipping the others while streaming.
+        """
+        start, end = month_bounds(year, month)
+        sql, params = "SELECT employee_id, event, timestamp FROM {attendance} WHERE timestamp >= ? AND timestamp < ?", (start, end)
+        if filtered:
+            sql, params = sql + f" AND employee_id IN ({','.join('?' * len(emps))})", (*params, *emps)
+        events = self.archive.iterate(sql + " ORDER BY employee_id, timestamp, id", params, start, end, batch_size=5000)
+        worked = {}
+        for eid, rows in groupby(events, key=lambda r: r[0]):
+            if eid not in emps:
+                continue
+            day_us = worked[eid] = defaultdict(int)
+            parsed = ((r[1], dt) for r in rows for dt in (parse_ts(r[2]),) if dt is not None)
+            for dt_in, dt_out in pair_shifts(parsed):
+                day_us[dt_in.date().isoformat()] += (dt_out - dt_in) // _US
+        return worked
 
+    @traced("payroll.compute_month")
+    def compute_month(self, year: int, month: int, employee_ids: Optional[List[int]] = None, rate_index: Optional[RateIndex] = None,
+                      errors: Optional[dict] = None) -> List[dict]:
+        """
+        Whole-month batch path: one streaming pass over the month's attendance in
+        (employee_id, timestamp, id) order, paired like _aggregate_us_by_day and paid in
+        integer cents, one grouped read of adjustments and one bulk tax pass. Gives the
+        same rows as compute_for_employee for each active employee, in employee order.
+        An employee whose tax cannot be computed is reported and skipped, not fatal to
+        the month; pass `errors` to get them back as employee_id -> message.
+        """
+        emps = {e["id"]: e for e in self.employees.active()}
+        if employee_ids is not None:
+            emps = {eid: emps[eid] for eid in sorted(set(employee_ids)) if eid in emps}
+        if not emps:
+            return []
+        with span("payroll.load_rates"):
+            rate_index = rate_index or self.load_rate_index(None if employee_ids is None else list(emps))
+        worked = self._month_worked(year, month, emps, filtered=employee_ids is not None)
+        with span("payroll.adjustments"):
+            adjustments = self.adjustments.totals_for_month(year, month)
+        last_day = f"{year:04d}-{month:02d}-{monthrange(year, month)[1]:02d}"
+        md, mn = self._ot.denominator, self._ot.numerator
+        out = []
+        with span("payroll.pay", employees=len(emps)):
+            for eid, emp in emps.items():
+                has_history = rate_index.has(eid)
+                fixed = None if has_history else float(emp["rate"])
+                regular = overtime = gross = 0
+                for day, us in worked.get(eid, {}).items():
+                    reg = min(_REGULAR_US, us)
+                    units = self._rate_units(fixed if fixed is not None else rate_index.rate_on(eid, day))
+                    regular += reg
+                    overtime += us - reg
+                    gross += units * (reg * md + (us - reg) * mn)
+                out.append(self._row(emp, year, month, rate_index.rate_on(eid, last_day) if has_history else fixed,
+                                     regular, overtime, div_half_up(gross * 100, self._gross_den), adjustments.get(eid, 0)))
+        return self._apply_tax(out, year, month, {} if errors is None else errors)
+
+    @traced("payroll.compute_for_employee")
+    def compute_for_employee(self, employee_id: int, year: int, month: int, hourly_rate: Optional[float] = None) -> dict:
+        """
+        Compute payroll for employee for given year/month.
+        If hourly_rate not provided, each day uses the rate in force that day.
+        Returns a dict with payroll data.
+        """
+        pr = self._compute_pre_tax(employee_id, year, month, hourly_rate=hourly_rate)
+        return self._apply_tax([pr], year, month)[0]
+
+    @traced("payroll.persist_for_employee")
     def persist_for_employee(self, employee_id: int, year: int, month: int, hourly_rate: Optional[float] = None) -> dict:
         """
         Compute payroll for a single employee for year/month and insert or update payroll_runs.
-        Returns the computed payroll dict.
+        Also stores the per-day contributions and exact running totals that
+        record_sign_out() updates incrementally. Returns the computed payroll dict.
         """
-        pr = self.compute_for_employee(employee_id, year, month, hourly_rate=hourly_rate)
-
-        exists = self.db.fetchone("SELECT id FROM payroll_runs WHERE employee_id = ? AND year = ? AND month = ?", (employee_id, year, month))
-        if exists:
-            self.db.execute("""UPDATE payroll_runs SET
-                                regular_hours = ?, overtime_hours = ?, hourly_rate = ?, gross_pay = ?, total_adjustments = ?, net_pay = ?
-                                WHERE id = ?""",
-                            (pr.get("regular_hours"), pr.get("overtime_hours"), pr.get("hourly_rate"), pr.get("gross"), pr.get("adjustments", 0.0), pr.get("net"), exists["id"]))
-        else:
-            self.db.execute("""INSERT INTO payroll_runs
-                               (employee_id, year, month, regular_hours, overtime_hours, hourly_rate, gross_pay, total_adjustments, net_pay)
-                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (employee_id, year, month, pr.get("regular_hours"), pr.get("overtime_hours"), pr.get("hourly_rate"), pr.get("gross"), pr.get("adjustments", 0.0), pr.get("net")))
+        days = {}
+        pr = self._compute_pre_tax(employee_id, year, month, hourly_rate=hourly_rate, days_out=days)
+        self._apply_tax([pr], year, month)
+        if self.periods.period_model.is_closed(year, month):
+            # closed months are frozen; later changes surface as delta lines on re-run
+            return pr
+
+        exact = self._exact_totals(days.values())
+        with self.db.transaction(immediate=True) as conn:
+            exists = conn.execute("SELECT id FROM payroll_runs WHERE employee_id = ? AND year = ? AND month = ? ORDER BY id DESC LIMIT 1",
+                                  (employee_id, year, month)).fetchone()
+            values = (*self._run_values(pr), *(str(t) for t in exact))
+            if exists:
+                conn.execute(f"""UPDATE payroll_runs SET {', '.join(f'{col} = ?' for col in _RUN_COLUMNS)},
+                                 regular_exact = ?, overtime_exact = ?, gross_exact = ?
+                                 WHERE id = ?""", (*values, exists["id"]))
+            else:
+                conn.execute(f"""INSERT INTO payroll_runs (employee_id, year, month, {', '.join(_RUN_COLUMNS)}, regular_exact, overtime_exact, gross_exact)
+                                 VALUES ({', '.join('?' * (len(_RUN_COLUMNS) + 6))})""", (employee_id, year, month, *values))
+            conn.execute("DELETE FROM payroll_day_totals WHERE employee_id = ? AND year = ? AND month = ?", (employee_id, year, month))
+            conn.executemany("""INSERT INTO payroll_day_totals (employee_id, day, year, month, hours, regular, overtime, gross, rate, worked_us)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             [(employee_id, day, year, month, *self._day_row(c)) for day, c in days.items()])
+            self.rollups.apply(conn, year, month, [pr])
         return pr
 
+    @staticmethod
+    def _run_values(pr: dict) -> tuple:
+        """payroll_runs values in _RUN_COLUMNS order."""
+        return (pr["regular_hours"], pr["overtime_hours"], pr["hourly_rate"], pr["gross"], pr["adjustments"], pr["net"],
+                pr["gross_cents"], pr["adjustments_cents"], pr["tax_cents"], pr["net_cents"])
+
+    def _exact_totals(self, contributions) -> List[Fraction]:
+        """Exact month totals (regular hours, overtime hours, gross) of day contributions."""
+        contributions = list(contributions)
+        return [Fraction(sum(c[1] for c in contributions), US_PER_HOUR),
+                Fraction(sum(c[2] for c in contributions), US_PER_HOUR),
+                Fraction(sum(self._day_gross(c) for c in contributions), self._gross_den)]
+
+    def _day_row(self, c: tuple) -> tuple:
+        """payroll_day_totals values (hours, regular, overtime, gross, rate, worked_us) for a contribution."""
+        return (c[0] / US_PER_HOUR, c[1] / US_PER_HOUR, c[2] / US_PER_HOUR, self._day_gross(c) / self._gross_den, c[3] / RATE_SCALE, c[0])
+
+    # --- incremental sign-out path ---
+    def _shift_day_for_sign_out(self, conn, employee_id: int, sign_out_ts: str) -> Optional[str]:
+        """
+        Sign-in day of the shift that the sign_out at sign_out_ts closes, using the month
+        loop's pairing (earliest sign_in since the previous sign_out in the same month).
+        None for a stray sign_out.
+        """
+        dt = parse_ts(sign_out_ts)
+        start, _ = month_bounds(dt.year, dt.month)
+        out = conn.execute("SELECT MAX(id) FROM attendance WHERE employee_id = ? AND event = 'sign_out' AND timestamp = ?",
+                           (employee_id, sign_out_ts)).fetchone()
+        out_id = out[0] if out[0] is not None else 2 ** 62
+        prev = conn.execute("""SELECT timestamp, id FROM attendance WHERE employee_id = ? AND event = 'sign_out'
+                               AND timestamp >= ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT 1""",
+                            (employee_id, start, sign_out_ts, out_id)).fetchone()
+        lower = (prev["timestamp"], prev["id"]) if prev else (start, 0)
+        first_in = conn.execute("""SELECT timestamp FROM attendance WHERE employee_id = ? AND event = 'sign_in'
+                                   AND timestamp >= ? AND (timestamp, id) > (?, ?) AND (timestamp, id) < (?, ?)
+                                   ORDER BY timestamp, id LIMIT 1""",
+                                (employee_id, start, *lower, sign_out_ts, out_id)).fetchone()
+        if not first_in:
+            return None
+        in_dt = parse_ts(first_in["timestamp"])
+        return in_dt.date().isoformat() if in_dt else None
+
+    def _us_for_day(self, conn, employee_id: int, day: str) -> int:
+        """
+        Worked microseconds of the shifts that start on `day`, paired by the same rules as
+        shifts.pair_shifts (used by _aggregate_us_by_day for the whole month), but reading
+        only from the last sign_out before that day.
+        """
+        d = datetime.fromisoformat(day).date()
+        start, end = month_bounds(d.year, d.month)
+        prev = conn.execute("""SELECT timestamp, id FROM attendance WHERE employee_id = ? AND event = 'sign_out'
+                               AND timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC, id DESC LIMIT 1""",
+                            (employee_id, start, f"{day}T00:00:00")).fetchone()
+        lower = (prev["timestamp"], prev["id"]) if prev else (start, 0)
+        cur = conn.execute("""SELECT event, timestamp FROM attendance WHERE employee_id = ?
+                              AND timestamp >= ? AND timestamp < ? AND (timestamp, id) > (?, ?)
+                              ORDER BY timestamp, id""",
+                           (employee_id, start, end, *lower))
+        worked = 0
+        open_in = None
+        for r in cur:
+            dt = parse_ts(r["timestamp"])
+            if dt is None:
+                continue
+            if r["event"] == "sign_in":
+                if open_in is None:
+                    if dt.date() > d:
+                        break
+                    open_in = dt
+            elif r["event"] == "sign_out" and open_in is not None:
+                if dt > open_in and open_in.date() == d:
+                    worked += (dt - open_in) // _US
+                open_in = None
+        return worked
+
+    @traced("payroll.record_sign_out")
+    def record_sign_out(self, employee_id: int, sign_out_ts: str) -> Optional[dict]:
+        """
+        Incremental payroll update after a sign-out: recompute only the day of the shift
+        it closed, then apply that day's change to the month's exact running totals in
+        payroll_runs with one UPDATE, all in one transaction. Falls back to
+        persist_for_employee when the month has no running totals yet. Returns the month's
+        payroll dict (None when payroll is unaffected, e.g. a stray sign_out).
+        """
+        dt = parse_ts(sign_out_ts)
+        if dt is None:
+            return None
+        year, month = dt.year, dt.month
+        emp = self.employees.get_active(employee_id)
+        if not emp:
+            raise ValueError(f"Employee {employee_id} not found or inactive")
+        pr = None
+        with self.db.transaction(immediate=True) as conn:
+            if conn.execute("SELECT 1 FROM payroll_periods WHERE year = ? AND month = ? AND status = 'closed'", (year, month)).fetchone():
+                return None
+            run = conn.execute("""SELECT id, regular_exact, overtime_exact, gross_exact, gross_cents FROM payroll_runs
+                                  WHERE employee_id = ? AND year = ? AND month = ? ORDER BY id DESC LIMIT 1""",
+                               (employee_id, year, month)).fetchone()
+            rate_index = RateIndex.from_rows(conn.execute(
+                "SELECT employee_id, effective_from, rate FROM rate_history WHERE employee_id = ? ORDER BY effective_from", (employee_id,)))
+            # rows written before cents were stored need one full recompute first
+            if run is not None and run["gross_exact"] is not None and run["gross_cents"] is not None:
+                day = self._shift_day_for_sign_out(conn, employee_id, sign_out_ts)
+                if day is None:
+                    return None  # stray sign_out: payroll ignores it
+                # same rate choice as _compute_pre_tax: the day's rate, or the current rate without history
+                rate_on = (lambda d: rate_index.rate_on(employee_id, d)) if rate_index.has(employee_id) else (lambda d: float(emp["rate"]))
+                new = self._day_contribution(self._us_for_day(conn, employee_id, day), rate_on(day))
+                old = conn.execute("SELECT worked_us, rate FROM payroll_day_totals WHERE employee_id = ? AND day = ?",
+                                   (employee_id, day)).fetchone()
+                old = self._day_contribution(old["worked_us"], old["rate"]) if old else (0, 0, 0, 0)
+                old_exact, new_exact = self._exact_totals([old]), self._exact_totals([new])
+                totals = [Fraction(run[col]) - old_exact[i] + new_exact[i]
+                          for i, col in enumerate(("regular_exact", "overtime_exact", "gross_exact"))]
+                adj = self.adjustments.totals_for_month(year, month, employee_id, conn=conn).get(employee_id, 0)
+                pr = self._row(emp, year, month, rate_on(f"{year:04d}-{month:02d}-{monthrange(year, month)[1]:02d}"),
+                               int(totals[0] * US_PER_HOUR), int(totals[1] * US_PER_HOUR), to_cents(totals[2]), adj)
+                self._apply_tax([pr], year, month)
+                conn.execute(f"""UPDATE payroll_runs SET {', '.join(f'{col} = ?' for col in _RUN_COLUMNS)},
+                                 regular_exact = ?, overtime_exact = ?, gross_exact = ?, generated_at = CURRENT_TIMESTAMP
+                                 WHERE id = ?""",
+                             (*self._run_values(pr), *(str(t) for t in totals), run["id"]))
+                conn.execute("""INSERT OR REPLACE INTO payroll_day_totals (employee_id, day, year, month, hours, regular, overtime, gross, rate, worked_us)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", (employee_id, day, year, month, *self._day_row(new)))
+                self.rollups.apply(conn, year, month, [pr])
+        if pr is None:
+            return self.persist_for_employee(employee_id, year, month)
+        if self.verify_incremental:
+            diff = self.verify_month(employee_id, year, month)
+            if diff:
+                count("payroll.incremental_mismatch")
+                record_error("payroll.verify_incremental",
+                             ValueError(f"employee {employee_id} {year:04d}-{month:02d} differs from a full recompute: {diff}; rewriting"))
+                return self.persist_for_employee(employee_id, year, month)
+        return pr
+
+    @traced("payroll.verify_month")
+    def verify_month(self, employee_id: int, year: int, month: int) -> dict:
+        """Compare the stored payroll_runs row with a full recompute; returns {field: (stored, full)} for mismatches."""
+        full = self.compute_for_employee(employee_id, year, month)
+        run = self.db.fetchone(f"""SELECT {', '.join(_RUN_COLUMNS)} FROM payroll_runs
+                                  WHERE employee_id = ? AND year = ? AND month = ? ORDER BY id DESC LIMIT 1""", (employee_id, year, month))
+        if run is None:
+            return {"row": (None, "missing")}
+        pairs = {"regular_hours": "regular_hours", "overtime_hours": "overtime_hours", "hourly_rate": "hourly_rate",
+                 "gross_cents": "gross_cents", "adjustments_cents": "adjustments_cents", "tax_cents": "tax_cents", "net_cents": "net_cents"}
+        return {col: (run[col], full[key]) for col, key in pairs.items() if run[col] != full[key]}
+
     def generate_payroll_for_month(self, year: int, month: int) -> List[dict]:
         """
         Compute payroll for all active employees and persist into payroll_runs.
         Returns list of dict rows computed.
+        Closed months are not regenerated: the frozen snapshot plus its delta lines is
+        returned as is (re-running changed employees is periods.rerun_period()).
         """
-        rows = self.db.query("SELECT id, full_name, role, department, contact, rate FROM employees WHERE active = 1")
-        results = []
-        for emp in rows:
-            emp_id = emp["id"]
-            full_name = emp["full_name"]
-            rate = float(emp["rate"])
-            try:
-                pr = self.compute_for_employee(emp_id, year, month, hourly_rate=rate)
-                # persist into payroll_runs table
-                self.db.execute("""INSERT INTO payroll_runs
-                                   (employee_id, year, month, regular_hours, overtime_hours, hourly_rate, gross_pay, total_adjustments, net_pay)
-                                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                                (emp_id, year, month, pr["regular_hours"], pr["overtime_hours"], pr["hourly_rate"], pr["gross"], pr.get("adjustments", 0.0), pr["net"]))
-                results.append(pr)
-            except Exception as e:
-                print(f"Error computing payroll for employee {emp_id}: {e}")
-        return results
+        with span("payroll.generate_month", year=year, month=month) as sp:
+            if self.periods.period_model.is_closed(year, month):
+                sp.set(closed=True)
+                return self.periods.closed_results(year, month)
+            # one streaming pass over the month, paid and taxed in integer cents
+            results = self.compute_month(year, month)
+            with span("payroll.persist", rows=len(results)):
+                with self.db.transaction(immediate=True) as conn:
+                    conn.executemany(f"""INSERT INTO payroll_runs (employee_id, year, month, {', '.join(_RUN_COLUMNS)})
+                                         VALUES ({', '.join('?' * (len(_RUN_COLUMNS) + 3))})""",
+                                     [(pr["employee_id"], year, month, *self._run_values(pr)) for pr in results])
+                    with span("payroll.rollups"):
+                        self.rollups.apply(conn, year, month, results)
+            sp.set(employees=len(results))
+            return results
 
+    @traced("payroll.export_monthly_csv")
     def export_monthly_csv(self, year: int, month: int, out_path: Optional[str] = None) -> str:
         """Export payroll for a month to CSV."""
         results = self.generate_payroll_for_month(year, month)
@@ -222,19 +558,15 @@ class PayrollService:
         with open(out_path, "w", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=[
                 "employee_id", "full_name", "period", "hourly_rate", 
-                "regular_hours", "overtime_hours", "gross", "adjustments", "tax", "net"
-            ])
+                "regular_hours", "overtime_hours", "gross", "adjustments", "tax_code", "tax", "net"
+            ], extrasaction="ignore")
             writer.writeheader()
             writer.writerows(results)
         
         return str(out_path)
 
-    def export_individual_payslip_csv(self, employee_id: int, year: int, month: int, out_path: Optional[str] = None) -> str:
-        """Export individual payslip to CSV."""
-        pr = self.compute_for_employee(employee_id, year, month)
-        emp = self.db.fetchone("SELECT id, full_name, role, department, contact, rate FROM employees WHERE id = ?", (employee_id,))
-        full_name = emp["full_name"] if emp else f"Employee {employee_id}"
-        out_path = out_path or f"payslip_{employee_id}_{year}_{month:02d}.csv"
+    @staticmethod
+    def _write_payslip_csv(pr: dict, full_name: str, employee_id: int, year: int, month: int, out_path) -> str:
         with open(out_path, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
             writer.writerow(["Payslip", full_name])
@@ -248,22 +580,14 @@ class PayrollService:
             writer.writerow(["Adjustments", pr.get("adjustments", 0.0)])
             writer.writerow(["Tax", pr.get("tax")])
             writer.writerow(["Net", pr.get("net")])
-        return out_path
-
-    def export_individual_payslip_pdf(self, employee_id: int, year: int, month: int, out_path: Optional[str] = None) -> str:
-        """Export individual payslip to PDF (fallback to CSV if reportlab missing)."""
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.pdfgen import canvas
-        except Exception:
-            return self.export_individual_payslip_csv(employee_id, year, month, out_path=f"{out_path or 'payslip'}.csv")
+        return str(out_path)
 
-        pr = self.compute_for_employee(employee_id, year, month)
-        emp = self.db.fetchone("SELECT id, full_name FROM employees WHERE id = ?", (employee_id,))
-        full_name = emp["full_name"] if emp else f"Employee {employee_id}"
-        out_path = out_path or f"payslip_{employee_id}_{year}_{month:02d}.pdf"
+    @staticmethod
+    def _write_payslip_pdf(pr: dict, full_name: str, employee_id: int, year: int, month: int, out_path) -> str:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
 
-        c = canvas.Canvas(out_path, pagesize=A4)
+        c = canvas.Canvas(str(out_path), pagesize=A4)
         text = c.beginText(40, 800)
         text.setFont("Helvetica-Bold", 14)
         text.textLine(f"Payslip - {year:04d}-{month:02d}")
@@ -280,4 +604,47 @@ class PayrollService:
         c.drawText(text)
         c.showPage()
         c.save()
-        return out_path
\ No newline at end of file
+        return str(out_path)
+
+    @traced("payroll.export_individual_payslip_csv")
+    def export_individual_payslip_csv(self, employee_id: int, year: int, month: int, out_path: Optional[str] = None) -> str:
+        """Export individual payslip to CSV."""
+        pr = self.compute_for_employee(employee_id, year, month)
+        emp = self.employees.get(employee_id)
+        full_name = emp["full_name"] if emp else f"Employee {employee_id}"
+        out_path = out_path or f"payslip_{employee_id}_{year}_{month:02d}.csv"
+        return self._write_payslip_csv(pr, full_name, employee_id, year, month, out_path)
+
+    @traced("payroll.export_individual_payslip_pdf")
+    def export_individual_payslip_pdf(self, employee_id: int, year: int, month: int, out_path: Optional[str] = None) -> str:
+        """Export individual payslip to PDF (fallback to CSV if reportlab missing)."""
+        try:
+            import reportlab  # noqa: F401
+        except Exception:
+            return self.export_individual_payslip_csv(employee_id, year, month, out_path=f"{out_path or 'payslip'}.csv")
+
+        pr = self.compute_for_employee(employee_id, year, month)
+        emp = self.employees.get(employee_id)
+        full_name = emp["full_name"] if emp else f"Employee {employee_id}"
+        out_path = out_path or f"payslip_{employee_id}_{year}_{month:02d}.pdf"
+        return self._write_payslip_pdf(pr, full_name, employee_id, year, month, out_path)
+
+    @traced("payroll.export_payslips")
+    def export_payslips(self, year: int, month: int, out_dir: str | Path = ".", fmt: str = "pdf") -> List[str]:
+        """
+        Payslips for every active employee from one compute_month pass (instead of a
+        recompute per payslip). PDF falls back to CSV when reportlab is missing.
+        """
+        if fmt == "pdf":
+            try:
+                import reportlab  # noqa: F401
+            except Exception:
+                fmt = "csv"
+        elif fmt != "csv":
+            raise ValueError(f"Unsupported format: {fmt}")
+        write = self._write_payslip_pdf if fmt == "pdf" else self._write_payslip_csv
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        return [write(pr, pr.get("full_name") or f"Employee {pr['employee_id']}", pr["employee_id"], year, month,
+                      out_dir / f"payslip_{pr['employee_id']}_{year}_{month:02d}.{fmt}")
+                for pr in self.compute_month(year, month)]
@@ -0,0 +1,233 @@
+from __future__ import annotations
+from itertools import groupby
+from datetime import datetime
+from calendar import monthrange
+from typing import Optional, Iterable, List
+import hashlib
+
+try:
+    from ..models.period import PeriodModel
+    from .archive_service import month_bounds
+    from .money import cents_to_float
+    from .adjustment_service import _SCHEDULE_LINES_SQL
+except Exception:
+    from src.models.period import PeriodModel  # type: ignore
+    from src.services.archive_service import month_bounds  # type: ignore
+    from src.services.money import cents_to_float  # type: ignore
+    from src.services.adjustment_service import _SCHEDULE_LINES_SQL  # type: ignore
+
+_HOUR_FIELDS = ("regular_hours", "overtime_hours")
+# money is frozen and re-run in integer cents; the REAL columns mirror the cents
+_CENT_FIELDS = ("gross", "adjustments", "tax", "net")
+
+
+class PeriodCloseService:
+    """
+    Month-end close. close_period() freezes each employee's payroll result in
+    payroll_snapshots together with a hash of its inputs (attendance events,
+    adjustments, rate). Later writes to a closed month are logged to payroll_changes
+    by triggers, so rerun_period() only recomputes the employees named there and
+    records the difference as payroll_deltas lines instead of rewriting history.
+    Re-runs are explicit (payroll menu, or the period_rerun scheduler job through
+    rerun_pending()); reading a closed month never writes.
+    """
+
+    def __init__(self, payroll_service):
+        self.payroll_service = payroll_service
+        self.db = payroll_service.db
+        self.period_model = PeriodModel(self.db)
+
+    # --- input hashing ---
+    def input_hashes(self, year: int, month: int, rate_index, employee_ids: Iterable[int]) -> dict:
+        """
+        employee_id -> sha256 of that employee's payroll inputs for the month: attendance
+        events, one-off adjustments and the recurring schedules that apply that month
+        (one streaming query each). Schedule lines are only hashed when there are any, so
+        months without schedules keep the hashes they were closed with.
+        """
+        ids = sorted(set(employee_ids))
+        first_day, last_day = f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{monthrange(year, month)[1]:02d}"
+        hashes = {eid: hashlib.sha256(f"rate:{rate_index.signature(eid, first_day, last_day)}".encode()) for eid in ids}
+        start, end = month_bounds(year, month)
+        id_filter = f"AND employee_id IN ({','.join('?' * len(ids))})"
+        events = self.payroll_service.archive.iterate(
+            f"SELECT employee_id, event, timestamp, corrected_by_hr FROM {{attendance}} WHERE timestamp >= ? AND timestamp < ? {id_filter} ORDER BY employee_id, timestamp, id",
+            (start, end, *ids), start, end)
+        for eid, rows in groupby(events, key=lambda r: r["employee_id"]):
+            h = hashes.get(eid)
+            if h is None:
+                continue
+            for r in rows:
+                h.update(f"|{r['event']}@{r['timestamp']}#{r['corrected_by_hr']}".encode())
+        adj = self.db.iterate(
+            f"SELECT employee_id, amount, kind FROM adjustments WHERE year = ? AND month = ? {id_filter} ORDER BY employee_id, id",
+            (year, month, *ids))
+        for r in adj:
+            h = hashes.get(r["employee_id"])
+            if h is not None:
+                h.update(f"|adj:{float(r['amount']):.2f}:{r['kind']}".encode())
+        ym = f"{year:04d}-{month:02d}"
+        sched = self.db.iterate(
+            f"SELECT employee_id, schedule_id, cents FROM ({_SCHEDULE_LINES_SQL}) WHERE 1 = 1 {id_filter} ORDER BY employee_id, schedule_id",
+            (last_day, first_day, ym, ym, *ids))
+        for r in sched:
+            h = hashes.get(r["employee_id"])
+            if h is not None:
+                h.update(f"|sched:{r['schedule_id']}:{r['cents']}".encode())
+        return {eid: h.hexdigest() for eid, h in hashes.items()}
+
+    # --- close ---
+    def close_period(self, year: int, month: int) -> dict:
+        """Compute, freeze and mark the month closed. Returns {'employees': n, 'snapshot_hash': ...}."""
+        if self.period_model.is_closed(year, month):
+            raise ValueError(f"{year:04d}-{month:02d} is already closed")
+        ps = self.payroll_service
+        rate_index = ps.load_rate_index()
+        errors = {}
+        rows = ps.compute_month(year, month, rate_index=rate_index, errors=errors)
+        hashes = self.input_hashes(year, month, rate_index, [r["employee_id"] for r in rows])
+        period_hash = hashlib.sha256("".join(f"{r['employee_id']}:{hashes[r['employee_id']]}" for r in rows).encode()).hexdigest()
+
+        with self.db.transaction(immediate=True) as conn:
+            watermark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM payroll_changes").fetchone()[0]
+            # one frozen payroll_runs row per employee for the month
+            conn.execute("DELETE FROM payroll_runs WHERE year = ? AND month = ?", (year, month))
+            conn.executemany("""INSERT INTO payroll_runs
+                                (employee_id, year, month, regular_hours, overtime_hours, hourly_rate, gross_pay, total_adjustments, net_pay,
+                                 gross_cents, adjustments_cents, tax_cents, net_cents)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             [(r["employee_id"], year, month, *ps._run_values(r)) for r in rows])
+            conn.executemany("""INSERT OR REPLACE INTO payroll_snapshots
+                                (employee_id, year, month, input_hash, hourly_rate, regular_hours, overtime_hours, gross, adjustments, tax, net,
+                                 gross_cents, adjustments_cents, tax_cents, net_cents)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             [(r["employee_id"], year, month, hashes[r["employee_id"]], r["hourly_rate"], *(r[f] for f in _HOUR_FIELDS),
+                               *(cents_to_float(r[f"{f}_cents"]) for f in _CENT_FIELDS), *(r[f"{f}_cents"] for f in _CENT_FIELDS)) for r in rows])
+            ps.rollups.apply(conn, year, month, rows)
+            conn.execute("""INSERT INTO payroll_periods (year, month, status, closed_at, snapshot_hash, last_change_id)
+                            VALUES (?, ?, 'closed', ?, ?, ?)
+                            ON CONFLICT(year, month) DO UPDATE SET status = 'closed', closed_at = excluded.closed_at,
+                                snapshot_hash = excluded.snapshot_hash, last_change_id = excluded.last_change_id""",
+                         (year, month, datetime.now().isoformat(), period_hash, watermark))
+            # employees left out (tax errors) are pending changes: the next re-run pays them once fixed
+            conn.executemany("INSERT INTO payroll_changes (employee_id, year, month, source) VALUES (?, ?, ?, 'payroll_error')",
+                             [(eid, year, month) for eid in errors])
+        return {"employees": len(rows), "snapshot_hash": period_hash, "errors": errors}
+
+    # --- incremental re-run ---
+    def rerun_period(self, year: int, month: int) -> List[dict]:
+        """
+        Recompute only employees with logged changes since the last run and write a
+        delta line for each whose inputs really differ. Returns the delta lines.
+        """
+        period = self.period_model.get(year, month)
+        if period.status != "closed":
+            raise ValueError(f"{year:04d}-{month:02d} is not closed")
+        top = self.db.fetchone("SELECT COALESCE(MAX(id), 0) AS top FROM payroll_changes WHERE year = ? AND month = ?", (year, month))["top"]
+        changed = [r["employee_id"] for r in self.db.query(
+            "SELECT DISTINCT employee_id FROM payroll_changes WHERE year = ? AND month = ? AND id > ? AND id <= ?",
+            (year, month, period.last_change_id, top))]
+        deltas, fresh, errors = [], [], {}
+        if changed:
+            effective = self._effective(year, month, changed)
+            rate_index = self.payroll_service.load_rate_index(changed)
+            hashes = self.input_hashes(year, month, rate_index, changed)
+            # unchanged inputs (e.g. a row added then removed again) need no delta
+            redo = [eid for eid in changed if effective.get(eid) is None or effective[eid]["input_hash"] != hashes[eid]]
+            fresh = self.payroll_service.compute_month(year, month, employee_ids=redo, rate_index=rate_index, errors=errors) if redo else []
+            zero = {**{f: 0.0 for f in _HOUR_FIELDS}, **{f"{f}_cents": 0 for f in _CENT_FIELDS}}
+            for pr in fresh:
+                eid = pr["employee_id"]
+                eff = effective.get(eid) or zero
+                hours = {f: round(pr[f] - eff[f], 2) for f in _HOUR_FIELDS}
+                cents = {f"{f}_cents": pr[f"{f}_cents"] - eff[f"{f}_cents"] for f in _CENT_FIELDS}
+                # changed inputs that pay the same (e.g. a rate change before any worked day) add no line
+                if not any(hours.values()) and not any(cents.values()):
+                    continue
+                deltas.append({"employee_id": eid, "period": pr["period"], "input_hash": hashes[eid], "hourly_rate": pr["hourly_rate"],
+                               **hours, **{f: cents_to_float(cents[f"{f}_cents"]) for f in _CENT_FIELDS}, **cents})
+        with self.db.transaction(immediate=True) as conn:
+            conn.executemany("""INSERT INTO payroll_deltas
+                                (employee_id, year, month, input_hash, hourly_rate, regular_hours, overtime_hours, gross, adjustments, tax, net,
+                                 gross_cents, adjustments_cents, tax_cents, net_cents)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                             [(d["employee_id"], year, month, d["input_hash"], d["hourly_rate"], *(d[f] for f in (*_HOUR_FIELDS, *_CENT_FIELDS)),
+                               *(d[f"{f}_cents"] for f in _CENT_FIELDS)) for d in deltas])
+            # the re-run rows are the month's new effective totals
+            self.payroll_service.rollups.apply(conn, year, month, fresh)
+            if not errors:
+                # employees that failed stay pending (watermark kept) and are retried on the next re-run;
+                # the others are not duplicated then, their hash now matches their effective totals
+                conn.execute("UPDATE payroll_periods SET last_change_id = MAX(last_change_id, ?) WHERE year = ? AND month = ?", (top, year, month))
+        return deltas
+
+    def pending_changes(self, year: int, month: int) -> int:
+        """Changes logged for a closed month since its last re-run."""
+        return self.db.fetchone("""SELECT COUNT(*) AS n FROM payroll_changes c
+                                   JOIN payroll_periods p ON p.year = c.year AND p.month = c.month
+                                   WHERE c.year = ? AND c.month = ? AND c.id > p.last_change_id""", (year, month))["n"]
+
+    def rerun_pending(self) -> dict:
+        """Re-run every closed month with pending changes; returns {'YYYY-MM': delta lines written}."""
+        months = self.db.query("""SELECT DISTINCT c.year, c.month FROM payroll_changes c
+                                  JOIN payroll_periods p ON p.year = c.year AND p.month = c.month
+                                  WHERE p.status = 'closed' AND c.id > p.last_change_id ORDER BY c.year, c.month""")
+        return {f"{r['year']:04d}-{r['month']:02d}": len(self.rerun_period(r["year"], r["month"])) for r in months}
+
+    def _effective(self, year: int, month: int, employee_ids: Optional[List[int]] = None) -> dict:
+        """
+        Snapshot plus all delta lines, per employee, with the most recent input hash and
+        rate. Employees with delta lines but no snapshot (e.g. hired after the close) count
+        from zero. Money is summed in integer cents.
+        """
+        id_filter, params = "", (year, month) * 4
+        if employee_ids is not None:
+            id_filter = f"WHERE k.employee_id IN ({','.join('?' * len(employee_ids))})"
+            params = (*params, *employee_ids)
+        cents = ",\n                   ".join(f"COALESCE(s.{f}_cents, 0) + COALESCE(d.{f}_cents, 0) AS {f}_cents" for f in _CENT_FIELDS)
+        rows = self.db.query(f"""
+            WITH k AS (SELECT employee_id FROM payroll_snapshots WHERE year = ? AND month = ?
+                       UNION SELECT employee_id FROM payroll_deltas WHERE year = ? AND month = ?),
+                 d AS (SELECT employee_id, SUM(regular_hours) AS regular_hours, SUM(overtime_hours) AS overtime_hours,
+                              {', '.join(f"SUM({f}_cents) AS {f}_cents" for f in _CENT_FIELDS)},
+                              MAX(id) AS last_id
+                       FROM payroll_deltas WHERE year = ? AND month = ? GROUP BY employee_id)
+            SELECT k.employee_id,
+                   COALESCE(l.hourly_rate, s.hourly_rate, 0) AS hourly_rate,
+                   COALESCE(l.input_hash, s.input_hash) AS input_hash,
+                   COALESCE(s.regular_hours, 0) + COALESCE(d.regular_hours, 0) AS regular_hours,
+                   COALESCE(s.overtime_hours, 0) + COALESCE(d.overtime_hours, 0) AS overtime_hours,
+                   {cents}
+            FROM k
+            LEFT JOIN payroll_snapshots s ON s.employee_id = k.employee_id AND s.year = ? AND s.month = ?
+            LEFT JOIN d ON d.employee_id = k.employee_id
+            LEFT JOIN payroll_deltas l ON l.id = d.last_id
+            {id_filter}
+        """, params)
+        return {r["employee_id"]: {k: r[k] for k in r.keys()} for r in rows}
+
+    def closed_results(self, year: int, month: int) -> List[dict]:
+        """
+        Payroll rows for a closed month (frozen snapshot plus the delta lines written so
+        far) in compute_for_employee's shape. Read-only: pending changes show up after
+        the next rerun_period().
+        """
+        out = []
+        for eid, eff in sorted(self._effective(year, month).items()):
+            emp = self.payroll_service.employees.get(eid)
+            full_name, tax_code = (emp["full_name"], emp["tax_code"]) if emp else (f"Employee {eid}", None)
+            out.append({
+                "employee_id": eid,
+                "full_name": full_name,
+                "period": f"{year:04d}-{month:02d}",
+                "hourly_rate": round(eff["hourly_rate"], 2),
+                "regular_hours": round(eff["regular_hours"], 2),
+                "overtime_hours": round(eff["overtime_hours"], 2),
+                "gross": cents_to_float(eff["gross_cents"]),
+                "adjustments": cents_to_float(eff["adjustments_cents"]),
+                "tax_code": tax_code,
+                "tax": cents_to_float(eff["tax_cents"]),
+                "net": cents_to_float(eff["net_cents"]),
+                **{f"{f}_cents": eff[f"{f}_cents"] for f in _CENT_FIELDS}
+            })
+        return out
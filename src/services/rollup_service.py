@@ -0,0 +1,208 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Iterable, Iterator
+
+try:
+    from ..models.database import Database
+    from ..views.csv_view import CSVView, PDFView
+    from .money import cents_to_float
+except Exception:
+    from src.models.database import Database  # type: ignore
+    from src.views.csv_view import CSVView, PDFView  # type: ignore
+    from src.services.money import cents_to_float  # type: ignore
+
+# month values taken from a payroll dict, in payroll_month_totals column order
+_FIELDS = ("regular_hours", "overtime_hours", "gross_cents", "adjustments_cents", "tax_cents", "net_cents")
+_HOURS = ("regular_hours", "overtime_hours")
+ROLLUP_COLUMNS = ["employee_id", "full_name", "period", "months", "regular_hours", "overtime_hours", "gross", "adjustments", "tax", "net"]
+
+# Rebuild a year from payroll_runs (latest row per employee-month) plus closed-month
+# delta lines, with the YTD columns as a running window sum. Params: (year, year, year).
+_REBUILD_SQL = f"""
+INSERT INTO payroll_month_totals (employee_id, year, month, {', '.join(_FIELDS)}, {', '.join('ytd_' + f for f in _FIELDS)})
+SELECT employee_id, year, month, {', '.join(_FIELDS)},
+       {', '.join(f"{'ROUND(' if f in _HOURS else ''}SUM({f}) OVER (PARTITION BY employee_id ORDER BY month){', 2)' if f in _HOURS else ''}" for f in _FIELDS)}
+FROM (
+    SELECT k.employee_id, k.year, k.month,
+           ROUND(COALESCE(r.regular_hours, 0) + COALESCE(d.regular_hours, 0), 2) AS regular_hours,
+           ROUND(COALESCE(r.overtime_hours, 0) + COALESCE(d.overtime_hours, 0), 2) AS overtime_hours,
+           COALESCE(r.gross_cents, CAST(ROUND(r.gross_pay * 100) AS INTEGER), 0) + COALESCE(d.gross_cents, 0) AS gross_cents,
+           COALESCE(r.adjustments_cents, CAST(ROUND(r.total_adjustments * 100) AS INTEGER), 0) + COALESCE(d.adjustments_cents, 0) AS adjustments_cents,
+           COALESCE(r.tax_cents, CAST(ROUND((r.gross_pay + r.total_adjustments - r.net_pay) * 100) AS INTEGER), 0) + COALESCE(d.tax_cents, 0) AS tax_cents,
+           COALESCE(r.net_cents, CAST(ROUND(r.net_pay * 100) AS INTEGER), 0) + COALESCE(d.net_cents, 0) AS net_cents
+    -- employees with delta lines but no run (hired after the month was closed) count too
+    FROM (SELECT employee_id, year, month FROM payroll_runs WHERE year = ?
+          UNION SELECT employee_id, year, month FROM payroll_deltas WHERE year = ?) k
+    LEFT JOIN payroll_runs r
+           ON r.employee_id = k.employee_id AND r.year = k.year AND r.month = k.month
+          AND r.id = (SELECT MAX(id) FROM payroll_runs x WHERE x.employee_id = k.employee_id AND x.year = k.year AND x.month = k.month)
+    LEFT JOIN (SELECT employee_id, year, month, SUM(regular_hours) AS regular_hours, SUM(overtime_hours) AS overtime_hours,
+                      SUM(gross_cents) AS gross_cents, SUM(adjustments_cents) AS adjustments_cents,
+                      SUM(tax_cents) AS tax_cents, SUM(net_cents) AS net_cents
+               FROM payroll_deltas WHERE year = ? GROUP BY employee_id, year, month) d
+           ON d.employee_id = k.employee_id AND d.year = k.year AND d.month = k.month
+)
+"""
+
+# Any employee-month of the year with a payroll_runs row but no rollup row (payroll written
+# before rollups existed, e.g. an upgrade mid-year). {ids} narrows it to some employees.
+_GAP_SQL = """
+SELECT 1 FROM payroll_runs r
+WHERE r.year = ? AND r.month <> ? {ids}
+  AND NOT EXISTS (SELECT 1 FROM payroll_month_totals t WHERE t.employee_id = r.employee_id AND t.year = r.year AND t.month = r.month)
+LIMIT 1
+"""
+
+
+def _chunks(ids: list, size: int = 500) -> Iterator[list]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+class PayrollRollups:
+    """
+    Per-employee month totals with year-to-date running sums in payroll_month_totals.
+    Every payroll write (generate, persist, incremental sign-out, close, re-run) calls
+    apply() inside its own transaction, which touches only the employees whose month
+    changed: their month row, plus a constant shift of the YTD sums of their later
+    months. YTD, quarterly and annual reports are then a single indexed query each,
+    with no payroll recompute.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    # --- maintenance ---
+    def apply(self, conn, year: int, month: int, rows: Iterable[dict]) -> int:
+        """Record the month's effective totals for the given payroll rows. Returns how many employees changed."""
+        new = {r["employee_id"]: tuple(r[f] for f in _FIELDS) for r in rows}
+        if not new:
+            return 0
+        # the YTD carried into this month is only right if the earlier months have rows too
+        if any(self._has_gaps(conn, year, chunk, skip_month=month) for chunk in _chunks(list(new))):
+            self._rebuild(conn, year)
+        old, carried = {}, {}
+        ytd_cols = ", ".join("ytd_" + f for f in _FIELDS)
+        for chunk in _chunks(list(new)):
+            marks = ",".join("?" * len(chunk))
+            for r in conn.execute(f"SELECT employee_id, {', '.join(_FIELDS)} FROM payroll_month_totals WHERE year = ? AND month = ? AND employee_id IN ({marks})",
+                                  (year, month, *chunk)):
+                old[r[0]] = tuple(r[1:])
+            # YTD carried in from each employee's latest earlier month of the year
+            for r in conn.execute(f"""SELECT t.employee_id, {ytd_cols} FROM payroll_month_totals t
+                                      WHERE t.year = ? AND t.employee_id IN ({marks})
+                                        AND t.month = (SELECT MAX(p.month) FROM payroll_month_totals p
+                                                       WHERE p.employee_id = t.employee_id AND p.year = t.year AND p.month < ?)""",
+                                  (year, *chunk, month)):
+                carried[r[0]] = tuple(r[1:])
+        zero = (0,) * len(_FIELDS)
+        upserts, shifts = [], []
+        for eid, values in new.items():
+            before = old.get(eid)
+            if before is not None and tuple(before) == values:
+                continue
+            prior = carried.get(eid, zero)
+            ytd = tuple(round(p + v, 2) if f in _HOURS else p + v for f, p, v in zip(_FIELDS, prior, values))
+            upserts.append((eid, year, month, *values, *ytd))
+            delta = tuple(v - b for v, b in zip(values, before or zero))
+            shifts.append((*delta, eid, year, month))
+        if upserts:
+            updates = ", ".join(f"{c} = excluded.{c}" for c in (*_FIELDS, *("ytd_" + f for f in _FIELDS)))
+            conn.executemany(f"""INSERT INTO payroll_month_totals (employee_id, year, month, {', '.join(_FIELDS)}, {ytd_cols})
+                                 VALUES ({', '.join('?' * (3 + 2 * len(_FIELDS)))})
+                                 ON CONFLICT(employee_id, year, month) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP""", upserts)
+            sets = ", ".join(f"ytd_{f} = ROUND(ytd_{f} + ?, 2)" if f in _HOURS else f"ytd_{f} = ytd_{f} + ?" for f in _FIELDS)
+            conn.executemany(f"UPDATE payroll_month_totals SET {sets} WHERE employee_id = ? AND year = ? AND month > ?", shifts)
+        return len(upserts)
+
+    @staticmethod
+    def _has_gaps(conn, year: int, employee_ids: Optional[list] = None, skip_month: int = 0) -> bool:
+        """True if some payroll_runs month of the year (other than skip_month) has no rollup row."""
+        ids = f"AND r.employee_id IN ({','.join('?' * len(employee_ids))})" if employee_ids else ""
+        return conn.execute(_GAP_SQL.format(ids=ids), (year, skip_month, *(employee_ids or ()))).fetchone() is not None
+
+    @staticmethod
+    def _rebuild(conn, year: int) -> int:
+        conn.execute("DELETE FROM payroll_month_totals WHERE year = ?", (year,))
+        return conn.execute(_REBUILD_SQL, (year, year, year)).rowcount
+
+    def rebuild(self, year: int) -> int:
+        """Recreate a year's rollups from payroll_runs and payroll_deltas (for data written before rollups existed)."""
+        with self.db.transaction(immediate=True) as conn:
+            return self._rebuild(conn, year)
+
+    def _ensure_year(self, year: int) -> None:
+        # plain read first; the write lock is only taken when something is missing
+        if self.db.fetchone(_GAP_SQL.format(ids=""), (year, 0)) is not None:
+            self.rebuild(year)
+
+    # --- reports ---
+    @staticmethod
+    def _report_row(r, period: str) -> dict:
+        return {"employee_id": r["employee_id"], "full_name": r["full_name"], "period": period, "months": r["months"],
+                "regular_hours": round(r["regular_hours"], 2), "overtime_hours": round(r["overtime_hours"], 2),
+                **{f: cents_to_float(r[f]) for f in ("gross", "adjustments", "tax", "net")}}
+
+    def iter_ytd(self, year: int, month: int = 12) -> Iterator[dict]:
+        """Year-to-date totals through `month`, read from each employee's latest rollup row."""
+        self._ensure_year(year)
+        sql = """SELECT t.employee_id, COALESCE(e.full_name, 'Employee ' || t.employee_id) AS full_name,
+                        (SELECT COUNT(*) FROM payroll_month_totals c WHERE c.employee_id = t.employee_id AND c.year = t.year AND c.month <= ?) AS months,
+                        t.ytd_regular_hours AS regular_hours, t.ytd_overtime_hours AS overtime_hours, t.ytd_gross_cents AS gross,
+                        t.ytd_adjustments_cents AS adjustments, t.ytd_tax_cents AS tax, t.ytd_net_cents AS net
+                 FROM payroll_month_totals t LEFT JOIN employees e ON e.id = t.employee_id
+                 WHERE t.year = ? AND t.month = (SELECT MAX(p.month) FROM payroll_month_totals p
+                                                 WHERE p.employee_id = t.employee_id AND p.year = t.year AND p.month <= ?)
+                 ORDER BY t.employee_id"""
+        period = f"{year:04d} YTD to {month:02d}"
+        for r in self.db.iterate(sql, (month, year, month)):
+            yield self._report_row(r, period)
+
+    def iter_range(self, year: int, first_month: int, last_month: int, period: Optional[str] = None) -> Iterator[dict]:
+        """Per-employee totals for months first_month..last_month of `year` in one grouped query."""
+        if not (1 <= first_month <= last_month <= 12):
+            raise ValueError("Months must be 1-12 with first_month <= last_month")
+        self._ensure_year(year)
+        sql = """SELECT t.employee_id, COALESCE(e.full_name, 'Employee ' || t.employee_id) AS full_name, COUNT(*) AS months,
+                        SUM(t.regular_hours) AS regular_hours, SUM(t.overtime_hours) AS overtime_hours, SUM(t.gross_cents) AS gross,
+                        SUM(t.adjustments_cents) AS adjustments, SUM(t.tax_cents) AS tax, SUM(t.net_cents) AS net
+                 FROM payroll_month_totals t LEFT JOIN employees e ON e.id = t.employee_id
+                 WHERE t.year = ? AND t.month BETWEEN ? AND ?
+                 GROUP BY t.employee_id ORDER BY t.employee_id"""
+        period = period or f"{year:04d}-{first_month:02d} to {year:04d}-{last_month:02d}"
+        for r in self.db.iterate(sql, (year, first_month, last_month)):
+            yield self._report_row(r, period)
+
+    def iter_quarter(self, year: int, quarter: int) -> Iterator[dict]:
+        if not (1 <= quarter <= 4):
+            raise ValueError("Quarter must be 1-4")
+        return self.iter_range(year, 3 * quarter - 2, 3 * quarter, period=f"{year:04d} Q{quarter}")
+
+    def iter_annual(self, year: int) -> Iterator[dict]:
+        return self.iter_range(year, 1, 12, period=f"{year:04d}")
+
+    def export(self, kind: str, year: int, part: Optional[int] = None, out_path: Optional[str | Path] = None, fmt: str = "csv") -> tuple:
+        """
+        Stream a 'ytd' (part = month), 'quarter' (part = quarter) or 'annual' report to
+        CSV or PDF. Returns (path, row count).
+        """
+        fmt = fmt.lower()
+        if kind == "ytd":
+            part = part or 12
+            if not (1 <= part <= 12):
+                raise ValueError("Month must be 1-12")
+            rows, name, title = self.iter_ytd(year, part), f"payroll_ytd_{year}_{part:02d}", f"Payroll year to date {year}-{part:02d}"
+        elif kind == "quarter":
+            if part is None:
+                raise ValueError("Quarter required")
+            rows, name, title = self.iter_quarter(year, part), f"payroll_{year}_q{part}", f"Payroll {year} Q{part}"
+        elif kind == "annual":
+            rows, name, title = self.iter_annual(year), f"payroll_{year}", f"Payroll {year}"
+        else:
+            raise ValueError(f"Unknown report: {kind}")
+        out_path = out_path or f"{name}.{fmt}"
+        if fmt == "pdf":
+            return str(out_path), PDFView.export_stream(rows, out_path, ROLLUP_COLUMNS, title=title)
+        if fmt == "csv":
+            return str(out_path), CSVView.export_stream(rows, out_path, ROLLUP_COLUMNS)
+        raise ValueError(f"Unsupported format: {fmt}")
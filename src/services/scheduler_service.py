@@ -0,0 +1,370 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    from ..models.database import Database, PROJECT_ROOT
+    from ..models.rate_history import RateHistoryModel
+    from .payroll_service import PayrollService
+    from .backup_service import BackupService
+    from .maintenance_service import DatabaseMaintenance
+    from .tracing import span, record_error
+except Exception:
+    from src.models.database import Database, PROJECT_ROOT  # type: ignore
+    from src.models.rate_history import RateHistoryModel  # type: ignore
+    from src.services.payroll_service import PayrollService  # type: ignore
+    from src.services.backup_service import BackupService  # type: ignore
+    from src.services.maintenance_service import DatabaseMaintenance  # type: ignore
+    from src.services.tracing import span, record_error  # type: ignore
+
+SCHEDULER_CONFIG_PATH = PROJECT_ROOT / "config" / "scheduler.json"
+# how far ahead next_after() looks for a matching day before giving up on an expression
+_CRON_HORIZON_DAYS = 366 * 5
+
+
+def _ts(dt: datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week) with
+    *, lists, ranges and /steps. Day of week is 0-6 from Sunday (7 is Sunday too).
+    As in cron, when both day fields are restricted a day matching either one runs.
+    """
+
+    _FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, dows = (self._parse(p, lo, hi) for p, (lo, hi) in zip(parts, self._FIELDS))
+        self.dows = {d % 7 for d in dows}
+        self._any_dom, self._any_dow = parts[2] == "*", parts[4] == "*"
+
+    @staticmethod
+    def _parse(text: str, lo: int, hi: int) -> set:
+        out = set()
+        for item in text.split(","):
+            rng, _, step = item.partition("/")
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                start, end = (int(x) for x in rng.split("-", 1))
+            else:
+                start = end = int(rng)
+                if step:
+                    end = hi
+            step_n = int(step) if step else 1
+            if not (lo <= start <= end <= hi) or step_n < 1:
+                raise ValueError(f"Cron field out of range: {item!r}")
+            out.update(range(start, end + 1, step_n))
+        return out
+
+    def _day_matches(self, d: datetime) -> bool:
+        if d.month not in self.months:
+            return False
+        dom, dow = d.day in self.days, (d.weekday() + 1) % 7 in self.dows
+        if self._any_dom or self._any_dow:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute strictly after `after`."""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = t.replace(hour=0, minute=0)
+        for _ in range(_CRON_HORIZON_DAYS):
+            if self._day_matches(day):
+                for h in sorted(self.hours):
+                    for m in sorted(self.minutes):
+                        candidate = day.replace(hour=h, minute=m)
+                        if candidate >= t:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
+
+
+@dataclass
+class JobSpec:
+    """
+    One configured job. kind names a registered handler, params are passed to it.
+    A failed run is retried every retry_minutes up to max_retries times, then the
+    job moves on to its next cron slot.
+    """
+    name: str
+    kind: str
+    cron: str
+    params: dict = field(default_factory=dict)
+    max_retries: int = 3
+    retry_minutes: float = 10.0
+    enabled: bool = True
+
+
+@dataclass
+class SchedulerPolicy:
+    """
+    poll_seconds: how often start() looks for due jobs.
+    workers: jobs run on a pool of this many threads.
+    lease_minutes: how long a claimed job stays locked to one instance; a crashed
+        instance's claim expires after this, so keep it above the longest job.
+    export_dir: output folder for export jobs, relative to the database file's folder.
+    """
+    poll_seconds: float = 30.0
+    workers: int = 2
+    lease_minutes: float = 120.0
+    export_dir: str = "exports"
+    jobs: List[JobSpec] = field(default_factory=list)
+
+    @classmethod
+    def from_config(cls, path=SCHEDULER_CONFIG_PATH) -> "SchedulerPolicy":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f).get("scheduler", {})
+        except FileNotFoundError:
+            return cls()
+        policy = cls(**{k: spec[k] for k in cls.__dataclass_fields__ if k in spec and k != "jobs"})
+        policy.jobs = [JobSpec(**{k: j[k] for k in JobSpec.__dataclass_fields__ if k in j}) for j in spec.get("jobs", [])]
+        for job in policy.jobs:
+            CronSchedule(job.cron)
+        return policy
+
+
+def _period(params: dict, slot: datetime) -> tuple:
+    """(year, month) a month-end job works on: 'previous' (default) or 'current' relative to its slot."""
+    if params.get("year") and params.get("month") not in (None, "previous", "current"):
+        return int(params["year"]), int(params["month"])
+    if params.get("month", "previous") == "current":
+        return slot.year, slot.month
+    return (slot.year - 1, 12) if slot.month == 1 else (slot.year, slot.month - 1)
+
+
+class JobScheduler:
+    """
+    In-process cron for month-end payroll, exports and database upkeep. Job state lives
+    in scheduled_jobs, so schedules survive restarts and several processes (CLI
+    terminals, the API server) can run a scheduler against one database: a due job is
+    claimed with a conditional UPDATE under BEGIN IMMEDIATE, which sets a lease only
+    one instance can win. Runs go to a worker pool and each attempt is logged in
+    job_runs with its duration. A missed slot (process down) runs once on the next
+    poll, then the job continues from its next future slot.
+    """
+
+    def __init__(self, db: Database, payroll_service=None, backup_service=None, policy: Optional[SchedulerPolicy] = None,
+                 instance_id: Optional[str] = None, maintenance: Optional[DatabaseMaintenance] = None):
+        self.db = db
+        self.payroll_service = payroll_service or PayrollService(db)
+        self.backup_service = backup_service or BackupService(db)
+        self.maintenance = maintenance or DatabaseMaintenance(db)
+        self.policy = policy or SchedulerPolicy.from_config()
+        self.instance_id = instance_id or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.export_dir = Path(db.db_path).parent / self.policy.export_dir
+        self.handlers: Dict[str, Callable[[dict, datetime], object]] = {
+            "payroll_month": self._payroll_month,
+            "payroll_csv": self._payroll_csv,
+            "payslips": self._payslips,
+            "backup": self._backup,
+            "db_maintenance": self._db_maintenance,
+            "db_reclaim": self._db_reclaim,
+            "rate_sync": self._rate_sync,
+            "period_rerun": self._period_rerun,
+        }
+        self._specs = {j.name: j for j in self.policy.jobs if j.enabled}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: Callable[[dict, datetime], object]) -> None:
+        """Add a job kind; handler(params, slot) returns a JSON-serialisable result."""
+        self.handlers[kind] = handler
+
+    # --- job kinds ---
+    def _payroll_month(self, params: dict, slot: datetime) -> dict:
+        year, month = _period(params, slot)
+        return {"period": f"{year:04d}-{month:02d}", "rows": len(self.payroll_service.generate_payroll_for_month(year, month))}
+
+    def _payroll_csv(self, params: dict, slot: datetime) -> dict:
+        year, month = _period(params, slot)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        return {"path": self.payroll_service.export_monthly_csv(year, month, str(self.export_dir / f"payroll_{year}_{month:02d}.csv"))}
+
+    def _payslips(self, params: dict, slot: datetime) -> dict:
+        year, month = _period(params, slot)
+        out_dir = self.export_dir / f"payslips_{year}_{month:02d}"
+        return {"dir": str(out_dir), "files": len(self.payroll_service.export_payslips(year, month, out_dir, fmt=params.get("fmt", "pdf")))}
+
+    def _backup(self, params: dict, slot: datetime) -> dict:
+        entry = self.backup_service.backup_full() if params.get("full") else self.backup_service.snapshot()
+        return {"id": entry["id"]}
+
+    def _db_maintenance(self, params: dict, slot: datetime) -> dict:
+        report = self.maintenance.run(vacuum=params.get("vacuum", True), full_check=params.get("full_check", False))
+        if not report["check"]["ok"]:
+            raise RuntimeError(f"Integrity check failed: {'; '.join(report['check']['messages'][:3])}")
+        return report
+
+    def _db_reclaim(self, params: dict, slot: datetime) -> dict:
+        return self.maintenance.reclaim(params.get("max_pages"))
+
+    def _period_rerun(self, params: dict, slot: datetime) -> dict:
+        return {"deltas": self.payroll_service.periods.rerun_pending()}
+
+    def _rate_sync(self, params: dict, slot: datetime) -> dict:
+        # today's date, not the slot's: a missed slot run late must not roll rates back
+        return {"updated": RateHistoryModel(self.db).sync_current()}
+
+    # --- state ---
+    def sync(self, now: Optional[datetime] = None) -> None:
+        """Create or update scheduled_jobs rows for the configured jobs; a changed cron restarts that job's schedule."""
+        now = now or datetime.now()
+        with self.db.transaction(immediate=True) as conn:
+            known = {r["name"]: r for r in conn.execute("SELECT name, kind, cron FROM scheduled_jobs")}
+            for job in self._specs.values():
+                cur = known.get(job.name)
+                if cur is not None and cur["cron"] == job.cron and cur["kind"] == job.kind:
+                    continue
+                slot = _ts(CronSchedule(job.cron).next_after(now))
+                conn.execute("""INSERT INTO scheduled_jobs (name, kind, cron, slot, due_at) VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT(name) DO UPDATE SET kind = excluded.kind, cron = excluded.cron,
+                                    slot = excluded.slot, due_at = excluded.due_at, attempt = 0""",
+                             (job.name, job.kind, job.cron, slot, slot))
+
+    def claim_due(self, now: Optional[datetime] = None) -> List[dict]:
+        """Lease every due, unlocked job to this instance; returns what was claimed."""
+        now = now or datetime.now()
+        until = _ts(now + timedelta(minutes=self.policy.lease_minutes))
+        claimed = []
+        with self.db.transaction(immediate=True) as conn:
+            rows = conn.execute("""SELECT name, slot, attempt FROM scheduled_jobs
+                                   WHERE due_at <= ? AND (locked_until IS NULL OR locked_until < ?)""",
+                                (_ts(now), _ts(now))).fetchall()
+            for r in rows:
+                if r["name"] not in self._specs:
+                    continue
+                cur = conn.execute("""UPDATE scheduled_jobs SET locked_by = ?, locked_until = ?
+                                      WHERE name = ? AND due_at <= ? AND (locked_until IS NULL OR locked_until < ?)""",
+                                   (self.instance_id, until, r["name"], _ts(now), _ts(now)))
+                if cur.rowcount:
+                    claimed.append({"name": r["name"], "slot": r["slot"], "attempt": r["attempt"]})
+        return claimed
+
+    def run_claimed(self, claim: dict) -> dict:
+        """Run one claimed job, log the attempt and schedule what comes next. Returns the job_runs entry."""
+        spec = self._specs[claim["name"]]
+        slot = datetime.fromisoformat(claim["slot"])
+        started = datetime.now()
+        run_id = self.db.execute("INSERT INTO job_runs (job, slot, attempt, instance, started_at) VALUES (?, ?, ?, ?, ?)",
+                                 (spec.name, claim["slot"], claim["attempt"], self.instance_id, _ts(started))).lastrowid
+        t0 = time.perf_counter()
+        status, error, result = "succeeded", None, None
+        try:
+            handler = self.handlers.get(spec.kind)
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {spec.kind}")
+            with span(f"scheduler.{spec.name}", kind=spec.kind, slot=claim["slot"], attempt=claim["attempt"]):
+                result = handler(spec.params, slot)
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        duration_ms = (time.perf_counter() - t0) * 1000.0
+        finished = datetime.now()
+
+        if status == "failed" and claim["attempt"] < spec.max_retries:
+            slot_next, due, attempt = claim["slot"], _ts(finished + timedelta(minutes=spec.retry_minutes)), claim["attempt"] + 1
+        else:
+            # next future slot; missed slots in between are not replayed
+            nxt = _ts(CronSchedule(spec.cron).next_after(max(finished, slot)))
+            slot_next, due, attempt = nxt, nxt, 0
+        with self.db.transaction(immediate=True) as conn:
+            conn.execute("UPDATE job_runs SET finished_at = ?, duration_ms = ?, status = ?, error = ?, result = ? WHERE id = ?",
+                         (_ts(finished), round(duration_ms, 3), status, error, json.dumps(result, default=str), run_id))
+            conn.execute("""UPDATE scheduled_jobs SET slot = ?, due_at = ?, attempt = ?, locked_by = NULL, locked_until = NULL,
+                                last_status = ?, last_run_at = ? WHERE name = ? AND locked_by = ?""",
+                         (slot_next, due, attempt, status, _ts(finished), spec.name, self.instance_id))
+        return {"id": run_id, "job": spec.name, "slot": claim["slot"], "attempt": claim["attempt"], "status": status,
+                "duration_ms": round(duration_ms, 3), "error": error, "result": result}
+
+    def tick(self, now: Optional[datetime] = None, wait: bool = False) -> list:
+        """Claim due jobs and hand them to the worker pool. wait=True blocks and returns their run entries."""
+        claims = self.claim_due(now)
+        if not claims:
+            return []
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.policy.workers, thread_name_prefix="scheduler")
+            futures = [self._executor.submit(self.run_claimed, c) for c in claims]
+        return [f.result() for f in futures] if wait else []
+
+    def run_now(self, name: str) -> dict:
+        """Run a configured job immediately for the current slot, if no instance holds it."""
+        if name not in self._specs:
+            raise ValueError(f"Unknown job: {name}")
+        self.sync()
+        now = datetime.now()
+        with self.db.transaction(immediate=True) as conn:
+            cur = conn.execute("""UPDATE scheduled_jobs SET locked_by = ?, locked_until = ?
+                                  WHERE name = ? AND (locked_until IS NULL OR locked_until < ?)""",
+                               (self.instance_id, _ts(now + timedelta(minutes=self.policy.lease_minutes)), name, _ts(now)))
+            if not cur.rowcount:
+                raise ValueError(f"Job {name} is already running")
+            row = conn.execute("SELECT attempt FROM scheduled_jobs WHERE name = ?", (name,)).fetchone()
+        return self.run_claimed({"name": name, "slot": _ts(now.replace(second=0, microsecond=0)), "attempt": row["attempt"]})
+
+    # --- reporting ---
+    def jobs(self) -> list:
+        return self.db.query("SELECT name, kind, cron, due_at, attempt, locked_by, last_status, last_run_at FROM scheduled_jobs ORDER BY due_at, name")
+
+    def history(self, job: Optional[str] = None, limit: int = 50) -> list:
+        if job:
+            return self.db.query("SELECT * FROM job_runs WHERE job = ? ORDER BY id DESC LIMIT ?", (job, int(limit)))
+        return self.db.query("SELECT * FROM job_runs ORDER BY id DESC LIMIT ?", (int(limit),))
+
+    def duration_stats(self) -> list:
+        """Per job: runs, failures, and mean/max duration of successful runs in ms."""
+        return self.db.query("""SELECT job, COUNT(*) AS runs, SUM(status = 'failed') AS failures,
+                                       ROUND(AVG(CASE WHEN status = 'succeeded' THEN duration_ms END), 1) AS avg_ms,
+                                       ROUND(MAX(CASE WHEN status = 'succeeded' THEN duration_ms END), 1) AS max_ms,
+                                       MAX(started_at) AS last_started
+                                FROM job_runs GROUP BY job ORDER BY job""")
+
+    # --- periodic runs ---
+    def start(self, poll_seconds: Optional[float] = None) -> None:
+        """Sync the job table, then poll for due jobs every poll_seconds on a daemon timer until stop()."""
+        interval = float(poll_seconds if poll_seconds is not None else self.policy.poll_seconds)
+        if interval <= 0 or not self._specs:
+            return
+        self.sync()
+
+        def tick():
+            try:
+                self.tick()
+            except Exception as e:
+                record_error("scheduler.poll", e)
+                print(f"Job scheduler poll failed: {e}")
+            with self._lock:
+                if self._timer is not None:
+                    self._timer = threading.Timer(interval, tick)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        with self._lock:
+            self._timer = threading.Timer(0, tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self, wait: bool = False) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
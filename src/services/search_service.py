@@ -0,0 +1,184 @@
+from __future__ import annotations
+from typing import Optional, List, Dict, Set
+import re
+import threading
+
+try:
+    from ..models.database import Database
+except Exception:
+    from src.models.database import Database  # type: ignore
+
+SEARCH_FIELDS = ("full_name", "role", "department", "contact")
+# bm25 column weights, same order as SEARCH_FIELDS: a name hit outranks a department hit
+FIELD_WEIGHTS = (10.0, 3.0, 2.0, 1.0)
+_RESULT_COLUMNS = "e.id, e.full_name, e.role, e.department, e.contact, e.rate, e.active"
+_TOKEN_RE = re.compile(r"[0-9a-z@.+]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Optional[Set[tuple]] = None  # only token-end nodes carry ids
+
+
+class PrefixTrie:
+    """Token prefix index: every token of an employee's fields maps back to (employee id, field)."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self._tokens: Dict[int, List[tuple]] = {}
+
+    def add(self, employee_id: int, fields: Dict[str, Optional[str]]) -> None:
+        if employee_id in self._tokens:
+            self.remove(employee_id)
+        entries = []
+        for fi, name in enumerate(SEARCH_FIELDS):
+            for tok in tokenize(fields.get(name)):
+                node = self.root
+                for ch in tok:
+                    nxt = node.children.get(ch)
+                    if nxt is None:
+                        nxt = node.children[ch] = _TrieNode()
+                    node = nxt
+                if node.ids is None:
+                    node.ids = set()
+                node.ids.add((employee_id, fi))
+                entries.append((tok, fi))
+        self._tokens[employee_id] = entries
+
+    def remove(self, employee_id: int) -> None:
+        for tok, fi in self._tokens.pop(employee_id, []):
+            node = self.root
+            for ch in tok:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+            else:
+                if node.ids:
+                    node.ids.discard((employee_id, fi))
+
+    def lookup(self, prefix: str) -> Dict[int, float]:
+        """employee_id -> best score for tokens starting with prefix (exact token scores double)."""
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return {}
+        scores: Dict[int, float] = {}
+        stack = [(node, True)]
+        while stack:
+            n, exact = stack.pop()
+            for eid, fi in n.ids or ():
+                s = FIELD_WEIGHTS[fi] * (2.0 if exact else 1.0)
+                if s > scores.get(eid, 0.0):
+                    scores[eid] = s
+            stack.extend((c, False) for c in n.children.values())
+        return scores
+
+
+class EmployeeSearch:
+    """
+    Directory search over full_name, role, department and contact.
+
+    Uses the trigram FTS5 table (employees_fts, maintained by triggers) when SQLite has
+    FTS5: terms of 3+ characters match anywhere in a field, ranked by bm25, and when
+    nothing matches every term the query is retried as an OR of its trigrams so a typo
+    still finds the closest names. Without FTS5 an in-memory prefix trie is built on
+    first use and kept current through refresh()/remove().
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.use_fts = db.fetchone("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'") is not None
+        self._trie: Optional[PrefixTrie] = None
+        self._lock = threading.Lock()
+
+    # --- sync hooks (the FTS table is kept current by triggers) ---
+    def refresh(self, employee_id: int) -> None:
+        if self._trie is None:
+            return
+        row = self.db.fetchone(f"SELECT {', '.join(SEARCH_FIELDS)} FROM employees WHERE id = ?", (employee_id,))
+        with self._lock:
+            if row is None:
+                self._trie.remove(employee_id)
+            else:
+                self._trie.add(employee_id, {k: row[k] for k in SEARCH_FIELDS})
+
+    def remove(self, employee_id: int) -> None:
+        if self._trie is not None:
+            with self._lock:
+                self._trie.remove(employee_id)
+
+    # --- queries ---
+    def search(self, query: str, limit: int = 20, include_inactive: bool = False) -> List:
+        """Best `limit` matching employees, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if self.use_fts:
+            return self._search_fts(terms, limit, include_inactive)
+        return self._search_trie(terms, limit, include_inactive)
+
+    def _search_fts(self, terms: List[str], limit: int, include_inactive: bool) -> List:
+        long_terms = [t for t in terms if len(t) >= 3]
+        short_terms = [t for t in terms if len(t) < 3]
+        active = "" if include_inactive else "AND e.active = 1"
+        # trigram matching needs 3+ characters; shorter terms are prefix filters on the hits
+        short_sql = "".join(
+            " AND (" + " OR ".join(f"lower(e.{f}) LIKE ?" for f in SEARCH_FIELDS) + ")" for _ in short_terms)
+        short_params = tuple(p for t in short_terms for p in [f"{t}%"] * len(SEARCH_FIELDS))
+        if not long_terms:
+            return self.db.query(f"SELECT {_RESULT_COLUMNS} FROM employees e WHERE 1 = 1 {active} {short_sql} ORDER BY e.full_name LIMIT ?",
+                                 (*short_params, int(limit)))
+        weights = ", ".join(str(w) for w in FIELD_WEIGHTS)
+        sql = f"""SELECT {_RESULT_COLUMNS} FROM employees_fts f JOIN employees e ON e.id = f.rowid
+                  WHERE employees_fts MATCH ? {active} {short_sql}
+                  ORDER BY bm25(employees_fts, {weights}), e.id LIMIT ?"""
+        rows = self.db.query(sql, (" AND ".join(self._quote(t) for t in long_terms), *short_params, int(limit)))
+        if rows:
+            return rows
+        # fuzzy retry: rank by how many of the query's trigrams each row shares
+        grams = sorted({t[i:i + 3] for t in long_terms for i in range(len(t) - 2)})
+        return self.db.query(sql, (" OR ".join(self._quote(g) for g in grams), *short_params, int(limit)))
+
+    @staticmethod
+    def _quote(term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
+
+    def _ensure_trie(self) -> PrefixTrie:
+        with self._lock:
+            if self._trie is None:
+                trie = PrefixTrie()
+                for r in self.db.iterate(f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM employees"):
+                    trie.add(r["id"], {k: r[k] for k in SEARCH_FIELDS})
+                self._trie = trie
+            return self._trie
+
+    def _search_trie(self, terms: List[str], limit: int, include_inactive: bool) -> List:
+        trie = self._ensure_trie()
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for t in terms:
+                hits = trie.lookup(t)
+                # every term has to match something
+                scores = hits if scores is None else {eid: s + hits[eid] for eid, s in scores.items() if eid in hits}
+                if not scores:
+                    return []
+        ids = [eid for eid, _ in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))]
+        active = "" if include_inactive else "AND e.active = 1"
+        out = []
+        # resolve in chunks until `limit` rows pass the active filter
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = {r["id"]: r for r in self.db.query(
+                f"SELECT {_RESULT_COLUMNS} FROM employees e WHERE e.id IN ({','.join('?' * len(chunk))}) {active}", tuple(chunk))}
+            out.extend(rows[eid] for eid in chunk if eid in rows)
+            if len(out) >= limit:
+                break
+        return out[:limit]
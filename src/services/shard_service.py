@@ -0,0 +1,69 @@
+from __future__ import annotations
+from heapq import merge
+from pathlib import Path
+from typing import Optional, Iterator, List, Dict
+import threading
+
+try:
+    from ..models.shards import ShardRouter
+    from .payroll_service import PayrollService, TaxPolicy
+    from .client_report_service import ClientReportService
+except Exception:
+    from src.models.shards import ShardRouter  # type: ignore
+    from src.services.payroll_service import PayrollService, TaxPolicy  # type: ignore
+    from src.services.client_report_service import ClientReportService  # type: ignore
+
+
+class ShardedPayrollService:
+    """
+    Payroll across every shard. Per-employee calls go to the owning shard; month-wide
+    runs execute on all shards in parallel and are merged by employee id.
+    """
+
+    def __init__(self, router: ShardRouter, tax_policy: Optional[TaxPolicy] = None, overtime_multiplier: float = 1.5):
+        self.router = router
+        self.tax_policy = tax_policy or TaxPolicy.from_config()
+        self.overtime_multiplier = overtime_multiplier
+        self._services: Dict[str, PayrollService] = {}
+        self._lock = threading.Lock()
+
+    def service(self, shard_name: Optional[str] = None) -> PayrollService:
+        name = shard_name or self.router.shard_map.default
+        with self._lock:
+            svc = self._services.get(name)
+            if svc is None:
+                svc = PayrollService(self.router.db(name), tax_policy=self.tax_policy, overtime_multiplier=self.overtime_multiplier)
+                self._services[name] = svc
+            return svc
+
+    def for_employee(self, employee_id: int) -> PayrollService:
+        return self.service(self.router.shard_map.for_employee(employee_id).name)
+
+    def compute_for_employee(self, employee_id: int, year: int, month: int) -> dict:
+        return self.for_employee(employee_id).compute_for_employee(employee_id, year, month)
+
+    def generate_payroll_for_month(self, year: int, month: int) -> List[dict]:
+        per_shard = self.router.fan_out(lambda shard, db: self.service(shard.name).generate_payroll_for_month(year, month))
+        return list(merge(*per_shard.values(), key=lambda r: r["employee_id"]))
+
+
+class ShardedClientReports:
+    """Client statements across shards; a client's rows live on the shard its site maps to."""
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+
+    def _reports(self, db) -> ClientReportService:
+        return ClientReportService(db)
+
+    def iter_client_hours(self, start_date: str, end_date: str) -> Iterator[dict]:
+        """All clients' hours, queried on every shard in parallel and merged in client/employee/day order."""
+        per_shard = self.router.fan_out(lambda shard, db: list(self._reports(db).iter_client_hours(start_date, end_date)))
+        yield from merge(*per_shard.values(), key=lambda r: (r["client_id"], r["employee_id"], r["day"]))
+
+    def export_client_statement(self, client_id: int, start_date: str, end_date: str, out_path: Optional[str] = None, fmt: str = "csv") -> str:
+        return self._reports(self.router.db_for_client(client_id)).export_client_statement(client_id, start_date, end_date, out_path=out_path, fmt=fmt)
+
+    def export_all_statements(self, start_date: str, end_date: str, out_dir: str | Path = ".", fmt: str = "csv") -> List[str]:
+        per_shard = self.router.fan_out(lambda shard, db: self._reports(db).export_all_statements(start_date, end_date, out_dir=out_dir, fmt=fmt))
+        return sorted(p for paths in per_shard.values() for p in paths)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+def parse_ts(ts: str) -> Optional[datetime]:
+    """Parse an attendance timestamp (ISO, or 'YYYY-MM-DD HH:MM:SS'); None if unparsable."""
+    try:
+        return datetime.fromisoformat(ts)
+    except Exception:
+        try:
+            return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None
+
+
+def pair_shifts(events: Iterable[Tuple[str, datetime]]) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    Streaming version of the payroll pairing loop: a sign_in opens a shift, the next
+    sign_out closes it. Extra sign_ins while a shift is open and stray sign_outs are
+    skipped; shifts whose sign_out is not after the sign_in are dropped.
+    """
+    open_in = None
+    for ev, dt in events:
+        if ev == "sign_in":
+            if open_in is None:
+                open_in = dt
+        elif ev == "sign_out" and open_in is not None:
+            if dt > open_in:
+                yield open_in, dt
+            open_in = None
+
+
+def hours_by_day(events: Iterable[Tuple[str, datetime]]) -> dict:
+    """date_str -> hours, attributing each shift to its sign-in day."""
+    day_hours = defaultdict(float)
+    for dt_in, dt_out in pair_shifts(events):
+        day_hours[dt_in.date().isoformat()] += (dt_out - dt_in).total_seconds() / 3600.0
+    return dict(day_hours)
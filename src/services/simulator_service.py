@@ -0,0 +1,233 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import Optional, List, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python path gives the same cents, only slower
+    np = None
+
+try:
+    from .money import to_decimal, rate_units, div_half_up, cents_to_float, RATE_SCALE, US_PER_HOUR
+except Exception:
+    from src.services.money import to_decimal, rate_units, div_half_up, cents_to_float, RATE_SCALE, US_PER_HOUR  # type: ignore
+
+_REGULAR_US = 8 * US_PER_HOUR
+# rate_units * worked_us -> cents
+_CENT_DEN = RATE_SCALE * US_PER_HOUR // 100
+# keep int64 products clear of overflow; bigger inputs use the Python path
+_INT64_SAFE = 2 ** 62
+# no employee works more than a month's microseconds at any one rate
+_MAX_MONTH_US = 32 * 24 * US_PER_HOUR
+
+
+def _ratio(value) -> Fraction:
+    return Fraction(to_decimal(value))
+
+
+@dataclass
+class Scenario:
+    """
+    One set of payroll parameters. None/defaults keep the current values.
+    rate_factor and rate_delta apply to every day's rate (rate * factor + delta);
+    rates pins chosen employees to one rate for the whole month.
+    """
+    name: str
+    overtime_multiplier: Optional[float] = None
+    tax_rate: Optional[float] = None  # flat rate instead of the configured bracket table
+    rate_factor: float = 1.0
+    rate_delta: float = 0.0
+    rates: dict = field(default_factory=dict)
+
+
+@dataclass
+class PayrollSnapshot:
+    """
+    A month's payroll inputs in compact parallel arrays. Days an employee worked at
+    the same rate collapse into one group; the regular/overtime split is per day and
+    does not depend on any scenario parameter, so it is done once at load time.
+    """
+    year: int
+    month: int
+    employee_ids: list
+    tax_codes: list
+    adjustments: list   # cents, per employee
+    group_emp: list     # employee index per group
+    group_rate: list    # rate units per group
+    group_regular: list  # regular microseconds per group
+    group_overtime: list  # overtime microseconds per group
+
+    def __len__(self) -> int:
+        return len(self.employee_ids)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    employee_ids: list
+    gross: list  # cents, per employee
+    adjustments: list
+    tax: list
+    net: list
+
+    def totals(self) -> dict:
+        return {k: cents_to_float(sum(getattr(self, k))) for k in ("gross", "adjustments", "tax", "net")}
+
+    def diff(self, base: "ScenarioResult", limit: Optional[int] = None) -> List[dict]:
+        """Employees whose pay changes against `base`, largest net change first."""
+        out = [{"employee_id": eid, "gross": cents_to_float(g - bg), "tax": cents_to_float(t - bt), "net": cents_to_float(n - bn)}
+               for eid, g, t, n, bg, bt, bn in zip(self.employee_ids, self.gross, self.tax, self.net, base.gross, base.tax, base.net)
+               if g != bg or t != bt or n != bn]
+        out.sort(key=lambda d: (-abs(d["net"]), d["employee_id"]))
+        return out[:limit] if limit is not None else out
+
+    def summary(self, base: Optional["ScenarioResult"] = None) -> dict:
+        row = {"scenario": self.name, **self.totals()}
+        if base is not None:
+            bt = base.totals()
+            row.update({f"{k}_change": round(row[k] - bt[k], 2) for k in ("gross", "tax", "net")})
+            row["employees_changed"] = len(self.diff(base))
+        return row
+
+
+class PayrollSimulator:
+    """
+    What-if payroll: load() reads a month once (the same streaming pass as
+    PayrollService.compute_month) and run() evaluates any number of scenarios on that
+    snapshot without touching the database. With NumPy each scenario is a handful of
+    int64 array operations; the arithmetic stays exact, so the unchanged scenario
+    reproduces compute_month to the cent. Nothing is written to payroll_runs.
+    """
+
+    def __init__(self, payroll_service, use_numpy: Optional[bool] = None):
+        self.payroll_service = payroll_service
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+
+    # --- snapshot ---
+    def load(self, year: int, month: int) -> PayrollSnapshot:
+        ps = self.payroll_service
+        emps = {e["id"]: e for e in ps.employees.active()}
+        rate_index = ps.load_rate_index()
+        worked = ps._month_worked(year, month, emps)
+        adjustments = ps.adjustments.totals_for_month(year, month)
+        group_emp, group_rate, group_regular, group_overtime = [], [], [], []
+        for i, (eid, emp) in enumerate(emps.items()):
+            has_history = rate_index.has(eid)
+            groups = {}
+            for day, us in worked.get(eid, {}).items():
+                units = ps._rate_units(rate_index.rate_on(eid, day) if has_history else float(emp["rate"]))
+                reg = min(_REGULAR_US, us)
+                g = groups.setdefault(units, [0, 0])
+                g[0] += reg
+                g[1] += us - reg
+            for units, (reg, ot) in groups.items():
+                group_emp.append(i)
+                group_rate.append(units)
+                group_regular.append(reg)
+                group_overtime.append(ot)
+        return PayrollSnapshot(
+            year=year, month=month,
+            employee_ids=list(emps), tax_codes=[e["tax_code"] for e in emps.values()],
+            adjustments=[adjustments.get(eid, 0) for eid in emps],
+            group_emp=group_emp, group_rate=group_rate, group_regular=group_regular, group_overtime=group_overtime,
+        )
+
+    # --- scenarios ---
+    def run(self, snapshot: PayrollSnapshot, scenarios: Iterable[Scenario], include_baseline: bool = True) -> List[ScenarioResult]:
+        """Evaluate scenarios on the snapshot; the current parameters come first as "current" unless disabled."""
+        scenarios = list(scenarios)
+        if include_baseline:
+            scenarios.insert(0, Scenario("current"))
+        return [self.evaluate(snapshot, s) for s in scenarios]
+
+    def compare(self, year: int, month: int, scenarios: Iterable[Scenario]) -> List[dict]:
+        """Load the month and return one summary row per scenario, changes against the current parameters."""
+        results = self.run(self.load(year, month), scenarios)
+        return [r.summary(results[0]) for r in results]
+
+    def evaluate(self, snapshot: PayrollSnapshot, scenario: Scenario) -> ScenarioResult:
+        mult = _ratio(scenario.overtime_multiplier if scenario.overtime_multiplier is not None else self.payroll_service.overtime_multiplier)
+        rates = self._scenario_rates(snapshot, scenario)
+        if self.use_numpy and self._fits_int64(snapshot, rates, mult):
+            gross = self._gross_numpy(snapshot, rates, mult)
+            taxable = gross + np.asarray(snapshot.adjustments, dtype=np.int64)
+            tax = self._tax_numpy(snapshot, taxable, scenario)
+            return ScenarioResult(scenario.name, snapshot.employee_ids, gross.tolist(), list(snapshot.adjustments), tax.tolist(), (taxable - tax).tolist())
+        gross = self._gross_python(snapshot, rates, mult)
+        taxable = [g + a for g, a in zip(gross, snapshot.adjustments)]
+        tax = self._tax_python(snapshot, taxable, scenario)
+        return ScenarioResult(scenario.name, snapshot.employee_ids, gross, list(snapshot.adjustments), tax, [t - x for t, x in zip(taxable, tax)])
+
+    def _scenario_rates(self, snapshot: PayrollSnapshot, scenario: Scenario) -> list:
+        """Rate units per group after the scenario's factor, delta and per-employee overrides."""
+        factor, delta = _ratio(scenario.rate_factor), rate_units(scenario.rate_delta)
+        pinned = {snapshot.employee_ids.index(eid): rate_units(r) for eid, r in scenario.rates.items() if eid in snapshot.employee_ids}
+        if factor == 1 and delta == 0 and not pinned:
+            return snapshot.group_rate
+        fn, fd = factor.numerator, factor.denominator
+        rates = [pinned[e] if e in pinned else div_half_up(u * fn, fd) + delta
+                 for e, u in zip(snapshot.group_emp, snapshot.group_rate)]
+        if rates and min(rates) < 0:
+            raise ValueError(f"Scenario {scenario.name!r} makes an hourly rate negative")
+        return rates
+
+    # --- pure Python (exact, any magnitude) ---
+    def _gross_python(self, snapshot: PayrollSnapshot, rates: list, mult: Fraction) -> list:
+        md, mn = mult.denominator, mult.numerator
+        num = [0] * len(snapshot.employee_ids)
+        for e, u, reg, ot in zip(snapshot.group_emp, rates, snapshot.group_regular, snapshot.group_overtime):
+            num[e] += u * (reg * md + ot * mn)
+        return [div_half_up(n, _CENT_DEN * md) for n in num]
+
+    def _tax_python(self, snapshot: PayrollSnapshot, taxable: list, scenario: Scenario) -> list:
+        if scenario.tax_rate is not None:
+            rate = _ratio(scenario.tax_rate)
+            return [max(div_half_up(a * rate.numerator, rate.denominator), 0) for a in taxable]
+        return self.payroll_service.tax_policy.tax_bulk_cents(taxable, snapshot.tax_codes, snapshot.year, snapshot.month)
+
+    # --- NumPy (int64, exact within _INT64_SAFE) ---
+    def _fits_int64(self, snapshot: PayrollSnapshot, rates: list, mult: Fraction) -> bool:
+        top_rate = max(rates, default=0)
+        return top_rate * _MAX_MONTH_US < _INT64_SAFE and mult.denominator * _CENT_DEN * 4 < _INT64_SAFE and 0 <= mult.numerator < 10 ** 6
+
+    def _gross_numpy(self, snapshot: PayrollSnapshot, rates: list, mult: Fraction):
+        n = len(snapshot.employee_ids)
+        emp = np.asarray(snapshot.group_emp, dtype=np.int64)
+        units = np.asarray(rates, dtype=np.int64)
+        regular_num = np.zeros(n, dtype=np.int64)
+        overtime_num = np.zeros(n, dtype=np.int64)
+        np.add.at(regular_num, emp, units * np.asarray(snapshot.group_regular, dtype=np.int64))
+        np.add.at(overtime_num, emp, units * np.asarray(snapshot.group_overtime, dtype=np.int64))
+        # cents = (R + O * mn / md) / D, split into whole cents and a remainder so no
+        # intermediate leaves int64, then rounded half up like money.div_half_up
+        md, mn = mult.denominator, mult.numerator
+        qr, rr = np.divmod(regular_num, _CENT_DEN)
+        qo, ro = np.divmod(overtime_num, _CENT_DEN)
+        q2, r2 = np.divmod(qo * mn, md)
+        frac = rr * md + r2 * _CENT_DEN + ro * mn
+        den = md * _CENT_DEN
+        return qr + q2 + (2 * frac + den) // (2 * den)
+
+    def _tax_numpy(self, snapshot: PayrollSnapshot, taxable, scenario: Scenario):
+        tax_policy = self.payroll_service.tax_policy
+        if scenario.tax_rate is not None or tax_policy.schedule is None:
+            rate = _ratio(scenario.tax_rate if scenario.tax_rate is not None else tax_policy.rate)
+            return (2 * np.maximum(taxable, 0) * rate.numerator + rate.denominator) // (2 * rate.denominator)
+        table = tax_policy.schedule.table_for(snapshot.year, snapshot.month)
+        tax = np.zeros(len(taxable), dtype=np.int64)
+        thresholds = np.asarray(table.threshold_cents, dtype=np.int64)
+        rate_num = np.asarray(table.rate_num, dtype=np.int64)
+        base_num = np.asarray(table._base_num, dtype=np.int64)
+        resolved = [table.resolve_code(c) for c in snapshot.tax_codes]
+        for code in {tc.code for tc in resolved}:
+            tc = table.codes[code]
+            if tc.exempt:
+                continue
+            mask = np.fromiter((r.code == code for r in resolved), dtype=bool, count=len(resolved))
+            amount = taxable[mask] - tc.allowance_cents
+            i = np.maximum(np.searchsorted(thresholds, amount, side="right") - 1, 0)
+            owed = (2 * (base_num[i] + (amount - thresholds[i]) * rate_num[i]) + table.rate_den) // (2 * table.rate_den)
+            tax[mask] = np.where(amount > 0, owed, 0)
+        return tax
+
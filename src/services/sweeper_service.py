@@ -0,0 +1,214 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, List, Iterable
+import json
+import sqlite3
+import threading
+
+try:
+    from ..models.database import Database, PROJECT_ROOT
+    from .tracing import traced, record_error
+except Exception:
+    from src.models.database import Database, PROJECT_ROOT  # type: ignore
+    from src.services.tracing import traced, record_error  # type: ignore
+
+ATTENDANCE_POLICY_PATH = PROJECT_ROOT / "config" / "attendance_policy.json"
+MISSING_SIGN_OUT = "missing_sign_out"
+
+# Shifts are the same segments the payroll loop pairs: a sign_out closes everything since
+# the previous sign_out, and the earliest sign_in in the segment starts the shift. A shift
+# is suspect when it is still open after max_shift_hours, or when the employee signed in
+# again on a later day and only then signed out, so the shift ran longer than that. A long
+# shift with no later sign_in is a real (if long) shift and is left alone.
+# The lookback rows are read first through idx_attendance_ts (a range seek) and windowed
+# afterwards; unmaterialized, the planner prefers scanning idx_attendance_employee_ts to
+# save the window sort, which reads the whole table. MATERIALIZED needs SQLite 3.35.
+_MATERIALIZED = "MATERIALIZED" if sqlite3.sqlite_version_info >= (3, 35, 0) else ""
+_SUSPECT_SHIFTS_SQL = f"""
+WITH recent AS {_MATERIALIZED} (
+    SELECT id, employee_id, event, timestamp FROM attendance
+    WHERE timestamp >= ? AND event IN ('sign_in', 'sign_out')
+),
+ev AS (
+    SELECT id, employee_id, event, timestamp,
+           COALESCE(SUM(CASE WHEN event = 'sign_out' THEN 1 ELSE 0 END) OVER (
+               PARTITION BY employee_id ORDER BY timestamp, id
+               ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS seg
+    FROM recent
+),
+ins AS (
+    SELECT employee_id, seg, id, timestamp,
+           ROW_NUMBER() OVER (PARTITION BY employee_id, seg ORDER BY timestamp, id) AS rn,
+           FIRST_VALUE(timestamp) OVER (PARTITION BY employee_id, seg ORDER BY timestamp, id) AS first_ts
+    FROM ev WHERE event = 'sign_in'
+),
+starts AS (
+    SELECT employee_id, seg,
+           MIN(CASE WHEN rn = 1 THEN id END) AS sign_in_id,
+           MIN(first_ts) AS ts_in,
+           MIN(CASE WHEN substr(timestamp, 1, 10) > substr(first_ts, 1, 10) THEN timestamp END) AS next_day_in
+    FROM ins GROUP BY employee_id, seg
+),
+outs AS (
+    SELECT employee_id, seg, MIN(timestamp) AS ts_out FROM ev WHERE event = 'sign_out' GROUP BY employee_id, seg
+)
+SELECT s.employee_id, s.sign_in_id, s.ts_in, o.ts_out, s.next_day_in
+FROM starts s
+LEFT JOIN outs o ON o.employee_id = s.employee_id AND o.seg = s.seg
+WHERE (o.ts_out IS NULL AND s.ts_in < ?)
+   OR (o.ts_out IS NOT NULL AND s.next_day_in IS NOT NULL
+       AND (julianday(o.ts_out) - julianday(s.ts_in)) * 24.0 > ?)
+ORDER BY s.employee_id, s.ts_in
+"""
+
+
+@dataclass
+class SweepPolicy:
+    """
+    max_shift_hours: an open shift older than this (or one closed only after a sign_in on a
+        later day and longer than this) is suspect.
+    default_shift_hours: where an auto-close puts the sign_out, counted from the sign_in.
+    action: "flag" queues suspects for HR, "auto_close" also inserts the sign_out for
+        shifts that have none (shifts that were signed out are always left to HR).
+    """
+    max_shift_hours: float = 16.0
+    default_shift_hours: float = 8.0
+    action: str = "flag"
+    lookback_days: int = 45
+    sweep_interval_minutes: float = 15.0
+
+    @classmethod
+    def from_config(cls, path=ATTENDANCE_POLICY_PATH) -> "SweepPolicy":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f).get("missing_sign_out", {})
+        except FileNotFoundError:
+            return cls()
+        policy = cls(**{k: spec[k] for k in cls.__dataclass_fields__ if k in spec})
+        if policy.action not in ("flag", "auto_close"):
+            raise ValueError(f"Unknown missing sign-out action: {policy.action}")
+        return policy
+
+
+class MissingSignOutSweeper:
+    """
+    Finds shifts with a missing sign_out in one windowed query over the lookback range
+    and records each once in attendance_exceptions. Depending on the policy it leaves
+    them for HR or closes them right away with an HR-corrected sign_out. HR can close or
+    dismiss queued exceptions in bulk.
+    """
+
+    def __init__(self, db: Database, policy: Optional[SweepPolicy] = None, audit_log=None):
+        self.db = db
+        self.policy = policy or SweepPolicy.from_config()
+        self.audit_log = audit_log
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def _close_at(self, ts_in: str, next_day_in: Optional[str], now: datetime) -> str:
+        close = datetime.fromisoformat(ts_in) + timedelta(hours=self.policy.default_shift_hours)
+        if next_day_in:
+            # never run into the next day's sign_in
+            close = min(close, datetime.fromisoformat(next_day_in) - timedelta(minutes=1))
+        return min(close, now).isoformat(timespec="seconds")
+
+    def find_suspect_shifts(self, now: Optional[datetime] = None) -> List[dict]:
+        now = now or datetime.now()
+        since = (now - timedelta(days=self.policy.lookback_days)).isoformat()
+        cutoff = (now - timedelta(hours=self.policy.max_shift_hours)).isoformat()
+        rows = self.db.query(_SUSPECT_SHIFTS_SQL, (since, cutoff, float(self.policy.max_shift_hours)))
+        return [{"employee_id": r["employee_id"], "attendance_id": r["sign_in_id"], "opened_at": r["ts_in"],
+                 "signed_out_at": r["ts_out"], "proposed_close_at": self._close_at(r["ts_in"], r["next_day_in"], now)}
+                for r in rows]
+
+    @traced("sweeper.sweep")
+    def sweep(self, now: Optional[datetime] = None) -> dict:
+        """One pass: queue new suspects and, under auto_close, close them. Returns counts."""
+        suspects = self.find_suspect_shifts(now)
+        with self.db.transaction(immediate=True) as conn:
+            new_ids, open_ids = [], []
+            for s in suspects:
+                detail = json.dumps({"signed_out_at": s["signed_out_at"]}) if s["signed_out_at"] else None
+                cur = conn.execute("""INSERT OR IGNORE INTO attendance_exceptions
+                                      (kind, employee_id, attendance_id, opened_at, proposed_close_at, detail)
+                                      VALUES (?, ?, ?, ?, ?, ?)""",
+                                   (MISSING_SIGN_OUT, s["employee_id"], s["attendance_id"], s["opened_at"], s["proposed_close_at"], detail))
+                if cur.rowcount:
+                    new_ids.append(cur.lastrowid)
+                    if s["signed_out_at"] is None:
+                        open_ids.append(cur.lastrowid)
+        closed = 0
+        # a shift that already has a sign_out is only queued: inserting one more would
+        # turn the real sign_out into a stray row, so HR decides where the shift ended
+        if open_ids and self.policy.action == "auto_close":
+            closed = self.resolve(open_ids, "close", actor="sweeper")
+        return {"suspects": len(suspects), "queued": len(new_ids), "auto_closed": closed}
+
+    def queue(self, status: str = "open") -> list:
+        return self.db.query("""SELECT x.id, x.employee_id, e.full_name, x.opened_at, x.proposed_close_at, x.detail, x.status, x.detected_at
+                                FROM attendance_exceptions x LEFT JOIN employees e ON e.id = x.employee_id
+                                WHERE x.kind = ? AND x.status = ? ORDER BY x.opened_at, x.id""",
+                             (MISSING_SIGN_OUT, status))
+
+    @traced("sweeper.resolve")
+    def resolve(self, exception_ids: Iterable[int], action: str = "close", actor: Optional[str] = None) -> int:
+        """
+        Bulk-resolve open exceptions. "close" inserts the proposed sign_out (corrected_by_hr=1),
+        "dismiss" leaves attendance untouched. Returns how many exceptions were resolved.
+        """
+        if action not in ("close", "dismiss"):
+            raise ValueError("action must be 'close' or 'dismiss'")
+        ids = [int(i) for i in exception_ids]
+        if not ids:
+            return 0
+        now = datetime.now().isoformat()
+        inserted = []
+        with self.db.transaction(immediate=True) as conn:
+            rows = conn.execute(f"""SELECT id, employee_id, proposed_close_at FROM attendance_exceptions
+                                    WHERE status = 'open' AND kind = ? AND id IN ({','.join('?' * len(ids))})""",
+                                (MISSING_SIGN_OUT, *ids)).fetchall()
+            for r in rows:
+                resolution_id = None
+                if action == "close":
+                    note = f"auto-closed: missing sign-out (exception #{r['id']})"
+                    resolution_id = conn.execute("INSERT INTO attendance (employee_id, event, timestamp, corrected_by_hr, note) VALUES (?, 'sign_out', ?, 1, ?)",
+                                                 (r["employee_id"], r["proposed_close_at"], note)).lastrowid
+                    inserted.append((resolution_id, r["employee_id"], r["proposed_close_at"], note))
+                conn.execute("UPDATE attendance_exceptions SET status = ?, resolution_id = ?, resolved_by = ?, resolved_at = ? WHERE id = ?",
+                             ("closed" if action == "close" else "dismissed", resolution_id, actor, now, r["id"]))
+        if self.audit_log is not None:
+            for attendance_id, employee_id, ts, note in inserted:
+                self.audit_log.record("correction", attendance_id, employee_id,
+                                      {"event": "sign_out", "timestamp": ts, "corrected_by_hr": 1, "note": note}, actor=actor)
+        return len(rows)
+
+    # --- periodic runs ---
+    def start(self, interval_minutes: Optional[float] = None) -> None:
+        """Sweep now and then every interval_minutes on a daemon timer until stop()."""
+        interval = float(interval_minutes if interval_minutes is not None else self.policy.sweep_interval_minutes)
+        if interval <= 0:
+            return
+
+        def tick():
+            try:
+                self.sweep()
+            except Exception as e:
+                record_error("sweeper.sweep", e)
+                print(f"Missing sign-out sweep failed: {e}")
+            with self._lock:
+                if self._timer is not None:
+                    self._timer = threading.Timer(interval * 60, tick)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        with self._lock:
+            self._timer = threading.Timer(0, tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
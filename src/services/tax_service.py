@@ -0,0 +1,141 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from bisect import bisect_right
+from pathlib import Path
+from typing import Optional, Iterable, List
+import json
+
+try:
+    from ..models.database import PROJECT_ROOT
+    from .money import to_decimal, to_cents, cents_to_float, div_half_up
+except Exception:
+    from src.models.database import PROJECT_ROOT  # type: ignore
+    from src.services.money import to_decimal, to_cents, cents_to_float, div_half_up  # type: ignore
+
+# Versioned bracket tables live next to the project, outside the DB
+TAX_CONFIG_PATH = PROJECT_ROOT / "config" / "tax_tables.json"
+
+
+@dataclass
+class TaxCode:
+    code: str
+    allowance: float = 0.0
+    exempt: bool = False
+
+    def __post_init__(self):
+        self.allowance_cents = to_cents(self.allowance)
+
+
+@dataclass
+class TaxTable:
+    """
+    One compiled bracket table, held in integers: thresholds in cents and rates over a
+    common power of ten, together with the cumulative tax owed at each threshold, so a
+    lookup is a single bisect plus one multiply and one rounding.
+    """
+    version: str
+    effective_from: str
+    threshold_cents: List[int]
+    rate_num: List[int]
+    rate_den: int
+    codes: dict = field(default_factory=dict)
+    default_code: str = "STD"
+
+    def __post_init__(self):
+        # cumulative tax at each threshold, in cents * rate_den
+        base = [0]
+        for i in range(1, len(self.threshold_cents)):
+            base.append(base[-1] + (self.threshold_cents[i] - self.threshold_cents[i - 1]) * self.rate_num[i - 1])
+        self._base_num = base
+
+    @classmethod
+    def compile(cls, spec: dict) -> "TaxTable":
+        # amounts and rates are read as exact decimals (strings stay exact, floats go through repr)
+        brackets = sorted(((to_decimal(b["from"]), to_decimal(b["rate"])) for b in spec.get("brackets", [])), key=lambda b: b[0])
+        if not brackets or brackets[0][0] != 0:
+            raise ValueError(f"Tax table {spec.get('version')} must have a bracket starting at 0")
+        places = max([0] + [-rate.as_tuple().exponent for _, rate in brackets])
+        codes = {}
+        for name, c in (spec.get("codes") or {}).items():
+            codes[name.upper()] = TaxCode(code=name.upper(), allowance=float(c.get("allowance", 0.0)), exempt=bool(c.get("exempt", False)))
+        default_code = str(spec.get("default_code", "STD")).upper()
+        codes.setdefault(default_code, TaxCode(code=default_code))
+        return cls(
+            version=str(spec.get("version", spec["effective_from"])),
+            effective_from=str(spec["effective_from"]),
+            threshold_cents=[to_cents(start) for start, _ in brackets],
+            rate_num=[int(rate.scaleb(places)) for _, rate in brackets],
+            rate_den=10 ** places,
+            codes=codes,
+            default_code=default_code,
+        )
+
+    def resolve_code(self, code: Optional[str]) -> TaxCode:
+        """The employee's tax code; no code means default_code, an unknown one is an error."""
+        if not code:
+            return self.codes[self.default_code]
+        found = self.codes.get(code.upper())
+        if found is None:
+            raise ValueError(f"Unknown tax code {code!r} in tax table {self.version} (known: {', '.join(sorted(self.codes))})")
+        return found
+
+    def tax_cents(self, amount_cents: int, code: Optional[str] = None) -> int:
+        """Tax in cents on a monthly taxable amount in cents, rounded once (half up)."""
+        tc = self.resolve_code(code)
+        if tc.exempt:
+            return 0
+        taxable = amount_cents - tc.allowance_cents
+        if taxable <= 0:
+            return 0
+        i = bisect_right(self.threshold_cents, taxable) - 1
+        return div_half_up(self._base_num[i] + (taxable - self.threshold_cents[i]) * self.rate_num[i], self.rate_den)
+
+    def tax_for(self, amount: float, code: Optional[str] = None) -> float:
+        """Tax owed on a monthly taxable amount for the given employee tax code."""
+        return cents_to_float(self.tax_cents(to_cents(amount), code))
+
+
+class TaxSchedule:
+    """All bracket tables from the config, ordered by effective date."""
+
+    def __init__(self, tables: Iterable[TaxTable], config_version: int = 1):
+        self.tables = sorted(tables, key=lambda t: t.effective_from)
+        if not self.tables:
+            raise ValueError("Tax schedule requires at least one table")
+        self._starts = [t.effective_from for t in self.tables]
+        self.config_version = config_version
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaxSchedule":
+        return cls((TaxTable.compile(spec) for spec in data.get("tables", [])), int(data.get("schema_version", 1)))
+
+    @classmethod
+    def load(cls, path: Path | str = TAX_CONFIG_PATH) -> "TaxSchedule":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def table_for(self, year: int, month: int) -> TaxTable:
+        """Return the table in force on the first day of the given month."""
+        key = f"{year:04d}-{month:02d}-01"
+        i = bisect_right(self._starts, key) - 1
+        if i < 0:
+            raise ValueError(f"No tax table in effect for {year:04d}-{month:02d}")
+        return self.tables[i]
+
+    def tax_for(self, amount: float, year: int, month: int, code: Optional[str] = None) -> float:
+        return self.table_for(year, month).tax_for(amount, code)
+
+    def check_code(self, code: Optional[str]) -> None:
+        """Raise ValueError unless every table knows `code`, so payroll for any month can resolve it."""
+        for table in self.tables:
+            table.resolve_code(code)
+
+    def tax_bulk(self, amounts: Iterable[float], codes: Iterable[Optional[str]], year: int, month: int) -> List[float]:
+        """Compute tax for a whole month of rows, resolving the effective table once."""
+        table = self.table_for(year, month)
+        return [table.tax_for(a, c) for a, c in zip(amounts, codes)]
+
+    def tax_bulk_cents(self, amounts: Iterable[int], codes: Iterable[Optional[str]], year: int, month: int) -> List[int]:
+        """tax_bulk on integer cents."""
+        table = self.table_for(year, month)
+        return [table.tax_cents(a, c) for a, c in zip(amounts, codes)]
@@ -0,0 +1,396 @@
+from __future__ import annotations
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, Callable
+import atexit
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+# Prometheus histogram bucket bounds for span durations, in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+METRICS_ENV = "QUICKHIRE_METRICS"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("quickhire_span", default=None)
+_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is off: entering and leaving it costs two method calls."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage. Spans opened inside it (same thread) become its children."""
+    __slots__ = ("tracer", "name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration_ms", "status", "error", "_t0", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer, self.name, self.attrs = tracer, name, attrs
+        self.status, self.error, self.duration_ms = "ok", None, 0.0
+
+    def __enter__(self):
+        parent = _current.get()
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000.0
+        _current.reset(self._token)
+        if exc is not None:
+            self.status, self.error = "error", f"{exc_type.__name__}: {exc}"
+        try:
+            self.tracer._finish(self)
+        except Exception as e:
+            # metrics must never fail (or replace the exception of) the code being measured
+            self.tracer._sink_failed(e)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only once the stage has run (row counts, paths...)."""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {"type": "span", "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start": round(self.start, 6), "duration_ms": round(self.duration_ms, 3), "status": self.status,
+                "error": self.error, "attrs": self.attrs, "thread": threading.current_thread().name}
+
+
+class MemorySink:
+    """Keeps the last `max_spans` spans in memory, for tests and the CLI breakdown."""
+
+    def __init__(self, max_spans: int = 100000):
+        self.spans = deque(maxlen=max_spans)
+        self.events = deque(maxlen=max_spans)
+
+    def emit(self, record: dict) -> None:
+        (self.spans if record["type"] == "span" else self.events).append(record)
+
+    def flush(self, tracer: "Tracer") -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def breakdown(self, trace_id: Optional[int] = None) -> list:
+        """Per span name: calls, errors, total/avg/max ms and self time (total minus direct children), slowest first."""
+        spans = [s for s in self.spans if trace_id is None or s["trace_id"] == trace_id]
+        child_ms = defaultdict(float)
+        for s in spans:
+            if s["parent_id"] is not None:
+                child_ms[s["parent_id"]] += s["duration_ms"]
+        rows = {}
+        for s in spans:
+            r = rows.setdefault(s["name"], {"name": s["name"], "calls": 0, "errors": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0})
+            r["calls"] += 1
+            r["errors"] += s["status"] == "error"
+            r["total_ms"] += s["duration_ms"]
+            r["self_ms"] += s["duration_ms"] - child_ms.get(s["span_id"], 0.0)
+            r["max_ms"] = max(r["max_ms"], s["duration_ms"])
+        for r in rows.values():
+            r["avg_ms"] = round(r["total_ms"] / r["calls"], 3)
+            r["total_ms"], r["self_ms"], r["max_ms"] = round(r["total_ms"], 3), round(r["self_ms"], 3), round(r["max_ms"], 3)
+        return sorted(rows.values(), key=lambda r: -r["total_ms"])
+
+    def tree(self, trace_id: int) -> list:
+        """The spans of one trace as indented lines, children in start order (repeated siblings folded)."""
+        spans = [s for s in self.spans if s["trace_id"] == trace_id]
+        children = defaultdict(list)
+        for s in sorted(spans, key=lambda s: s["start"]):
+            children[s["parent_id"]].append(s)
+        lines = []
+
+        def walk(parent_id, depth):
+            groups = {}
+            for s in children.get(parent_id, []):
+                g = groups.setdefault(s["name"], [0, 0.0, s])
+                g[0] += 1
+                g[1] += s["duration_ms"]
+            for name, (n, total, first) in groups.items():
+                label = f"{name} x{n}" if n > 1 else name
+                lines.append(f"{'  ' * depth}{label}: {total:.1f} ms" + (" [error]" if first["status"] == "error" else ""))
+                if n == 1:
+                    walk(first["span_id"], depth + 1)
+
+        walk(None, 0)
+        return lines
+
+
+class JsonLinesSink:
+    """Appends one JSON object per finished span (and per recorded error) to a file."""
+
+    def __init__(self, path: str | Path, flush_every: int = 200):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.flush_every = flush_every
+
+    def emit(self, record: dict) -> None:
+        line = json.dumps(record, default=str, separators=(",", ":"))
+        with self._lock:
+            self._f.write(line + "\n")
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._f.flush()
+                self._pending = 0
+
+    def flush(self, tracer: "Tracer") -> None:
+        with self._lock:
+            counters = tracer.snapshot()["counters"]
+            if counters:
+                self._f.write(json.dumps({"type": "counters", "at": round(time.time(), 3), "values": counters}) + "\n")
+            self._f.flush()
+            self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+class PrometheusTextfileSink:
+    """
+    Rewrites a Prometheus textfile (node_exporter textfile collector format) with the
+    span duration histograms and counters, at most every `interval_seconds` and on
+    flush(). The file is replaced atomically so a scrape never sees half of it; spans
+    finish on any thread, so one write runs at a time and each process writes its own
+    temporary file.
+    """
+
+    def __init__(self, path: str | Path, interval_seconds: float = 15.0, prefix: str = "quickhire"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval = interval_seconds
+        self.prefix = prefix
+        self._tracer = None
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict) -> None:
+        if time.monotonic() - self._last < self.interval:
+            return
+        # whoever gets the lock writes; threads finishing spans meanwhile do not wait for it
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._last >= self.interval:
+                self._write(self._tracer or tracer)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _label(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"')
+
+    def flush(self, tracer: "Tracer") -> None:
+        with self._lock:
+            self._write(tracer)
+
+    def _write(self, tracer: "Tracer") -> None:
+        self._tracer, self._last = tracer, time.monotonic()
+        snap = tracer.snapshot()
+        p = self.prefix
+        lines = [f"# HELP {p}_span_duration_seconds Time spent in each instrumented stage.",
+                 f"# TYPE {p}_span_duration_seconds histogram"]
+        for name, t in sorted(snap["timings"].items()):
+            lbl = self._label(name)
+            for bound, n in zip(DURATION_BUCKETS, t["buckets"]):
+                lines.append(f'{p}_span_duration_seconds_bucket{{span="{lbl}",le="{bound}"}} {n}')
+            lines.append(f'{p}_span_duration_seconds_bucket{{span="{lbl}",le="+Inf"}} {t["count"]}')
+            lines.append(f'{p}_span_duration_seconds_sum{{span="{lbl}"}} {t["sum_ms"] / 1000.0:.6f}')
+            lines.append(f'{p}_span_duration_seconds_count{{span="{lbl}"}} {t["count"]}')
+        lines += [f"# HELP {p}_span_errors_total Instrumented stages that raised.", f"# TYPE {p}_span_errors_total counter"]
+        lines += [f'{p}_span_errors_total{{span="{self._label(n)}"}} {t["errors"]}' for n, t in sorted(snap["timings"].items())]
+        lines += [f"# HELP {p}_events_total Counted events.", f"# TYPE {p}_events_total counter"]
+        lines += [f'{p}_events_total{{name="{self._label(n)}"}} {v:g}' for n, v in sorted(snap["counters"].items())]
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        pass
+
+
+class Tracer:
+    """
+    Spans, counters and per-stage duration histograms, handed to a pluggable sink.
+    With no sink (the default) span() returns a shared no-op and count() returns at
+    once, so instrumented code pays a couple of attribute lookups per call.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._timings = {}
+        self.sink_errors = 0
+        self.last_sink_error: Optional[str] = None
+        self._exit_hook = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def span(self, name: str, **attrs):
+        if self.sink is None:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def count(self, name: str, value: float = 1) -> None:
+        if self.sink is None:
+            return
+        with self._lock:
+            self._counters[name] += value
+
+    def record_error(self, name: str, exc: BaseException) -> None:
+        """Count an exception that is handled (and otherwise hidden) at `name`."""
+        if self.sink is None:
+            return
+        self.count(f"{name}.errors")
+        parent = _current.get()
+        try:
+            self.sink.emit({"type": "error", "name": name, "at": round(time.time(), 6), "error": f"{type(exc).__name__}: {exc}",
+                            "trace_id": parent.trace_id if parent else None, "span_id": parent.span_id if parent else None})
+        except Exception as e:
+            self._sink_failed(e)
+
+    def _sink_failed(self, exc: BaseException) -> None:
+        """A sink raised: keep count (and the latest error) instead of disturbing the caller."""
+        with self._lock:
+            self.sink_errors += 1
+            self.last_sink_error = f"{type(exc).__name__}: {exc}"
+
+    def _finish(self, span: Span) -> None:
+        seconds = span.duration_ms / 1000.0
+        with self._lock:
+            t = self._timings.get(span.name)
+            if t is None:
+                t = self._timings[span.name] = {"count": 0, "errors": 0, "sum_ms": 0.0, "max_ms": 0.0, "buckets": [0] * len(DURATION_BUCKETS)}
+            t["count"] += 1
+            t["errors"] += span.status == "error"
+            t["sum_ms"] += span.duration_ms
+            t["max_ms"] = max(t["max_ms"], span.duration_ms)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    t["buckets"][i] += 1
+        sink = self.sink
+        if sink is not None:
+            sink.emit(span.to_dict())
+
+    def snapshot(self) -> dict:
+        """Counters and cumulative timings so far (histogram buckets are cumulative, as Prometheus expects)."""
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "timings": {n: {**t, "buckets": list(t["buckets"])} for n, t in self._timings.items()}}
+
+    def flush(self) -> None:
+        if self.sink is not None:
+            self.sink.flush(self)
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            self._sink_failed(e)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+# the process tracer. Import this module as src.services.tracing everywhere (the services
+# reach it that way through their import fallback): a copy loaded under another name would
+# have its own tracer and sink.
+tracer = Tracer()
+
+
+def span(name: str, **attrs):
+    """`with span("payroll.compute_month", year=y):` on the process tracer."""
+    if tracer.sink is None:
+        return _NOOP
+    return tracer.span(name, **attrs)
+
+
+def count(name: str, value: float = 1) -> None:
+    tracer.count(name, value)
+
+
+def record_error(name: str, exc: BaseException) -> None:
+    tracer.record_error(name, exc)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator: run the function inside a span (named after it unless given)."""
+    def deco(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if tracer.sink is None:
+                return fn(*args, **kwargs)
+            with tracer.span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def configure(sink=None) -> Tracer:
+    """Switch the process tracer to `sink` (None turns tracing off), flushing and closing the old one."""
+    old = tracer.sink
+    if old is not None:
+        try:
+            old.flush(tracer)
+            old.close()
+        except Exception as e:
+            tracer._sink_failed(e)
+    tracer.sink = sink
+    return tracer
+
+
+def configure_from_env(value: Optional[str] = None) -> Tracer:
+    """
+    Set up the sink from QUICKHIRE_METRICS: "memory", "jsonl:<path>" or
+    "prometheus:<path>". Unset or empty leaves tracing off. Flushed at exit.
+    """
+    value = (os.environ.get(METRICS_ENV, "") if value is None else value).strip()
+    if not value:
+        return tracer
+    kind, _, path = value.partition(":")
+    kind = kind.lower()
+    if kind == "memory":
+        sink = MemorySink()
+    elif kind == "jsonl" and path:
+        sink = JsonLinesSink(path)
+    elif kind in ("prometheus", "prom") and path:
+        sink = PrometheusTextfileSink(path)
+    else:
+        raise ValueError(f"Unknown {METRICS_ENV} setting: {value!r} (expected memory, jsonl:<path> or prometheus:<path>)")
+    configure(sink)
+    with tracer._lock:
+        register, tracer._exit_hook = not tracer._exit_hook, True
+    if register:
+        # one hook however often this is called; it flushes whichever sink is set at exit
+        atexit.register(tracer._flush_at_exit)
+    return tracer
@@ -1,8 +1,16 @@
 from tabulate import tabulate
-from typing import Any, Iterable
+from typing import Any, Iterable, Callable, Optional
+from itertools import chain, islice
 import shutil
 
+ATTENDANCE_COLUMNS = ["id", "employee_id", "full_name", "event", "timestamp", "corrected_by_hr", "note"]
+EMPLOYEE_COLUMNS = ["id", "full_name", "role", "department", "contact", "rate", "active"]
+
 class CLIView:
+    # rows used to size columns; later rows are printed with the same widths
+    SAMPLE_ROWS = 50
+    PAGE_SIZE = 20
+    MAX_COL_WIDTH = 40
     def display_message(self, message: str):
         """Display a general message."""
         print(f"\n{message}\n")
@@ -43,6 +51,8 @@ class CLIView:
             print("2. Manage Employees (Admin)")
             print("3. Payroll (Admin)")
             print("4. Reports (Admin)")
+            print("5. Clients & Placements (Admin)")
+            print("6. Backup & Restore (Admin)")
         print("Q. Quit")
         print("-"*50)
         return self.prompt_for_input("Choose an option: ").strip()
@@ -57,7 +67,9 @@ class CLIView:
         print("3. Add Correction (Admin)")
         print("4. View Records")
         print("5. Delete Record (Admin)")
-        print("6. Back")
+        print("6. Verify Audit Log (Admin)")
+        print("7. Missing Sign-outs (Admin)")
+        print("8. Back")
         print("-"*50)
 
     def display_employees_menu(self):
@@ -70,7 +82,8 @@ class CLIView:
         print("3. View Employee")
         print("4. Edit Employee")
         print("5. Delete Employee")
-        print("6. Back")
+        print("6. Search Employees")
+        print("7. Back")
         print("-"*50)
 
     def display_payroll_menu(self):
@@ -81,7 +94,27 @@ class CLIView:
         print("1. Generate Payroll for Month")
         print("2. View Payroll")
         print("3. Export to CSV")
-        print("4. Back")
+        print("4. Close Period")
+        print("5. Re-run Closed Period")
+        print("6. Archive Closed Months")
+        print("7. Adjustments")
+        print("8. What-if Simulation")
+        print("9. Back")
+        print("-"*50)
+
+    def display_adjustments_menu(self):
+        """Display adjustments submenu."""
+        print("\n" + "-"*50)
+        print("Adjustments Menu")
+        print("-"*50)
+        print("1. Add Adjustment")
+        print("2. Bulk Import from CSV")
+        print("3. Bulk by Department/Role/Client")
+        print("4. List Adjustments for Month")
+        print("5. New Recurring Schedule")
+        print("6. List Schedules")
+        print("7. End Schedule")
+        print("8. Back")
         print("-"*50)
 
     def display_reports_menu(self):
@@ -91,7 +124,38 @@ class CLIView:
         print("-"*50)
         print("1. Attendance Report")
         print("2. Payroll Report")
-        print("3. Back")
+        print("3. Client Hours Statement")
+        print("4. Quarterly Statements (All Clients)")
+        print("5. Attendance Anomalies")
+        print("6. Payroll Totals (YTD / Quarter / Year)")
+        print("7. Analytics Export (Parquet/Arrow)")
+        print("8. Back")
+        print("-"*50)
+
+    def display_clients_menu(self):
+        """Display clients submenu."""
+        print("\n" + "-"*50)
+        print("Clients Menu")
+        print("-"*50)
+        print("1. Add Client")
+        print("2. List Clients")
+        print("3. Place Employee")
+        print("4. End Placement")
+        print("5. View Placements")
+        print("6. Back")
+        print("-"*50)
+
+    def display_backup_menu(self):
+        """Display backup submenu."""
+        print("\n" + "-"*50)
+        print("Backup & Restore Menu")
+        print("-"*50)
+        print("1. Full Backup Now")
+        print("2. Take Snapshot")
+        print("3. List Backups")
+        print("4. Restore")
+        print("5. Database Maintenance")
+        print("6. Back")
         print("-"*50)
 
     # --- Helpers to normalize row-like objects to dict ---
@@ -129,13 +193,97 @@ class CLIView:
         except Exception:
             return ""
 
+    def _accessor(self, row) -> Callable[[Any, str], Any]:
+        """Pick the cell getter once per table from the first row instead of per cell."""
+        if isinstance(row, dict):
+            return lambda r, c: r.get(c, "")
+        if hasattr(row, "keys"):
+            present = set(row.keys())
+            return lambda r, c: r[c] if c in present else ""
+        return lambda r, c: getattr(r, c, "")
+
+    def _size_columns(self, sample: list, cols: list, get) -> dict:
+        widths = {c: len(c) for c in cols}
+        for r in sample:
+            for c in cols:
+                widths[c] = max(widths[c], len(str(get(r, c) or "")))
+        return {c: min(w, max(len(c), self.MAX_COL_WIDTH)) for c, w in widths.items()}
+
+    def _format_row(self, row, cols: list, widths: dict, get) -> str:
+        cells = []
+        for c in cols:
+            val = str(get(row, c) or "")
+            if len(val) > widths[c]:
+                val = val[:widths[c] - 1] + "…"
+            cells.append(val.ljust(widths[c]))
+        return " | ".join(cells)
+
+    def render_table(self, rows: Iterable, cols: list, widths: Optional[dict] = None, empty_message: str = "No records found") -> Optional[dict]:
+        """
+        Print rows from any iterable (list, generator, cursor) in a single pass. Column
+        widths come from the first SAMPLE_ROWS rows (or `widths`, to keep pages aligned),
+        so memory stays bounded. Returns the widths used, or None when there were no rows.
+        """
+        it = iter(rows)
+        sample = list(islice(it, self.SAMPLE_ROWS))
+        if not sample:
+            print(f"\n{empty_message}\n")
+            return None
+        get = self._accessor(sample[0])
+        widths = widths or self._size_columns(sample, cols, get)
+        print("\n" + " | ".join(c.upper().ljust(widths[c]) for c in cols))
+        print("-+-".join("-" * widths[c] for c in cols))
+        for r in chain(sample, it):
+            print(self._format_row(r, cols, widths, get))
+        print()
+        return widths
+
+    def page_through(self, fetch_page: Callable[..., list], key_of: Callable[[Any], Any], cols: list, empty_message: str = "No records found"):
+        """
+        Interactive keyset pager. fetch_page(after=key, before=key, limit=n) returns rows in
+        display order; only one page (plus one look-ahead row) is held at a time.
+        """
+        size = self.PAGE_SIZE
+        rows = fetch_page(after=None, before=None, limit=size + 1)
+        if not rows:
+            print(f"\n{empty_message}\n")
+            return
+        widths = None
+        page_no = 1
+        has_next, has_prev = len(rows) > size, False
+        rows = rows[:size]
+        while True:
+            widths = self.render_table(rows, cols, widths=widths, empty_message=empty_message) or widths
+            nav = []
+            if has_prev:
+                nav.append("[p]rev")
+            if has_next:
+                nav.append("[n]ext")
+            nav.append("[q]uit")
+            ch = self.prompt_for_input(f"Page {page_no} - {', '.join(nav)}: ").strip().lower()
+            if ch == "n" and has_next:
+                nxt = fetch_page(after=key_of(rows[-1]), before=None, limit=size + 1)
+                has_next, has_prev = len(nxt) > size, True
+                rows = nxt[:size]
+                page_no += 1
+            elif ch == "p" and has_prev:
+                prv = fetch_page(after=None, before=key_of(rows[0]), limit=size + 1)
+                # fetch_page returns display order, so the look-ahead row is the first one
+                has_prev, has_next = len(prv) > size, True
+                rows = prv[-size:]
+                page_no -= 1
+            elif ch in ("q", ""):
+                break
+            else:
+                self.display_invalid_choice_message()
+
     # --- Data display helpers ---
     def display_employee(self, row):
         """Display a single employee record in key-value format."""
         if not row:
             print("\nEmployee not found\n")
             return
-        cols = ["id", "full_name", "role", "department", "contact", "rate", "active"]
+        cols = ["id", "full_name", "role", "department", "contact", "rate", "active", "tax_code"]
         print("\n" + "="*60)
         for c in cols:
             val = self._cell(row, c)
@@ -144,55 +292,80 @@ class CLIView:
 
     def display_employees_list(self, rows):
         """Display employees in a formatted table."""
+        self.render_table(rows, EMPLOYEE_COLUMNS, empty_message="No employees found")
+
+    def display_clients_list(self, rows):
+        """Display clients in a formatted table."""
         if not rows:
-            print("\nNo employees found\n")
+            print("\nNo clients found\n")
+            return
+        print()
+        print(tabulate([[c.id, c.name, c.contact or ""] for c in rows], headers=["ID", "NAME", "CONTACT"]))
+        print()
+
+    def display_placements(self, rows):
+        """Display placements of a client in a formatted table."""
+        if not rows:
+            print("\nNo placements found\n")
             return
-        
-        cols = ["id", "full_name", "role", "department", "contact", "rate", "active"]
-        widths = {c: len(c) for c in cols}
-        
-        # Calculate column widths
-        for r in rows:
-            for c in cols:
-                val = str(self._cell(r, c) or "")
-                widths[c] = max(widths[c], len(val))
-        
-        # Print header
-        header = " | ".join(c.upper().ljust(widths[c]) for c in cols)
-        sep = "-+-".join("-" * widths[c] for c in cols)
-        print("\n" + header)
-        print(sep)
-        
-        # Print rows
-        for r in rows:
-            line = " | ".join(str(self._cell(r, c) or "").ljust(widths[c]) for c in cols)
-            print(line)
+        print()
+        print(tabulate([[p.id, p.employee_id, p.start_date, p.end_date or "open", p.site or ""] for p in rows],
+                       headers=["ID", "EMPLOYEE_ID", "START", "END", "SITE"]))
         print()
 
     def display_employees(self, rows):
         """Alias for display_employees_list for compatibility."""
         self.display_employees_list(rows)
 
+    def display_missing_sign_outs(self, rows):
+        """Display the missing sign-out exception queue."""
+        self.render_table(rows, ["id", "employee_id", "full_name", "opened_at", "proposed_close_at", "detected_at"],
+                          empty_message="No missing sign-outs")
+
+    def display_anomalies(self, rows):
+        """Display attendance anomaly findings."""
+        self.render_table(rows, ["id", "kind", "severity", "employee_id", "full_name", "timestamp", "detail"],
+                          empty_message="No anomalies found")
+
+    def display_adjustments(self, rows):
+        """Display one-off adjustments."""
+        self.render_table(rows, ["id", "employee_id", "year", "month", "amount", "kind", "note"], empty_message="No adjustments")
+
+    def display_adjustment_schedules(self, rows):
+        """Display recurring adjustment schedules."""
+        self.render_table(rows, ["id", "name", "amount", "start_month", "end_month", "kind", "employee_id", "department", "role", "client_id"],
+                          empty_message="No schedules")
+
+    def display_simulation(self, rows):
+        """Display what-if scenario totals against current pay."""
+        self.render_table(rows, ["scenario", "gross", "adjustments", "tax", "net", "gross_change", "tax_change", "net_change", "employees_changed"],
+                          empty_message="No scenarios")
+
+    def display_backups(self, rows):
+        """Display backups and snapshots, oldest first."""
+        self.render_table(rows, ["id", "kind", "chain", "created_at", "pages_written", "page_count", "size"], empty_message="No backups yet")
+
+    def display_maintenance_report(self, report):
+        """Display a maintenance pass: before/after sizes and page counts, then each step."""
+        cols = ["file_bytes", "wal_bytes", "page_count", "freelist_count", "free_ratio", "auto_vacuum"]
+        self.render_table([{"when": w, **report[w]} for w in ("before", "after")], ["when"] + cols)
+        reclaim = report.get("reclaim") or {}
+        print(f"Statistics: {report['statistics']} | reclaimed {reclaim.get('pages_freed', 0)} pages ({reclaim.get('stopped', 'skipped')})"
+              f" | saved {report['bytes_saved'] / 1e6:.2f} MB")
+        print(f"Timings (ms): {', '.join(f'{k} {v}' for k, v in report['timings_ms'].items())}")
+        if report["check"]["ok"]:
+            self.display_success("Integrity check: ok")
+        else:
+            self.display_error("Integrity check failed: " + "; ".join(report["check"]["messages"]))
+
+    def page_employees(self, fetch_page: Callable[..., list]):
+        """Page through employees keyed on id."""
+        self.page_through(fetch_page, lambda r: r["id"], EMPLOYEE_COLUMNS, empty_message="No employees found")
+
     def display_attendance_records(self, records):
         """Display attendance records with employee name."""
-        if not records:
-            print("\nNo records found\n")
-            return
-        
-        cols = ["id", "employee_id", "full_name", "event", "timestamp", "corrected_by_hr", "note"]
-        widths = {c: len(c) for c in cols}
-        
-        for r in records:
-            for c in cols:
-                val = str(self._cell(r, c) or "")
-                widths[c] = max(widths[c], len(val))
-        
-        header = " | ".join(c.upper().ljust(widths[c]) for c in cols)
-        sep = "-+-".join("-" * widths[c] for c in cols)
-        print("\n" + header)
-        print(sep)
-        
-        for r in records:
-            line = " | ".join(str(self._cell(r, c) or "").ljust(widths[c]) for c in cols)
-            print(line)
-        print()
+        self.render_table(records, ATTENDANCE_COLUMNS)
+
+    def page_attendance_records(self, fetch_page: Callable[..., list]):
+        """Page through attendance records keyed on (timestamp, id)."""
+        self.page_through(fetch_page, lambda r: (r["timestamp"], r["id"]), ATTENDANCE_COLUMNS)
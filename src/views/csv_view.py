@@ -1,5 +1,6 @@
 import csv
 from pathlib import Path
+from typing import Iterable
 
 class CSVView:
     @staticmethod
@@ -16,12 +17,27 @@ class CSVView:
             writer.writeheader()
             writer.writerows(rows)
 
+    @staticmethod
+    def export_stream(rows: Iterable[dict], path: str | Path, headers: list[str]) -> int:
+        """Write rows as they arrive (e.g. straight from a cursor); returns the row count."""
+        path = Path(path)
+        count = 0
+        with path.open('w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=headers, lineterminator='\n')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+
 class PDFView:
+    # Lines that fit between y=780 and the bottom margin at 14pt leading
+    LINES_PER_PAGE = 54
+
     @staticmethod
     def export(rows: list[dict], path: str | Path, title: str = "Report"):
-        # Minimal PDF generator (single-page text) to avoid external deps.
+        # Minimal PDF generator (text only) to avoid external deps.
         # Renders each line separately with proper line breaks.
-        path = Path(path)
         if not rows:
             lines = [title, "", "No data"]
         else:
@@ -31,49 +47,75 @@ class PDFView:
             sep_line = "  ".join("-" * col_widths[h] for h in headers)
             data_lines = ["  ".join(str(r[h]).ljust(col_widths[h]) for h in headers) for r in rows]
             lines = [title, "", header_line, sep_line, *data_lines]
+        PDFView.export_lines(lines, path)
+
+    @staticmethod
+    def export_stream(rows: Iterable[dict], path: str | Path, headers: list[str], title: str = "Report", col_width: int = 14) -> int:
+        """
+        Fixed-width variant of export() for row iterators: columns are not sized from the
+        data, so rows are formatted as they stream in. Returns the row count.
+        """
+        widths = {h: max(len(h), col_width) for h in headers}
+        count = 0
+        def gen():
+            nonlocal count
+            yield title
+            yield ""
+            yield "  ".join(h.ljust(widths[h]) for h in headers)
+            yield "  ".join("-" * widths[h] for h in headers)
+            for r in rows:
+                count += 1
+                yield "  ".join(str(r[h]).ljust(widths[h]) for h in headers)
+        PDFView.export_lines(gen(), path)
+        return count
+
+    @staticmethod
+    def export_lines(lines: Iterable[str], path: str | Path):
+        """Write pre-formatted text lines to a PDF, starting a new page every LINES_PER_PAGE lines."""
+        path = Path(path)
         def pdf_escape(s: str) -> str:
             return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
-        # Build content stream: set font, move to start, set leading, print each line with Tj and T*
         leading = 14
         y_start = 780
-        content_lines = ["BT", "/F1 10 Tf", f"1 0 0 1 50 {y_start} Tm", f"{leading} TL"]
-        first = True
+        # Build one content stream per page: set font, move to start, set leading, print each line with Tj and T*
+        streams = []
+        content_lines = None
         for line in lines:
+            if content_lines is None or len(content_lines) - 4 >= PDFView.LINES_PER_PAGE:
+                if content_lines is not None:
+                    content_lines.append("ET")
+                    streams.append("\n".join(content_lines))
+                content_lines = ["BT", "/F1 10 Tf", f"1 0 0 1 50 {y_start} Tm", f"{leading} TL"]
             txt = f"({pdf_escape(line)}) Tj"
-            if first:
-                content_lines.append(txt)
-                first = False
-            else:
-                content_lines.append("T* " + txt)
+            content_lines.append(txt if len(content_lines) == 4 else "T* " + txt)
+        if content_lines is None:
+            content_lines = ["BT", "/F1 10 Tf", f"1 0 0 1 50 {y_start} Tm", f"{leading} TL"]
         content_lines.append("ET")
-        stream_text = "\n".join(content_lines)
-        objects = []
-        xref = []
-        def add_object(obj_str: str):
-            offset = sum(len(o) for o in objects)
-            xref.append(offset)
-            objects.append(obj_str)
-            return len(objects)
-        # 1. Font object
-        add_object("1 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>\nendobj\n")
-        # 2. Contents
-        stream = f"2 0 obj\n<< /Length {len(stream_text)} >>\nstream\n{stream_text}\nendstream\nendobj\n"
-        add_object(stream)
-        # 3. Page object
-        page_obj = "3 0 obj\n<< /Type /Page /Parent 4 0 R /Resources << /Font << /F1 1 0 R >> >> /MediaBox [0 0 612 792] /Contents 2 0 R >>\nendobj\n"
-        add_object(page_obj)
-        # 4. Pages object
-        pages_obj = "4 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n"
-        add_object(pages_obj)
-        # 5. Catalog
-        catalog_obj = "5 0 obj\n<< /Type /Catalog /Pages 4 0 R >>\nendobj\n"
-        add_object(catalog_obj)
+        streams.append("\n".join(content_lines))
+
+        # Object layout: 1 font, 2 pages, 3 catalog, then (contents, page) per page
+        n_pages = len(streams)
+        page_ids = [5 + 2 * i for i in range(n_pages)]
+        objects = [
+            "1 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>\nendobj\n",
+            f"2 0 obj\n<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {n_pages} >>\nendobj\n",
+            "3 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n",
+        ]
+        for i, stream_text in enumerate(streams):
+            contents_id = 4 + 2 * i
+            objects.append(f"{contents_id} 0 obj\n<< /Length {len(stream_text)} >>\nstream\n{stream_text}\nendstream\nendobj\n")
+            objects.append(f"{contents_id + 1} 0 obj\n<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 1 0 R >> >> /MediaBox [0 0 612 792] /Contents {contents_id} 0 R >>\nendobj\n")
         header = "%PDF-1.4\n"
+        offsets = []
+        pos = len(header)
+        for o in objects:
+            offsets.append(pos)
+            pos += len(o)
         body = "".join(objects)
         xref_start = len(header) + len(body)
-        xref_table = ["xref\n0 6\n0000000000 65535 f \n"]
-        for off in [0] + xref:
+        xref_table = [f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"]
+        for off in offsets:
             xref_table.append(f"{off:010d} 00000 n \n")
-        trailer = f"trailer\n<< /Size 6 /Root 5 0 R >>\nstartxref\n{xref_start}\n%%EOF"
+        trailer = f"trailer\n<< /Size {len(objects) + 1} /Root 3 0 R >>\nstartxref\n{xref_start}\n%%EOF"
         pdf_bytes = (header + body + ''.join(xref_table) + trailer).encode('latin1', errors='ignore')
         path.write_bytes(pdf_bytes)
@@ -0,0 +1,46 @@
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+# same paths as the entry points: the project root for the "src." package, src/ for the top-level names
+for _p in (ROOT, ROOT / "src"):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
+
+from src.models.database import Database  # noqa: E402
+from src.services.payroll_service import PayrollService  # noqa: E402
+
+
+def add_employee(db, name: str = "Guard", rate: float = 20.0, tax_code=None) -> int:
+    cur = db.execute("INSERT INTO employees (full_name, role, department, contact, rate, tax_code) VALUES (?, ?, ?, ?, ?, ?)",
+                     (name, "Guard", "Ops", "-", rate, tax_code))
+    return cur.lastrowid
+
+
+def add_shift(db, employee_id: int, day: str, start: str = "08:00", end: str = "17:00") -> None:
+    db.executemany("INSERT INTO attendance (employee_id, event, timestamp) VALUES (?, ?, ?)",
+                   [(employee_id, "sign_in", f"{day}T{start}:00"), (employee_id, "sign_out", f"{day}T{end}:00")])
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(tmp_path / "attendance_payroll.db")
+    yield database
+    database.close_pool()
+
+
+@pytest.fixture
+def payroll(db):
+    return PayrollService(db)
+
+
+@pytest.fixture
+def march(db):
+    """Three employees with a working week in March 2026."""
+    ids = [add_employee(db, f"E{i}", 20.0 + i) for i in range(3)]
+    for eid in ids:
+        for d in range(2, 7):
+            add_shift(db, eid, f"2026-03-{d:02d}")
+    return ids
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+from api_server import ApiServer
+from src.models.user import UserModel
+from conftest import add_shift
+
+
+@pytest.fixture
+def app(db, march):
+    UserModel(db).create_user("hr", "secret", is_hr=True)
+    server = ApiServer(db, workers=2)
+    yield server
+    server.executor.shutdown(wait=True)
+
+
+def _call(app, method, target, headers=None, body=None):
+    response = asyncio.run(app.dispatch(method, target, headers or {}, json.dumps(body).encode() if body is not None else b""))
+    return response, (json.loads(response.body) if response.body else None)
+
+
+def _login(app) -> dict:
+    response, data = _call(app, "POST", "/api/login", body={"username": "hr", "password": "secret"})
+    assert response.status == 200
+    return {"authorization": f"Bearer {data['token']}"}
+
+
+def test_closed_month_is_served_from_the_period_service(app, db, march):
+    auth = _login(app)
+    _, open_month = _call(app, "GET", "/api/payroll/2026/3", auth)
+    assert open_month["status"] == "open"
+
+    app.payroll_service.periods.close_period(2026, 3)
+    add_shift(db, march[0], "2026-03-09")
+    _, closed = _call(app, "GET", "/api/payroll/2026/3", auth)
+    assert closed["status"] == "closed"
+    # the frozen totals, not a recomputation that would include the new shift
+    assert [r["gross_cents"] for r in closed["items"]] == [r["gross_cents"] for r in open_month["items"]]
+
+    _, one = _call(app, "GET", f"/api/payroll/2026/3?employee_id={march[1]}", auth)
+    assert [r["employee_id"] for r in one["items"]] == [march[1]]
+
+
+def test_etag_changes_when_the_month_is_closed_and_rerun(app, db, march):
+    auth = _login(app)
+    first, _ = _call(app, "GET", "/api/payroll/2026/3", auth)
+    again, _ = _call(app, "GET", "/api/payroll/2026/3", {**auth, "if-none-match": first.headers["ETag"]})
+    assert again.status == 304
+
+    app.payroll_service.periods.close_period(2026, 3)
+    closed, _ = _call(app, "GET", "/api/payroll/2026/3", {**auth, "if-none-match": first.headers["ETag"]})
+    assert closed.status == 200
+
+    add_shift(db, march[0], "2026-03-09")
+    app.payroll_service.periods.rerun_period(2026, 3)
+    rerun, data = _call(app, "GET", "/api/payroll/2026/3", {**auth, "if-none-match": closed.headers["ETag"]})
+    assert rerun.status == 200
+    assert data["status"] == "closed"
+
+
+def test_bad_tax_code_does_not_fail_the_month(app, db, march):
+    auth = _login(app)
+    db.execute("UPDATE employees SET tax_code = 'BOGUS' WHERE id = ?", (march[0],))
+    response, data = _call(app, "GET", "/api/payroll/2026/3", auth)
+    assert response.status == 200
+    assert [r["employee_id"] for r in data["items"]] == march[1:]
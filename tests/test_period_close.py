@@ -0,0 +1,79 @@
+from conftest import add_employee, add_shift
+
+
+def _by_id(rows):
+    return {r["employee_id"]: r for r in rows}
+
+
+def test_closed_month_is_frozen(db, payroll, march):
+    closed = _by_id(payroll.generate_payroll_for_month(2026, 3))
+    payroll.periods.close_period(2026, 3)
+    add_shift(db, march[0], "2026-03-09")
+
+    after = _by_id(payroll.generate_payroll_for_month(2026, 3))
+    assert after[march[0]]["gross_cents"] == closed[march[0]]["gross_cents"]
+    # one logged change per new attendance row
+    assert payroll.periods.pending_changes(2026, 3) == 2
+
+
+def test_rerun_writes_one_delta_in_cents(db, payroll, march):
+    payroll.periods.close_period(2026, 3)
+    before = _by_id(payroll.periods.closed_results(2026, 3))
+    add_shift(db, march[1], "2026-03-09")
+
+    deltas = payroll.periods.rerun_period(2026, 3)
+    assert [d["employee_id"] for d in deltas] == [march[1]]
+    delta = deltas[0]
+    assert isinstance(delta["gross_cents"], int) and delta["gross_cents"] > 0
+    assert delta["net_cents"] == delta["gross_cents"] + delta["adjustments_cents"] - delta["tax_cents"]
+
+    after = _by_id(payroll.generate_payroll_for_month(2026, 3))
+    assert after[march[1]]["gross_cents"] == before[march[1]]["gross_cents"] + delta["gross_cents"]
+    assert after[march[0]] == before[march[0]]
+    # nothing changed since: no second delta line
+    assert payroll.periods.rerun_period(2026, 3) == []
+    assert payroll.periods.pending_changes(2026, 3) == 0
+
+
+def test_new_hire_marks_no_closed_month_changed(db, payroll, march):
+    payroll.periods.close_period(2026, 3)
+    add_employee(db, "New", 30.0)
+
+    assert payroll.periods.pending_changes(2026, 3) == 0
+    assert payroll.periods.rerun_period(2026, 3) == []
+    assert db.fetchone("SELECT COUNT(*) AS n FROM payroll_deltas")["n"] == 0
+
+
+def test_employee_with_only_delta_lines_is_in_the_closed_month(db, payroll, march):
+    payroll.periods.close_period(2026, 3)
+    new = add_employee(db, "New", 30.0)
+    add_shift(db, new, "2026-03-10", "08:00", "16:00")
+
+    deltas = payroll.periods.rerun_period(2026, 3)
+    assert [(d["employee_id"], d["gross_cents"]) for d in deltas] == [(new, 24000)]
+
+    rows = _by_id(payroll.generate_payroll_for_month(2026, 3))
+    assert rows[new]["gross_cents"] == 24000
+    assert rows[new]["hourly_rate"] == 30.0
+    # the delta counts as the effective total: re-running does not bill the month again
+    assert payroll.periods.rerun_period(2026, 3) == []
+    assert payroll.rollups.rebuild(2026) == 4
+
+
+def test_unknown_tax_code_skips_the_employee_until_fixed(db, payroll, march):
+    db.execute("UPDATE employees SET tax_code = 'BOGUS' WHERE id = ?", (march[2],))
+    errors = {}
+    rows = payroll.compute_month(2026, 3, errors=errors)
+    assert [r["employee_id"] for r in rows] == march[:2]
+    assert list(errors) == [march[2]]
+
+    result = payroll.periods.close_period(2026, 3)
+    assert result["employees"] == 2 and list(result["errors"]) == [march[2]]
+    # still failing: nothing written, the change stays pending
+    assert payroll.periods.rerun_period(2026, 3) == []
+    assert payroll.periods.pending_changes(2026, 3) == 1
+
+    db.execute("UPDATE employees SET tax_code = NULL WHERE id = ?", (march[2],))
+    deltas = payroll.periods.rerun_period(2026, 3)
+    assert [d["employee_id"] for d in deltas] == [march[2]]
+    assert payroll.periods.pending_changes(2026, 3) == 0
@@ -0,0 +1,194 @@
+"""
+Local load harness for the JSON API (stdlib only).
+
+    python tools/api_loadtest.py --db /tmp/load.db --concurrency 32 --duration 20
+    python tools/api_loadtest.py --url http://127.0.0.1:8080 --user admin --password admin
+
+With --db the server is started in-process on a free port against that file;
+otherwise --url points at a running api_server. Each virtual user keeps one
+keep-alive connection and loops over a clock-in/out + read mix on a random
+employee; report reads revalidate with If-None-Match like a caching client would.
+Prints per-endpoint throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import pathlib
+import random
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+SRC_DIR = pathlib.Path(__file__).resolve().parents[1] / "src"
+# services import through the "src." package when loaded outside it, so the project root is needed too
+for _p in (SRC_DIR.parent, SRC_DIR):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
+
+
+class _Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host: str, port: int, token: str = None):
+        self.host, self.port, self.token = host, port, token
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: dict = None, headers: dict = None) -> tuple:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(data)}"]
+        if data:
+            lines.append("Content-Type: application/json")
+        if self.token:
+            lines.append(f"Authorization: Bearer {self.token}")
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        resp_headers = {}
+        while True:
+            h = await self.reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+        length = int(resp_headers.get("content-length") or 0)
+        has_body = length and method != "HEAD" and status != 304
+        payload = await self.reader.readexactly(length) if has_body else b""
+        if resp_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, resp_headers, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def _percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))]
+
+
+async def _virtual_user(host, port, token, employee_ids, year, deadline, stats, seed):
+    rnd = random.Random(seed)
+    conn = _Connection(host, port, token)
+    etags = {}
+    try:
+        while time.perf_counter() < deadline:
+            eid = rnd.choice(employee_ids)
+            roll = rnd.random()
+            if roll < 0.4:
+                name = rnd.choice(("sign-in", "sign-out"))
+                method, path, body = "POST", f"/api/attendance/{name}", {"employee_id": eid, "note": "load test"}
+            elif roll < 0.7:
+                name, method, path, body = "attendance", "GET", f"/api/attendance?employee_id={eid}&limit=20", None
+            elif roll < 0.9:
+                name, method, path, body = "payroll-totals", "GET", f"/api/reports/payroll-totals?kind=ytd&year={year}", None
+            else:
+                name, method, path, body = "payroll", "GET", f"/api/payroll/{year}/{rnd.randint(1, 12)}?employee_id={eid}", None
+            headers = {"If-None-Match": etags[path]} if path in etags else None
+            t0 = time.perf_counter()
+            try:
+                status, resp_headers, _ = await conn.request(method, path, body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                conn.close()
+                stats[name]["errors"] += 1
+                continue
+            stats[name]["latencies"].append(time.perf_counter() - t0)
+            stats[name]["status"][status] += 1
+            if status >= 500:
+                stats[name]["errors"] += 1
+            if "etag" in resp_headers:
+                etags[path] = resp_headers["etag"]
+    finally:
+        conn.close()
+
+
+async def run(host: str, port: int, user: str, password: str, concurrency: int, duration: float, year: int) -> dict:
+    admin = _Connection(host, port)
+    status, _, payload = await admin.request("POST", "/api/login", {"username": user, "password": password})
+    if status != 200:
+        raise SystemExit(f"login failed: {status} {payload.decode('utf-8', 'replace')}")
+    admin.token = json.loads(payload)["token"]
+    status, _, payload = await admin.request("GET", "/api/employees?limit=500")
+    employee_ids = [e["id"] for e in json.loads(payload)["items"]] if status == 200 else []
+    admin.close()
+    if not employee_ids:
+        raise SystemExit("no active employees to clock in")
+
+    stats = defaultdict(lambda: {"latencies": [], "status": defaultdict(int), "errors": 0})
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(_virtual_user(host, port, admin.token, employee_ids, year, deadline, stats, i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for name, s in sorted(stats.items()):
+        lat = sorted(s["latencies"])
+        report[name] = {"requests": len(lat), "rps": round(len(lat) / elapsed, 1), "errors": s["errors"],
+                        "status": dict(sorted(s["status"].items())),
+                        **{f"p{p}_ms": round(_percentile(lat, p) * 1000, 2) for p in (50, 95, 99)},
+                        "max_ms": round((lat[-1] if lat else 0) * 1000, 2)}
+    total = sum(r["requests"] for r in report.values())
+    report["total"] = {"requests": total, "rps": round(total / elapsed, 1), "seconds": round(elapsed, 2)}
+    return report
+
+
+def _print_report(report: dict):
+    print(f"{'endpoint':<16}{'requests':>10}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}  status")
+    print("-" * 100)
+    for name, r in report.items():
+        if name == "total":
+            continue
+        print(f"{name:<16}{r['requests']:>10}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}{r['errors']:>8}  {r['status']}")
+    t = report["total"]
+    print("-" * 100)
+    print(f"{'total':<16}{t['requests']:>10}{t['rps']:>9}   in {t['seconds']}s")
+
+
+async def _self_hosted(args) -> dict:
+    from models.database import Database
+    from api_server import ApiServer
+
+    app = ApiServer(Database(args.db, pool_size=args.workers * 2), workers=args.workers)
+    ready = asyncio.Event()
+    server = asyncio.create_task(app.serve("127.0.0.1", 0, ready))
+    await ready.wait()
+    try:
+        return await run("127.0.0.1", app.port, args.user, args.password, args.concurrency, args.duration, args.year)
+    finally:
+        server.cancel()
+        app.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the QuickHire JSON API")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running api_server")
+    target.add_argument("--db", help="start the server in-process against this database file")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--workers", type=int, default=8, help="server threads when self-hosting")
+    parser.add_argument("--year", type=int, default=time.localtime().tm_year)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        report = asyncio.run(_self_hosted(args))
+    else:
+        url = urlsplit(args.url)
+        report = asyncio.run(run(url.hostname, url.port or 80, args.user, args.password, args.concurrency, args.duration, args.year))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
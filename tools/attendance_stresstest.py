@@ -0,0 +1,158 @@
+"""
+Concurrency stress test for clock-in/out (stdlib only).
+
+    python tools/attendance_stresstest.py --threads 32 --employees 8 --ops 300
+    python tools/attendance_stresstest.py --db /tmp/stress.db --hr-deletes
+
+Many threads clock a small set of employees in and out at random, so the same
+employee is hit by several threads at once. Afterwards every employee's live
+events must alternate sign_in / sign_out, and open_shifts must hold exactly the
+employees whose last event is a sign_in (never two open shifts for one employee).
+With --hr-deletes, HR deletes of sign_ins and sign_outs run alongside and the
+check covers them too. Exits 1 if any check fails.
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+SRC_DIR = pathlib.Path(__file__).resolve().parents[1] / "src"
+# services import through the "src." package when loaded outside it, so the project root is needed too
+for _p in (SRC_DIR.parent, SRC_DIR):
+    if str(_p) not in sys.path:
+        sys.path.insert(0, str(_p))
+
+from models.database import Database
+from models.attendance import AttendanceModel
+
+
+def _seed_employees(db: Database, n: int) -> list:
+    ids = []
+    for i in range(n):
+        cur = db.execute("INSERT INTO employees (full_name, role, department, contact, rate) VALUES (?, ?, ?, ?, ?)",
+                         (f"Stress {i}", "Guard", "Ops", "-", 20.0))
+        ids.append(cur.lastrowid)
+    return ids
+
+
+def _worker(model: AttendanceModel, db: Database, employee_ids: list, ops: int, seed: int, hr_deletes: bool, stats: Counter, lock: threading.Lock):
+    rnd = random.Random(seed)
+    local = Counter()
+    for _ in range(ops):
+        eid = rnd.choice(employee_ids)
+        roll = rnd.random()
+        try:
+            if hr_deletes and roll < 0.05:
+                # HR removes the employee's latest clock event (either kind); looked up and deleted
+                # under one write lock, otherwise a clock event landing in between makes it a middle row
+                with db.transaction(immediate=True) as conn:
+                    conn.execute("""DELETE FROM attendance WHERE id = (
+                                        SELECT id FROM attendance WHERE employee_id = ? AND event IN ('sign_in', 'sign_out')
+                                        ORDER BY timestamp DESC, id DESC LIMIT 1)""", (eid,))
+                local["hr_delete"] += 1
+            elif roll < 0.5:
+                model.clock_in(eid)
+                local["sign_in"] += 1
+            else:
+                model.clock_out(eid)
+                local["sign_out"] += 1
+        except ValueError:
+            local["rejected"] += 1
+        except Exception as e:
+            local[f"error: {type(e).__name__}: {e}"] += 1
+    with lock:
+        stats.update(local)
+
+
+def check(db: Database, employee_ids: list) -> list:
+    """Invariant violations, as readable strings (empty when consistent)."""
+    problems = []
+    for eid in employee_ids:
+        rows = db.query("""SELECT id, event FROM attendance WHERE employee_id = ? AND event IN ('sign_in', 'sign_out')
+                           ORDER BY timestamp, id""", (eid,))
+        events = [r["event"] for r in rows]
+        for i, (a, b) in enumerate(zip(events, events[1:])):
+            if a == b:
+                problems.append(f"employee {eid}: two {a} in a row (attendance ids {rows[i]['id']}, {rows[i + 1]['id']})")
+                break
+        if events and events[0] != "sign_in":
+            problems.append(f"employee {eid}: history starts with {events[0]}")
+        shifts = db.query("SELECT sign_in_id FROM open_shifts WHERE employee_id = ?", (eid,))
+        on_shift = bool(events) and events[-1] == "sign_in"
+        if len(shifts) > 1:
+            problems.append(f"employee {eid}: {len(shifts)} open shifts")
+        elif on_shift != bool(shifts):
+            problems.append(f"employee {eid}: last event {events[-1] if events else None} but open_shifts has {len(shifts)} row(s)")
+        elif shifts and shifts[0]["sign_in_id"] != rows[-1]["id"]:
+            problems.append(f"employee {eid}: open shift points at sign_in {shifts[0]['sign_in_id']}, latest is {rows[-1]['id']}")
+    return problems
+
+
+def run(db_path: str, threads: int, employees: int, ops: int, seed: int, hr_deletes: bool) -> dict:
+    db = Database(db_path)
+    model = AttendanceModel(db)
+    employee_ids = _seed_employees(db, employees)
+    stats, lock = Counter(), threading.Lock()
+    # every thread waits at the barrier so they all start hammering together
+    barrier = threading.Barrier(threads)
+
+    def start(i):
+        barrier.wait()
+        _worker(model, db, employee_ids, ops, seed + i, hr_deletes, stats, lock)
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=start, args=(i,), name=f"stress-{i}") for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    errors = {k: v for k, v in stats.items() if k.startswith("error")}
+    return {"db": db_path, "threads": threads, "employees": employees, "ops": threads * ops, "seconds": round(elapsed, 2),
+            "ops_per_second": round(threads * ops / elapsed, 1) if elapsed else None,
+            "counts": {k: v for k, v in stats.items() if not k.startswith("error")}, "errors": errors,
+            "problems": check(db, employee_ids)}
+
+
+def _print_report(report: dict):
+    print(f"{report['ops']} operations on {report['employees']} employees from {report['threads']} threads "
+          f"in {report['seconds']}s ({report['ops_per_second']} ops/s)")
+    for k, v in sorted(report["counts"].items()):
+        print(f"  {k:<12} {v}")
+    for k, v in report["errors"].items():
+        print(f"  {k} x{v}")
+    if report["problems"]:
+        print(f"FAILED: {len(report['problems'])} problem(s)")
+        for p in report["problems"][:20]:
+            print(f"  {p}")
+    else:
+        print("OK: events alternate and at most one open shift per employee")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress concurrent clock-in/out and check for duplicate open shifts")
+    parser.add_argument("--db", help="database file (default: a fresh temporary file)")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--employees", type=int, default=4, help="fewer employees means more contention per employee")
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--hr-deletes", action="store_true", help="mix in HR deletes of the latest clock event")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or str(pathlib.Path(tempfile.mkdtemp(prefix="quickhire-stress-")) / "stress.db")
+    report = run(db_path, args.threads, args.employees, args.ops, args.seed, args.hr_deletes)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 1 if report["problems"] or report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())